@@ -1,66 +1,237 @@
+import functools
 import operator
+import os
+import re
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from typing import Annotated, List, Literal, TypedDict, Union
 
-from langchain_ollama import ChatOllama
+# Only the lightweight langchain_core pieces needed by the @tool decorators and
+# the node functions are imported eagerly. Ollama, LangGraph, prompt templates,
+# pydantic and dotenv are imported inside the factories below, so importing
+# this module (from main.py or the tests) no longer builds the agents.
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.tools import tool
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langgraph.graph import StateGraph, END, START
-from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import MemorySaver 
-from pydantic import BaseModel
-from dotenv import load_dotenv
 
-load_dotenv()
+import db_writer
+import diagnostics
+import guardrails
+import metrics
 
 # --- 1. CONFIGURATION ---
-print("🔌 Connecting to Local Ollama (Qwen 2.5)...")
+OLLAMA_MODEL = "qwen2.5:7b"
+OLLAMA_BASE_URL = "http://localhost:11434"
+
+_BUILD_LOCK = threading.RLock()
+
+def _singleton(factory):
+    """Builds the factory's object on first call and returns the same instance afterwards."""
+    cached = functools.lru_cache(maxsize=None)(factory)
+
+    @functools.wraps(factory)
+    def wrapper():
+        # RLock: factories call each other (get_app -> get_data_analyst -> get_llm_worker)
+        with _BUILD_LOCK:
+            return cached()
+
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+def _make_llm():
+    from dotenv import load_dotenv
+    from langchain_ollama import ChatOllama
+
+    load_dotenv()
+    print("🔌 Connecting to Local Ollama (Qwen 2.5)...")
+    return ChatOllama(
+        model=OLLAMA_MODEL,
+        temperature=0,
+        base_url=OLLAMA_BASE_URL
+    )
 
-llm_supervisor = ChatOllama(
-    model="qwen2.5:7b", 
-    temperature=0,
-    base_url="http://localhost:11434"
-)
+@_singleton
+def get_llm_supervisor():
+    return _make_llm()
 
-llm_worker = ChatOllama(
-    model="qwen2.5:7b", 
-    temperature=0,
-    base_url="http://localhost:11434"
-)
+@_singleton
+def get_llm_worker():
+    return _make_llm()
 
 # --- 2. DATABASE HELPER ---
 DB_NAME = "fleet_data.db"
 
+_SQL_TABLE_RE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+(\w+)", re.IGNORECASE)
+
+@functools.lru_cache(maxsize=256)
+def _sql_label(query):
+    """Short metric label for a statement, e.g. 'SELECT vehicles'."""
+    verb = query.split(None, 1)[0].upper()
+    match = _SQL_TABLE_RE.search(query)
+    return f"{verb} {match.group(1)}" if match else verb
+
 def query_db(query, args=(), one=False):
     """Helper to run SQL queries against the fleet database."""
     try:
-        conn = sqlite3.connect(DB_NAME)
-        conn.row_factory = sqlite3.Row # Access columns by name
-        cur = conn.cursor()
-        cur.execute(query, args)
-        if query.strip().upper().startswith("SELECT"):
-            rv = cur.fetchall()
-            conn.close()
-            return (rv[0] if rv else None) if one else rv
-        else:
-            # For INSERT/UPDATE/DELETE
-            conn.commit()
-            conn.close()
-            return cur.rowcount
+        with metrics.timer("sql", _sql_label(query)):
+            conn = sqlite3.connect(DB_NAME)
+            conn.row_factory = sqlite3.Row # Access columns by name
+            cur = conn.cursor()
+            cur.execute(query, args)
+            if query.strip().upper().startswith("SELECT"):
+                rv = cur.fetchall()
+                conn.close()
+                return (rv[0] if rv else None) if one else rv
+            else:
+                # For INSERT/UPDATE/DELETE
+                conn.commit()
+                conn.close()
+                return cur.rowcount
     except Exception as e:
         return None
 
+# --- 2b. READ-THROUGH CACHE ---
+# Live telemetry only changes on the simulation tick, so a short TTL is enough.
+# History and status are invalidated explicitly by the tools that write them.
+TELEMETRY_CACHE_TTL = float(os.getenv("FLEET_TELEMETRY_TTL", "10"))
+CACHE_MAX_ENTRIES = 4096
+
+class ReadThroughCache:
+    """
+    Thread-safe LRU cache keyed by vehicle_id. Entries expire after `ttl`
+    seconds (None = until invalidated). Hits/misses are exported through
+    metrics as fleet_cache_hits_total / fleet_cache_misses_total.
+
+    Loads run outside the lock, so every invalidate() bumps a generation
+    counter and a load that started before it is not stored: otherwise rows
+    read just before a write would be put back after the write's invalidate.
+    """
+
+    def __init__(self, name, ttl=None, max_entries=CACHE_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale_loads = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for key, or calls loader() and caches it unless it is None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.REGISTRY.inc("cache_hits", self.name)
+                return entry[0]
+            self.misses += 1
+            generation = self.generation
+        metrics.REGISTRY.inc("cache_misses", self.name)
+
+        value = loader()
+        if value is None: # query_db error or missing row: don't cache failures
+            return None
+        self.put(key, value, generation)
+        return value
+
+    def put(self, key, value, generation=None):
+        """
+        Stores a value loaded elsewhere (e.g. by a bulk prefetch). Pass the
+        `generation` read before loading; the value is dropped if the cache
+        was invalidated since.
+        """
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_loads += 1
+                return
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drops one key, or everything when key is None."""
+        with self._lock:
+            self.generation += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+# CAPA records are reference data; they change only when Quality edits them.
+CAPA_CACHE_TTL = 300
+
+telemetry_cache = ReadThroughCache("telemetry", ttl=TELEMETRY_CACHE_TTL)
+history_cache = ReadThroughCache("maintenance_history")
+capa_cache = ReadThroughCache("capa_records", ttl=CAPA_CACHE_TTL)
+rca_cache = ReadThroughCache("rca_insights", ttl=CAPA_CACHE_TTL)
+
+def cache_stats():
+    """Hit/miss counters for every read-through cache."""
+    return {
+        c.name: {"hits": c.hits, "misses": c.misses, "stale_loads": c.stale_loads, "hit_rate": round(c.hit_rate(), 3)}
+        for c in (telemetry_cache, history_cache, capa_cache, rca_cache)
+    }
+
+def invalidate_vehicle(vehicle_id):
+    """Call after any write that touches a vehicle's row or its history."""
+    telemetry_cache.invalidate(vehicle_id)
+    history_cache.invalidate(vehicle_id)
+
 # --- 3. DEFINE REAL TOOLS (SQL INTEGRATED) ---
+def traced_tool(func):
+    """@tool that also records every call's latency under the tool's name."""
+    return tool(metrics.timed("tool")(func))
+
 
-@tool
+@traced_tool
 def fetch_telematics_data(vehicle_id: str):
     """Fetches LIVE data for a SINGLE vehicle from the SQL Fleet Database."""
-    row = query_db("SELECT * FROM vehicles WHERE vehicle_id = ?", (vehicle_id,), one=True)
+    data = telemetry_cache.get_or_load(vehicle_id, lambda: _load_telemetry(vehicle_id))
     
-    if not row:
+    if not data:
         return {"error": f"Vehicle ID '{vehicle_id}' not found in Fleet Database."}
     
+    return dict(data) # Callers get their own copy of the cached snapshot
+
+def _load_telemetry(vehicle_id):
+    row = query_db("SELECT * FROM vehicles WHERE vehicle_id = ?", (vehicle_id,), one=True)
+    if not row:
+        return None
+    return _row_to_telemetry(row)
+
+PREFETCH_CHUNK = 500 # stay well under SQLite's bound-parameter limit
+
+def prefetch_telemetry(vehicle_ids):
+    """
+    Loads many vehicles with one SELECT per chunk and primes telemetry_cache,
+    so later fetch_telematics_data calls for them are cache hits.
+    Returns {vehicle_id: telemetry dict} for the vehicles that exist.
+    """
+    ids = list(dict.fromkeys(vehicle_ids))
+    found = {}
+    for i in range(0, len(ids), PREFETCH_CHUNK):
+        chunk = ids[i:i + PREFETCH_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        generation = telemetry_cache.generation
+        rows = query_db(f"SELECT * FROM vehicles WHERE vehicle_id IN ({placeholders})", tuple(chunk)) or []
+        for row in rows:
+            data = _row_to_telemetry(row)
+            telemetry_cache.put(row["vehicle_id"], data, generation)
+            found[row["vehicle_id"]] = data
+    return found
+
+def _row_to_telemetry(row):
     return {
         "vehicle_id": row["vehicle_id"],
         "model": row["model"],
@@ -71,89 +242,147 @@ def fetch_telematics_data(vehicle_id: str):
         "odometer": row["odometer"]
     }
 
-@tool
+@traced_tool
 def analyze_fleet_trends(scope: str = "all"):
     """
     Analyzes the ENTIRE fleet to forecast service center demand and workload.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    with metrics.timer("sql", "analyze_fleet_trends"):
+        conn = sqlite3.connect(DB_NAME)
+        cursor = conn.cursor()
 
-    # 1. Get Fleet Health Distribution
-    cursor.execute("SELECT status, COUNT(*) FROM vehicles GROUP BY status")
-    status_raw = cursor.fetchall()
-    status_dist = {row[0]: row[1] for row in status_raw}
+        # 1. Get Fleet Health Distribution
+        cursor.execute("SELECT status, COUNT(*) FROM vehicles GROUP BY status")
+        status_raw = cursor.fetchall()
+        status_dist = {row[0]: row[1] for row in status_raw}
 
-    # 2. Identify High-Risk Vehicles
-    cursor.execute("SELECT vehicle_id, model, error_code FROM vehicles WHERE oil_life < 20 OR error_code != 'None'")
-    high_risk_cars = cursor.fetchall()
-    
-    demand_count = len(high_risk_cars)
-    estimated_hours = demand_count * 3 
+        # 2. Identify High-Risk Vehicles
+        cursor.execute("SELECT vehicle_id, model, error_code FROM vehicles WHERE oil_life < 20 OR error_code != 'None'")
+        high_risk_cars = cursor.fetchall()
+
+        # 3. Get High Mileage Trends
+        cursor.execute("SELECT AVG(odometer) FROM vehicles")
+        avg_odometer = cursor.fetchone()[0]
 
-    # 3. Get High Mileage Trends
-    cursor.execute("SELECT AVG(odometer) FROM vehicles")
-    avg_odometer = cursor.fetchone()[0]
+        conn.close()
 
-    conn.close()
+    demand_count = len(high_risk_cars)
+    details = [f"{c[0]} ({c[1]})" for c in high_risk_cars[:MAX_REPORT_DETAILS]]
+    if demand_count > MAX_REPORT_DETAILS:
+        details.append(f"... and {demand_count - MAX_REPORT_DETAILS:,} more")
+
+    # 3. Forecast from fitted degradation trends (oil decay per mile, miles per
+    # day, temperature drift); falls back to the flat 3h/vehicle estimate.
+    forecast = _fleet_forecast()
+    if forecast:
+        reasons = forecast["by_reason"]
+        workload = (
+            f"{forecast['estimated_hours']:,.0f} Hours of labor over the next {forecast['horizon_days']} days. "
+            f"{forecast['due_within_horizon']:,} vehicles due ({reasons['oil']:,} oil service, "
+            f"{reasons['overheating']:,} overheating, {reasons['dtc']:,} DTC)."
+        )
+        upcoming = forecast["due_within_horizon"]
+    else:
+        workload = f"{demand_count * 3} Hours of labor required this week."
+        upcoming = demand_count
 
     return f"""
     📊 FLEET FORECAST REPORT
     ------------------------
     1. Health Overview: {status_dist}
     2. Immediate Service Demand: {demand_count} vehicles require attention.
-       - Details: {[f"{c[0]} ({c[1]})" for c in high_risk_cars]}
-    3. Projected Service Center Workload: {estimated_hours} Hours of labor required this week.
+       - Details: {details}
+    3. Projected Service Center Workload: {workload}
     4. Long-term Wear: Average fleet mileage is {int(avg_odometer):,} miles.
     
     RECOMMENDATION FOR SCHEDULER:
-    {'🔴 Heavy Load - Open more slots immediately.' if demand_count > 3 else '🟢 Normal Load - Standard scheduling applies.'}
+    {'🔴 Heavy Load - Open more slots immediately.' if upcoming > 3 else '🟢 Normal Load - Standard scheduling applies.'}
+    """
+
+MAX_REPORT_DETAILS = 20
+
+def _fleet_forecast():
+    try:
+        import forecasting # numpy; only loaded when a forecast is requested
+        with metrics.timer("forecast", "fleet"):
+            return forecasting.forecast_fleet(DB_NAME)
+    except Exception as e:
+        print(f"⚠️ [Forecast] Falling back to flat estimate: {e}")
+        return None
+
+@traced_tool
+def fleet_analytics(report: str = "cost_per_model"):
     """
+    Fleet-wide trend analytics over a columnar snapshot of the fleet database.
+    report: 'cost_per_model' (service cost by vehicle model) or
+    'service_intervals' (days between services, overall and per service type).
+    """
+    import analytics # pulls in pyarrow/numpy, so only on first use
+
+    if report not in analytics.REPORTS:
+        return f"Unknown report '{report}'. Choose one of: {', '.join(analytics.REPORTS)}."
+    try:
+        with metrics.timer("analytics", report):
+            out_dir = analytics.ensure_snapshot(DB_NAME)
+            return analytics.format_report(report, analytics.REPORTS[report](out_dir))
+    except Exception as e:
+        return f"Analytics unavailable: {e}"
 
-@tool
+@traced_tool
 def get_maintenance_history(vehicle_id: str):
     """Fetches historical service records for a specific vehicle."""
-    rows = query_db("SELECT * FROM maintenance_history WHERE vehicle_id = ? ORDER BY service_date DESC LIMIT 5", (vehicle_id,))
+    rows = history_cache.get_or_load(
+        vehicle_id,
+        lambda: query_db("SELECT * FROM maintenance_history WHERE vehicle_id = ? ORDER BY service_date DESC LIMIT 5", (vehicle_id,))
+    )
     if not rows:
         return "No maintenance history found."
     return "\n".join([f"- {row['service_date']}: {row['service_type']} ({row['description']})" for row in rows])
 
-@tool
-def diagnose_issue(error_code: str, engine_temp: int):
+@traced_tool
+def diagnose_issue(error_code: str, engine_temp: int, vehicle_model: str = "*"):
     """Analyzes diagnostic trouble codes (DTC) and sensor readings."""
     if engine_temp is None: return "Insufficient Data"
     
-    issues = []
-    if engine_temp > 110:
-        issues.append(f"CRITICAL OVERHEATING detected (Temp: {engine_temp}°C).")
-    if error_code == "P0118":
-        issues.append("Sensor Failure: Coolant Temperature Circuit High input.")
-    if error_code == "P0420":
-        issues.append("Catalyst System Efficiency Below Threshold.")
+    # Rules come from the diagnostic_rules table (see diagnostics.py)
+    issues = diagnostics.get_rules(DB_NAME).findings(error_code, {"engine_temp": engine_temp}, vehicle_model)
         
     if issues:
         return "DIAGNOSIS REPORT: " + " ".join(issues)
         
     return "Status: Normal. All parameters within operating limits."
 
-@tool
+# DTCs / symptoms -> the CAPA component they implicate
+CAPA_CODE_MAP = {
+    "P0118": "Coolant Sensor",
+    "P0420": "Catalytic Converter",
+    "overheating": "Coolant Sensor"
+}
+
+def _capa_components(diagnosis, rows):
+    """Components a diagnosis implicates: mapped DTCs/symptoms plus any CAPA record its text matches."""
+    text = diagnosis.lower()
+    components = {component for code, component in CAPA_CODE_MAP.items() if code.lower() in text}
+    components.update(row["component"] for row in rows
+                      if diagnosis in row["component"] or diagnosis in row["defect_type"] or row["component"] in diagnosis)
+    return tuple(sorted(components))
+
+@traced_tool
 def get_rca_insights(diagnosis: str):
     """Queries the Manufacturing CAPA database."""
     print(f"   [Tool] RCA Analysis running for: {diagnosis}")
     
-    code_map = {
-        "P0118": "Coolant Sensor",
-        "P0420": "Catalytic Converter",
-        "overheating": "Coolant Sensor"
-    }
-    
-    search_terms = [diagnosis]
-    
-    for code, component in code_map.items():
-        if code.lower() in diagnosis.lower():
-            search_terms.append(component)
-            
-    rows = query_db("SELECT * FROM capa_records")
+    # Keyed by the components found, not the wording, so the bare DTC a batch
+    # prefetches and the model's full diagnosis share one entry. The text is
+    # still searched: "P0118 plus Brake Pad wear" also finds the Brake Pad CAPA.
+    components = _capa_components(diagnosis, _capa_rows())
+    return rca_cache.get_or_load(components, lambda: _match_capa(list(components)))
+
+def _capa_rows():
+    return capa_cache.get_or_load("all", lambda: query_db("SELECT * FROM capa_records")) or []
+
+def _match_capa(search_terms):
+    rows = _capa_rows()
     
     matches = []
     for row in rows:
@@ -167,7 +396,7 @@ def get_rca_insights(diagnosis: str):
         
     return "No recurring manufacturing defects found in CAPA DB."
 
-@tool
+@traced_tool
 def check_schedule_availability():
     """Queries OPEN slots from appointments table."""
     rows = query_db("SELECT slot_time FROM appointments WHERE is_booked = 0 LIMIT 4")
@@ -178,7 +407,7 @@ def check_schedule_availability():
     slots = [row["slot_time"] for row in rows]
     return f"OPEN SLOTS: {slots}"
 
-@tool
+@traced_tool
 def book_appointment(slot: str, vehicle_id: str):
     """Books the appointment. Handles fuzzy time matching (e.g., '9am' -> '09:00')."""
     clean_slot = slot.lower().replace("am", "").replace("pm", "").strip()
@@ -202,38 +431,53 @@ def book_appointment(slot: str, vehicle_id: str):
     if not existing:
         return f"Slot unavailable. Please pick another time from the list."
     
-    query_db("UPDATE appointments SET is_booked = 1, booked_vehicle_id = ? WHERE id = ?", (vehicle_id, existing["id"]))
+    # Goes through the batched writer; `is_booked = 0` makes the claim atomic
+    # if another run grabbed the slot between our SELECT and this UPDATE.
+    try:
+        claimed = db_writer.get_writer(DB_NAME).execute(
+            "UPDATE appointments SET is_booked = 1, booked_vehicle_id = ? WHERE id = ? AND is_booked = 0",
+            (vehicle_id, existing["id"])
+        )
+    except Exception as e:
+        return f"Booking failed due to a database error ({e}). Please try again."
+    if not claimed:
+        return f"Slot unavailable. Please pick another time from the list."
+    invalidate_vehicle(vehicle_id)
     
     return f"BOOKING COMPLETE: {vehicle_id} scheduled for {existing['slot_time']}."
 
-@tool
+@traced_tool
 def update_vehicle_status(vehicle_id: str, status: str):
     """Updates the vehicle status in the database."""
-    query_db("UPDATE vehicles SET status = ? WHERE vehicle_id = ?", (status, vehicle_id))
+    try:
+        db_writer.get_writer(DB_NAME).execute("UPDATE vehicles SET status = ? WHERE vehicle_id = ?", (status, vehicle_id))
+    except Exception as e:
+        return f"Status update for {vehicle_id} failed: {e}"
+    invalidate_vehicle(vehicle_id)
     return f"Status for {vehicle_id} updated to {status}."
 
 # --- DUMMY TOOLS (Safety Net) ---
-@tool
+@traced_tool
 def brave_search(query: str):
     """Performs a web search (Simulation Mode)."""
     return "Offline Mode: Internet unavailable. Please use internal diagnosis tools."
 
-@tool
+@traced_tool
 def send_notification_to_owner(vehicle_id: str, message: str):
     """Simulates sending an email/SMS notification to the vehicle owner."""
     return "Notification sent."
 
-@tool
+@traced_tool
 def send_alert_to_maintenance_team(vehicle_id: str, message: str):
     """Simulates sending a priority alert to the maintenance dashboard."""
     return "Alert sent."
 
-@tool
+@traced_tool
 def log_customer_feedback(feedback: str, rating: int):
     """Logs customer feedback for quality assurance."""
     return "Feedback saved."
 
-@tool
+@traced_tool
 def report_manufacturing_defect(component: str, issue_description: str, vehicle_id: str):
     """
     Feeds a new potential defect insight back to the Manufacturing/Quality team.
@@ -250,85 +494,122 @@ class AgentState(TypedDict):
     is_proactive: bool 
 
 # --- 5. UEBA SECURITY ---
-def ueba_guardrail_node(state: AgentState):
-    messages = state["messages"]
-    if isinstance(messages[-1], HumanMessage):
-        if "drop table" in messages[-1].content.lower():
+def _incoming_human_messages(messages):
+    """Human messages added since the graph last answered (walks back to the last final AI reply)."""
+    incoming = []
+    for msg in reversed(messages):
+        if isinstance(msg, AIMessage) and not getattr(msg, "tool_calls", None):
+            break
+        if isinstance(msg, HumanMessage):
+            incoming.append(msg)
+    return incoming
+
+def ueba_guardrail_node(state: AgentState, config=None):
+    # All rules are pre-compiled into one automaton (see guardrails.py); the
+    # behaviour counters are keyed by user_id when given, else by thread_id.
+    configurable = (config or {}).get("configurable", {})
+    actor = configurable.get("user_id") or configurable.get("thread_id")
+    engine = guardrails.get_engine()
+    for msg in _incoming_human_messages(state["messages"]):
+        verdict = engine.scan(msg.content, actor)
+        if verdict.blocked:
+            print(f"🛡️ [UEBA] Blocked message from {actor}: {verdict.reason}")
             return {"security_risk": True, "messages": [AIMessage(content="SECURITY ALERT: Blocked.")]}
     return {"security_risk": False}
 
 # --- 6. WORKER AGENTS (UPDATED PROMPTS) ---
 
-data_analyst = create_react_agent(
-    llm_worker, 
-    tools=[fetch_telematics_data, analyze_fleet_trends, get_maintenance_history, brave_search], 
-    prompt=(
-        "You are a Lead Data Analyst. "
-        "1. If asked about a SPECIFIC vehicle, use 'fetch_telematics_data' and 'get_maintenance_history'. "
-        "2. If asked about 'Fleet Status', 'Forecasting', or 'Demand', use 'analyze_fleet_trends'. "
-        "3. Output the data summary clearly and then STOP."
+def _create_react_agent(tools, prompt):
+    from langgraph.prebuilt import create_react_agent
+    return create_react_agent(get_llm_worker(), tools=tools, prompt=prompt)
+
+@_singleton
+def get_data_analyst():
+    return _create_react_agent(
+        tools=[fetch_telematics_data, analyze_fleet_trends, get_maintenance_history, fleet_analytics, brave_search], 
+        prompt=(
+            "You are a Lead Data Analyst. "
+            "1. If asked about a SPECIFIC vehicle, use 'fetch_telematics_data' and 'get_maintenance_history'. "
+            "2. If asked about 'Fleet Status', 'Forecasting', or 'Demand', use 'analyze_fleet_trends'. "
+            "3. If asked about costs per model or service intervals across the fleet, use 'fleet_analytics'. "
+            "4. Output the data summary clearly and then STOP."
+        )
     )
-)
 
 # UPDATED: NO QUESTIONS, JUST FACTS
-diagnostician = create_react_agent(
-    llm_worker, 
-    tools=[diagnose_issue, update_vehicle_status, send_alert_to_maintenance_team, fetch_telematics_data, brave_search], 
-    prompt=(
-        "You are an empathetic but urgent Vehicle Health Expert. "
-        "1. When identifying a CRITICAL issue, explain the RISK in plain English. "
-        "2. DO NOT ASK 'Would you like to proceed?' or 'Should I book?'. "
-        "3. Instead, state: 'I am alerting the maintenance team and checking appointment slots immediately.' "
-        "4. Your job is to alarm the user enough to fix it, then STOP."
+@_singleton
+def get_diagnostician():
+    return _create_react_agent(
+        tools=[diagnose_issue, update_vehicle_status, send_alert_to_maintenance_team, fetch_telematics_data, brave_search], 
+        prompt=(
+            "You are an empathetic but urgent Vehicle Health Expert. "
+            "1. When identifying a CRITICAL issue, explain the RISK in plain English. "
+            "2. DO NOT ASK 'Would you like to proceed?' or 'Should I book?'. "
+            "3. Instead, state: 'I am alerting the maintenance team and checking appointment slots immediately.' "
+            "4. Your job is to alarm the user enough to fix it, then STOP."
+        )
     )
-)
 
 # UPDATED: CONFIDENT
-quality_engineer = create_react_agent(
-    llm_worker, 
-    tools=[get_rca_insights, report_manufacturing_defect], 
-    prompt=(
-        "You are a Senior Quality Engineer. "
-        "1. Check 'get_rca_insights'. "
-        "2. If a match is found, say: 'Good news—we have seen this before. It is a known issue with [Batch/Part].' "
-        "3. State the solution clearly. "
-        "4. End with 'QUALITY CHECK COMPLETE'."
+@_singleton
+def get_quality_engineer():
+    return _create_react_agent(
+        tools=[get_rca_insights, report_manufacturing_defect], 
+        prompt=(
+            "You are a Senior Quality Engineer. "
+            "1. Check 'get_rca_insights'. "
+            "2. If a match is found, say: 'Good news—we have seen this before. It is a known issue with [Batch/Part].' "
+            "3. State the solution clearly. "
+            "4. End with 'QUALITY CHECK COMPLETE'."
+        )
     )
-)
 
 # UPDATED: THE CLOSER
-scheduler = create_react_agent(
-    llm_worker, 
-    tools=[check_schedule_availability, book_appointment, send_notification_to_owner, update_vehicle_status], 
-    prompt=(
-        "You are a persuasive Service Concierge. "
-        "1. Your goal is to secure the booking. Do NOT ask 'Do you want to proceed?'. "
-        "2. Assume the user wants to book. Call 'check_schedule_availability' immediately. "
-        "3. State: 'To prevent damage, I have located priority slots at [List Slots].' "
-        "4. End with a specific Call to Action: 'Which of these times works best for you?'"
-        "5. If user provides a time, call 'book_appointment'."
+@_singleton
+def get_scheduler():
+    return _create_react_agent(
+        tools=[check_schedule_availability, book_appointment, send_notification_to_owner, update_vehicle_status], 
+        prompt=(
+            "You are a persuasive Service Concierge. "
+            "1. Your goal is to secure the booking. Do NOT ask 'Do you want to proceed?'. "
+            "2. Assume the user wants to book. Call 'check_schedule_availability' immediately. "
+            "3. State: 'To prevent damage, I have located priority slots at [List Slots].' "
+            "4. End with a specific Call to Action: 'Which of these times works best for you?'"
+            "5. If user provides a time, call 'book_appointment'."
+        )
     )
-)
 
-feedback_agent = create_react_agent(llm_worker, tools=[log_customer_feedback], prompt="Log feedback and say goodbye.")
+@_singleton
+def get_feedback_agent():
+    return _create_react_agent(tools=[log_customer_feedback], prompt="Log feedback and say goodbye.")
 
 # --- 7. SUPERVISOR (UPDATED LOGIC) ---
 members = ["DataAnalyst", "Diagnostician", "QualityEngineer", "Scheduler", "FeedbackAgent"]
 
 system_prompt = "You are a Supervisor. Select the next agent."
 
-class Router(BaseModel):
-    next: Literal["DataAnalyst", "Diagnostician", "QualityEngineer", "Scheduler", "FeedbackAgent", "FINISH"]
+@_singleton
+def get_router_model():
+    from pydantic import BaseModel
+
+    class Router(BaseModel):
+        next: Literal["DataAnalyst", "Diagnostician", "QualityEngineer", "Scheduler", "FeedbackAgent", "FINISH"]
 
-supervisor_chain = (
-    ChatPromptTemplate.from_messages([
-        ("system", system_prompt),
-        MessagesPlaceholder(variable_name="messages"),
-        ("system", "Metadata: is_proactive={is_proactive}"),
-        ("system", "Who acts next? {options}"),
-    ]).partial(options=str(members + ["FINISH"]))
-    | llm_supervisor.with_structured_output(Router)
-)
+    return Router
+
+@_singleton
+def get_supervisor_chain():
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+    return (
+        ChatPromptTemplate.from_messages([
+            ("system", system_prompt),
+            MessagesPlaceholder(variable_name="messages"),
+            ("system", "Metadata: is_proactive={is_proactive}"),
+            ("system", "Who acts next? {options}"),
+        ]).partial(options=str(members + ["FINISH"]))
+        | get_llm_supervisor().with_structured_output(get_router_model())
+    )
 
 def supervisor_node(state: AgentState):
     """
@@ -354,8 +635,9 @@ def supervisor_node(state: AgentState):
             return {"next": "QualityEngineer"}
             
         # 2. Quality -> Scheduler (Always transition to booking options)
+        # unless the sweep's batch scheduler already booked this vehicle.
         if "QUALITY CHECK COMPLETE" in content:
-            if "Available slots" not in history_str and "OPEN SLOTS" not in history_str:
+            if "Available slots" not in history_str and "OPEN SLOTS" not in history_str and "BOOKING COMPLETE" not in history_str:
                 return {"next": "Scheduler"}
             else:
                  return {"next": "FINISH"} 
@@ -412,22 +694,58 @@ def supervisor_node(state: AgentState):
     return {"next": "Scheduler"}
 
 # --- 8. GRAPH ---
-workflow = StateGraph(AgentState)
-workflow.add_node("UEBA_Check", ueba_guardrail_node)
-workflow.add_node("Supervisor", supervisor_node)
-workflow.add_node("DataAnalyst", data_analyst)
-workflow.add_node("Diagnostician", diagnostician)
-workflow.add_node("QualityEngineer", quality_engineer)
-workflow.add_node("Scheduler", scheduler)
-workflow.add_node("FeedbackAgent", feedback_agent)
-
-workflow.add_edge(START, "UEBA_Check")
-workflow.add_conditional_edges("UEBA_Check", lambda s: END if s.get("security_risk") else "Supervisor")
-workflow.add_conditional_edges("Supervisor", lambda s: s["next"], 
-    {"DataAnalyst":"DataAnalyst", "Diagnostician":"Diagnostician", "QualityEngineer":"QualityEngineer", 
-     "Scheduler":"Scheduler", "FeedbackAgent":"FeedbackAgent", "FINISH":END})
-
-for m in members: workflow.add_edge(m, "Supervisor")
-
-memory = MemorySaver()
-app = workflow.compile(checkpointer=memory)
\ No newline at end of file
+@_singleton
+def get_workflow():
+    from langgraph.graph import StateGraph, END, START
+
+    workflow = StateGraph(AgentState)
+    # Every node is timed into metrics.REGISTRY (kind="node")
+    workflow.add_node("UEBA_Check", metrics.timed("node", "UEBA_Check")(ueba_guardrail_node))
+    workflow.add_node("Supervisor", metrics.timed("node", "Supervisor")(supervisor_node))
+    workflow.add_node("DataAnalyst", metrics.traced_runnable("node", "DataAnalyst", get_data_analyst()))
+    workflow.add_node("Diagnostician", metrics.traced_runnable("node", "Diagnostician", get_diagnostician()))
+    workflow.add_node("QualityEngineer", metrics.traced_runnable("node", "QualityEngineer", get_quality_engineer()))
+    workflow.add_node("Scheduler", metrics.traced_runnable("node", "Scheduler", get_scheduler()))
+    workflow.add_node("FeedbackAgent", metrics.traced_runnable("node", "FeedbackAgent", get_feedback_agent()))
+
+    workflow.add_edge(START, "UEBA_Check")
+    workflow.add_conditional_edges("UEBA_Check", lambda s: END if s.get("security_risk") else "Supervisor")
+    workflow.add_conditional_edges("Supervisor", lambda s: s["next"], 
+        {"DataAnalyst":"DataAnalyst", "Diagnostician":"Diagnostician", "QualityEngineer":"QualityEngineer", 
+         "Scheduler":"Scheduler", "FeedbackAgent":"FeedbackAgent", "FINISH":END})
+
+    for m in members: workflow.add_edge(m, "Supervisor")
+    return workflow
+
+@_singleton
+def get_memory():
+    from langgraph.checkpoint.memory import MemorySaver
+    return MemorySaver()
+
+@_singleton
+def get_app():
+    """Compiled agent graph (shared MemorySaver), built on first use."""
+    return get_workflow().compile(checkpointer=get_memory())
+
+# Backwards-compatible lazy attributes: `from agents import app` still works,
+# but only pays the construction cost when the name is actually requested.
+_LAZY_ATTRS = {
+    "llm_supervisor": get_llm_supervisor,
+    "llm_worker": get_llm_worker,
+    "data_analyst": get_data_analyst,
+    "diagnostician": get_diagnostician,
+    "quality_engineer": get_quality_engineer,
+    "scheduler": get_scheduler,
+    "feedback_agent": get_feedback_agent,
+    "Router": get_router_model,
+    "supervisor_chain": get_supervisor_chain,
+    "workflow": get_workflow,
+    "memory": get_memory,
+    "app": get_app,
+}
+
+def __getattr__(name):
+    factory = _LAZY_ATTRS.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return factory()
@@ -0,0 +1,153 @@
+"""
+Event-driven alerts.
+
+A trigger on `vehicles` records every row that starts tripping an alert rule
+(diagnostics.py: e.g. engine_temp crossing 110°C) into `threshold_crossings`
+inside the writing transaction, so no write path can miss one. The trigger
+is generated from the rule table, so it tests exactly what the tool and the
+sweep test. Writers drain the table in the same transaction (DRAIN_SQL,
+e.g. at the end of the simulation tick) and publish the rows to an
+AlertDispatcher: an asyncio queue consumed by a small pool of diagnosis
+workers, with per-vehicle debouncing so a reading flapping around a
+threshold doesn't start a graph run every tick. Nothing is queried or run
+while no vehicle crosses a line.
+"""
+import asyncio
+import os
+import sqlite3
+import time
+
+import diagnostics
+import metrics
+
+# --- 1. CONFIGURATION ---
+WORKERS = int(os.getenv("FLEET_ALERT_WORKERS", "4"))
+DEBOUNCE_S = float(os.getenv("FLEET_ALERT_DEBOUNCE", "300")) # per vehicle
+
+TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS threshold_crossings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    vehicle_id TEXT,
+    engine_temp INTEGER
+);
+"""
+
+def trigger_sql(rules):
+    """Crossing triggers for a RuleSet: alert condition false (or unset) -> true."""
+    new, old = rules.sql_condition("NEW"), rules.sql_condition("OLD")
+    columns = ", ".join(rules.watched_columns()) or "engine_temp"
+    record = "INSERT INTO threshold_crossings (vehicle_id, engine_temp) VALUES (NEW.vehicle_id, NEW.engine_temp);"
+    return f"""
+DROP TRIGGER IF EXISTS trg_engine_temp_crossing;
+DROP TRIGGER IF EXISTS trg_alert_rule_crossing;
+DROP TRIGGER IF EXISTS trg_alert_rule_insert;
+DROP TRIGGER IF EXISTS trg_engine_temp_hot_insert;
+CREATE TRIGGER trg_alert_rule_crossing
+AFTER UPDATE OF {columns} ON vehicles
+WHEN coalesce({new}, 0) AND NOT coalesce({old}, 0)
+BEGIN
+    {record}
+END;
+CREATE TRIGGER trg_alert_rule_insert
+AFTER INSERT ON vehicles
+WHEN coalesce({new}, 0)
+BEGIN
+    {record}
+END;
+"""
+
+# Last statement of a write batch: hands back (and clears) what the batch crossed
+DRAIN_SQL = "DELETE FROM threshold_crossings RETURNING vehicle_id, engine_temp"
+
+def ensure_schema(db_path):
+    """Creates the crossings table and (re)builds the triggers from the current rules."""
+    diagnostics.ensure_schema(db_path)
+    rules = diagnostics.RuleSet(diagnostics.load_rules(db_path))
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(TABLE_SQL + trigger_sql(rules))
+    finally:
+        conn.close()
+
+def hot_vehicles(db_path):
+    """Vehicles already tripping an alert rule (they crossed before we were listening)."""
+    condition = diagnostics.get_rules(db_path).sql_condition("vehicles")
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(f"SELECT vehicle_id, engine_temp FROM vehicles WHERE {condition}").fetchall()
+    finally:
+        conn.close()
+
+# --- 2. DISPATCHER ---
+class AlertDispatcher:
+    """
+    Queue + worker pool for threshold crossings. publish() is cheap and
+    non-blocking (call it from the event loop); `handler(vehicle_id)` runs
+    on a worker. A vehicle published again within `debounce` seconds of its
+    last accepted event is dropped.
+    """
+
+    def __init__(self, handler, workers=WORKERS, debounce=DEBOUNCE_S):
+        self.handler = handler
+        self.workers = workers
+        self.debounce = debounce
+        self.published = 0
+        self.debounced = 0
+        self.handled = 0
+        self.failed = 0
+        self._queue = None
+        self._tasks = []
+        self._last = {} # vehicle_id -> monotonic time of the last accepted event
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def publish(self, vehicle_id, engine_temp=None):
+        """Queues one crossing; returns False if it was debounced."""
+        now = time.monotonic()
+        last = self._last.get(vehicle_id)
+        if last is not None and now - last < self.debounce:
+            self.debounced += 1
+            metrics.REGISTRY.inc("alert_debounced", "fleet")
+            return False
+        self._last[vehicle_id] = now
+        self.published += 1
+        self._queue.put_nowait((vehicle_id, engine_temp, time.perf_counter()))
+        return True
+
+    async def join(self):
+        """Waits until every queued crossing has been handled."""
+        await self._queue.join()
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize() if self._queue else 0,
+            "workers": len(self._tasks),
+            "published": self.published,
+            "debounced": self.debounced,
+            "handled": self.handled,
+            "failed": self.failed,
+        }
+
+    async def _worker(self):
+        while True:
+            vehicle_id, engine_temp, detected_at = await self._queue.get()
+            metrics.REGISTRY.observe("alert", "queue_wait", time.perf_counter() - detected_at)
+            error = False
+            try:
+                await self.handler(vehicle_id)
+                self.handled += 1
+            except Exception as e:
+                error = True
+                self.failed += 1
+                print(f"❌ [Alert] Diagnosis failed for {vehicle_id} ({engine_temp}°C): {e}")
+            finally:
+                metrics.REGISTRY.observe("alert", "detect_to_alert", time.perf_counter() - detected_at, error)
+                self._queue.task_done()
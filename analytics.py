@@ -0,0 +1,266 @@
+"""
+Columnar analytics over fleet snapshots.
+
+Snapshots vehicles, maintenance_history and the telemetry history
+into Arrow IPC files (memory-mapped on read, so repeated reports don't copy
+the data) and optionally Parquet, then runs vectorized aggregations with
+pyarrow.compute / NumPy instead of row-by-row SQL.
+
+CLI:
+    python analytics.py export [--parquet]
+    python analytics.py cost-per-model
+    python analytics.py service-intervals
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError: # optional: only the analytics tool/CLI need them
+    np = pa = pc = None
+
+# --- 1. CONFIGURATION ---
+DB_NAME = "fleet_data.db"
+# Each database gets its own subdirectory (see snapshot_dir)
+SNAPSHOT_DIR = os.getenv("FLEET_ANALYTICS_DIR", "analytics_snapshot")
+# Reports re-export when the snapshot is older than this
+SNAPSHOT_MAX_AGE = float(os.getenv("FLEET_ANALYTICS_MAX_AGE", "300"))
+FETCH_BATCH = 50_000
+
+TABLES = ("vehicles", "maintenance_history", "telemetry")
+
+def snapshot_dir(db_path=None):
+    """Snapshot directory of one database: two databases never read or overwrite each other's files."""
+    db_path = os.path.abspath(db_path or DB_NAME)
+    key = hashlib.blake2b(db_path.encode(), digest_size=6).hexdigest()
+    return os.path.join(SNAPSHOT_DIR, f"{os.path.splitext(os.path.basename(db_path))[0]}-{key}")
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Fleet analytics needs pyarrow and numpy (pip install pyarrow numpy).")
+
+def _schemas():
+    return {
+        "vehicles": pa.schema([
+            ("vehicle_id", pa.string()), ("model", pa.string()), ("engine_temp", pa.int64()),
+            ("oil_life", pa.int64()), ("tire_pressure", pa.int64()), ("odometer", pa.int64()),
+            ("error_code", pa.string()), ("status", pa.string()),
+        ]),
+        "maintenance_history": pa.schema([
+            ("id", pa.int64()), ("vehicle_id", pa.string()), ("service_date", pa.string()),
+            ("service_type", pa.string()), ("description", pa.string()), ("cost", pa.int64()),
+        ]),
+    }
+
+def _telemetry_schema():
+    return pa.schema([
+        ("vehicle_id", pa.string()), ("model", pa.string()), ("engine_temp", pa.int64()),
+        ("oil_life", pa.int64()), ("odometer", pa.int64()), ("captured_at", pa.timestamp("s")),
+    ])
+
+_QUERIES = {
+    "vehicles": "SELECT vehicle_id, model, engine_temp, oil_life, tire_pressure, odometer, error_code, status FROM vehicles",
+    "maintenance_history": "SELECT id, vehicle_id, service_date, service_type, description, cost FROM maintenance_history",
+}
+TELEMETRY_QUERY = (
+    "SELECT h.vehicle_id, v.model, h.engine_temp, h.oil_life, h.odometer, h.recorded_at "
+    "FROM telemetry_history h LEFT JOIN vehicles v ON v.vehicle_id = h.vehicle_id ORDER BY h.id"
+)
+
+# --- 2. SNAPSHOT / EXPORT ---
+def _read_sql(conn, query, schema):
+    """Streams a query into Arrow record batches (FETCH_BATCH rows at a time)."""
+    cur = conn.execute(query)
+    batches = []
+    while True:
+        rows = cur.fetchmany(FETCH_BATCH)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        batches.append(pa.record_batch(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+        ))
+    return pa.Table.from_batches(batches, schema=schema)
+
+@contextmanager
+def _replacing(path):
+    """
+    Yields a uniquely named temp file next to `path` and moves it into place
+    on success, so readers never see a half-written file and concurrent
+    exports never write into the same temp file.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def _write_ipc(table, path):
+    with _replacing(path) as tmp:
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+def export_snapshot(db_path=None, out_dir=None, parquet=False):
+    """
+    Snapshots the SQLite tables to `<out_dir>/<table>.arrow` (out_dir
+    defaults to the database's snapshot_dir). "telemetry" is the
+    telemetry_history table (with each vehicle's model); a database without
+    that table gets the live vehicles readings instead, stamped with now.
+    """
+    require_pyarrow()
+    db_path = db_path or DB_NAME
+    out_dir = out_dir or snapshot_dir(db_path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        tables = {name: _read_sql(conn, _QUERIES[name], schema) for name, schema in _schemas().items()}
+        has_history = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'telemetry_history'").fetchone()
+        if has_history:
+            tables["telemetry"] = _read_sql(conn, TELEMETRY_QUERY, _telemetry_schema())
+    finally:
+        conn.close()
+
+    hist = tables["maintenance_history"]
+    tables["maintenance_history"] = hist.set_column(
+        hist.schema.get_field_index("service_date"), "service_date", hist["service_date"].cast(pa.date32())
+    )
+    if "telemetry" not in tables:
+        vehicles = tables["vehicles"]
+        captured_at = pa.array([int(time.time())] * vehicles.num_rows, type=pa.timestamp("s"))
+        tables["telemetry"] = vehicles.select(
+            ["vehicle_id", "model", "engine_temp", "oil_life", "odometer"]
+        ).append_column("captured_at", captured_at)
+
+    paths = {}
+    for name, table in tables.items():
+        paths[name] = os.path.join(out_dir, f"{name}.arrow")
+        _write_ipc(table, paths[name])
+        if parquet:
+            import pyarrow.parquet as pq
+            with _replacing(os.path.join(out_dir, f"{name}.parquet")) as tmp:
+                pq.write_table(table, tmp, compression="zstd")
+    return paths
+
+def load_table(name, out_dir=None):
+    """Memory-maps a snapshot table (zero-copy)."""
+    require_pyarrow()
+    path = os.path.join(out_dir or snapshot_dir(), f"{name}.arrow")
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+def snapshot_age(out_dir=None):
+    """Seconds since the oldest snapshot table was written (inf if missing)."""
+    out_dir = out_dir or snapshot_dir()
+    try:
+        return time.time() - min(os.path.getmtime(os.path.join(out_dir, f"{t}.arrow")) for t in TABLES)
+    except OSError:
+        return float("inf")
+
+def ensure_snapshot(db_path=None, out_dir=None, max_age=SNAPSHOT_MAX_AGE):
+    """Re-exports a stale snapshot. Returns its directory (pass it to the reports)."""
+    out_dir = out_dir or snapshot_dir(db_path)
+    if snapshot_age(out_dir) > max_age:
+        export_snapshot(db_path, out_dir)
+    return out_dir
+
+# --- 3. VECTORIZED AGGREGATIONS ---
+def cost_per_model(out_dir=None):
+    """Total/mean service cost, service count and cost per vehicle for each model."""
+    hist = load_table("maintenance_history", out_dir)
+    vehicles = load_table("vehicles", out_dir).select(["vehicle_id", "model"])
+    joined = hist.select(["vehicle_id", "cost"]).join(vehicles, "vehicle_id")
+    grouped = joined.group_by("model").aggregate([
+        ("cost", "sum"), ("cost", "mean"), ("cost", "count"), ("vehicle_id", "count_distinct"),
+    ])
+    rows = []
+    for row in grouped.to_pylist():
+        vehicles_served = row["vehicle_id_count_distinct"]
+        rows.append({
+            "model": row["model"],
+            "total_cost": row["cost_sum"],
+            "mean_cost": round(row["cost_mean"], 2),
+            "services": row["cost_count"],
+            "vehicles": vehicles_served,
+            "cost_per_vehicle": round(row["cost_sum"] / vehicles_served, 2) if vehicles_served else 0.0,
+        })
+    rows.sort(key=lambda r: r["total_cost"], reverse=True)
+    return rows
+
+def _gaps(table, keys):
+    """Days between consecutive services that share `keys` (vectorized, no Python loop over rows)."""
+    ordered = table.sort_by([(k, "ascending") for k in keys] + [("service_date", "ascending")])
+    days = ordered["service_date"].cast(pa.int32()).to_numpy()
+    if len(days) < 2:
+        return np.array([], dtype=np.int32)
+    same = np.ones(len(days) - 1, dtype=bool)
+    for key in keys:
+        col = ordered[key].combine_chunks()
+        same &= pc.equal(col.slice(1), col.slice(0, len(col) - 1)).to_numpy(zero_copy_only=False)
+    return np.diff(days)[same]
+
+def _describe(gaps):
+    if len(gaps) == 0:
+        return {"intervals": 0}
+    p10, p25, p50, p75, p90 = np.percentile(gaps, [10, 25, 50, 75, 90])
+    return {
+        "intervals": int(len(gaps)), "mean_days": round(float(gaps.mean()), 1),
+        "p10": float(p10), "p25": float(p25), "p50": float(p50), "p75": float(p75), "p90": float(p90),
+    }
+
+def service_intervals(out_dir=None):
+    """Distribution of days between services: any service, and per service type."""
+    hist = load_table("maintenance_history", out_dir).select(["vehicle_id", "service_type", "service_date"])
+    by_type = {}
+    for service_type in pc.unique(hist["service_type"]).to_pylist():
+        subset = hist.filter(pc.equal(hist["service_type"], service_type))
+        by_type[service_type] = _describe(_gaps(subset, ["vehicle_id"]))
+    return {"any_service": _describe(_gaps(hist, ["vehicle_id"])), "by_service_type": by_type}
+
+REPORTS = {
+    "cost_per_model": cost_per_model,
+    "service_intervals": service_intervals,
+}
+
+def format_report(name, result):
+    if name == "cost_per_model":
+        lines = [f"- {r['model']}: ${r['total_cost']:,} total, ${r['mean_cost']} avg/service, "
+                 f"{r['services']} services, ${r['cost_per_vehicle']} per vehicle" for r in result]
+    else:
+        overall = result["any_service"]
+        lines = [f"- Any service: median {overall.get('p50', 'n/a')} days (p10 {overall.get('p10', 'n/a')}, p90 {overall.get('p90', 'n/a')})"]
+        for s_type, d in sorted(result["by_service_type"].items()):
+            lines.append(f"- {s_type}: median {d.get('p50', 'n/a')} days over {d['intervals']} intervals")
+    return f"📈 FLEET ANALYTICS: {name}\n" + "\n".join(lines)
+
+# --- 4. CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "cost-per-model", "service-intervals"])
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--out", default=None, help="Snapshot directory (default: one per --db under FLEET_ANALYTICS_DIR)")
+    parser.add_argument("--parquet", action="store_true", help="Also write zstd Parquet files")
+    args = parser.parse_args(argv)
+
+    out_dir = args.out or snapshot_dir(args.db)
+    if args.command == "export":
+        t0 = time.perf_counter()
+        paths = export_snapshot(args.db, out_dir, parquet=args.parquet)
+        print(f"✅ Exported {', '.join(paths)} to {out_dir} in {time.perf_counter() - t0:.2f}s")
+        return
+    ensure_snapshot(args.db, out_dir)
+    name = args.command.replace("-", "_")
+    print(format_report(name, REPORTS[name](out_dir)))
+
+if __name__ == "__main__":
+    main()
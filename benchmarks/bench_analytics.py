@@ -0,0 +1,114 @@
+"""
+Columnar analytics vs the equivalent SQL on a synthetic large fleet.
+
+Builds a temporary SQLite fleet (same schema as database_setup.py), exports
+it with analytics.export_snapshot() and times each report both ways.
+
+Usage:
+    python benchmarks/bench_analytics.py
+    python benchmarks/bench_analytics.py --vehicles 100000 --history 20
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analytics
+
+MODELS = ["F-150", "Sedan", "SUV", "Truck", "Coupe", "Van"]
+SERVICES = [("Oil Change", 80), ("Tire Rotation", 40), ("Brake Inspection", 50),
+            ("Fluid Top-off", 30), ("Air Filter", 45), ("Battery Check", 25)]
+
+def build_synthetic_db(path, vehicles, history_per_vehicle, seed=7):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE vehicles (vehicle_id TEXT PRIMARY KEY, model TEXT, engine_temp INTEGER, oil_life INTEGER,
+                               tire_pressure INTEGER, odometer INTEGER, error_code TEXT, status TEXT);
+        CREATE TABLE maintenance_history (id INTEGER PRIMARY KEY AUTOINCREMENT, vehicle_id TEXT, service_date TEXT,
+                                          service_type TEXT, description TEXT, cost INTEGER);
+    """)
+    conn.executemany("INSERT INTO vehicles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+        (f"Vehicle-{i:07d}", rng.choice(MODELS), rng.randint(85, 120), rng.randint(0, 100),
+         rng.randint(28, 36), rng.randint(1000, 150000), rng.choice(["None"] * 8 + ["P0118", "P0420"]), "Active")
+        for i in range(vehicles)
+    ))
+    start = date(2020, 1, 1)
+    def history():
+        for i in range(vehicles):
+            for _ in range(history_per_vehicle):
+                s_type, cost = rng.choice(SERVICES)
+                yield (f"Vehicle-{i:07d}", (start + timedelta(days=rng.randint(0, 1800))).isoformat(), s_type, s_type, cost)
+    conn.executemany(
+        "INSERT INTO maintenance_history (vehicle_id, service_date, service_type, description, cost) VALUES (?, ?, ?, ?, ?)",
+        history()
+    )
+    conn.commit()
+    conn.close()
+
+def sql_cost_per_model(db):
+    conn = sqlite3.connect(db)
+    rows = conn.execute("""
+        SELECT v.model, SUM(h.cost), AVG(h.cost), COUNT(*), COUNT(DISTINCT h.vehicle_id)
+        FROM maintenance_history h JOIN vehicles v ON v.vehicle_id = h.vehicle_id
+        GROUP BY v.model
+    """).fetchall()
+    conn.close()
+    return rows
+
+def sql_service_intervals(db):
+    conn = sqlite3.connect(db)
+    gaps = [r[0] for r in conn.execute("""
+        SELECT gap FROM (
+            SELECT julianday(service_date) - julianday(LAG(service_date) OVER (PARTITION BY vehicle_id ORDER BY service_date)) AS gap
+            FROM maintenance_history
+        ) WHERE gap IS NOT NULL
+    """)]
+    conn.close()
+    return statistics.quantiles(gaps, n=10) if len(gaps) > 1 else []
+
+def best_of(fn, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, default=20000)
+    parser.add_argument("--history", type=int, default=10, help="Service records per vehicle")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "fleet.db")
+        snap = os.path.join(tmp, "snapshot")
+        t0 = time.perf_counter()
+        build_synthetic_db(db, args.vehicles, args.history)
+        print(f"📊 Synthetic fleet: {args.vehicles:,} vehicles, {args.vehicles * args.history:,} service records "
+              f"(built in {time.perf_counter() - t0:.1f}s)")
+
+        export_s = best_of(lambda: analytics.export_snapshot(db, snap), 1)
+        print(f"   export_snapshot: {export_s * 1000:.0f} ms (one-off per refresh)")
+
+        print(f"{'report':<20} {'sql ms':>10} {'arrow ms':>10} {'speedup':>8}")
+        cases = [
+            ("cost_per_model", lambda: sql_cost_per_model(db), lambda: analytics.cost_per_model(snap)),
+            ("service_intervals", lambda: sql_service_intervals(db), lambda: analytics.service_intervals(snap)),
+        ]
+        for name, sql_fn, arrow_fn in cases:
+            sql_s = best_of(sql_fn, args.runs)
+            arrow_s = best_of(arrow_fn, args.runs)
+            print(f"{name:<20} {sql_s * 1000:>10.1f} {arrow_s * 1000:>10.1f} {sql_s / arrow_s:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Diagnostic rule evaluation on large synthetic rule sets.
+
+Builds N DTC rules and M threshold rules per vehicle model, then times:
+  * compiling the RuleSet
+  * one vehicle: RuleSet.matches vs a linear scan over every rule (what an
+    if-chain per rule amounts to)
+  * a whole fleet: RuleSet.screen (numpy) vs is_alert per vehicle
+and checks all three give the same answers.
+
+Usage:
+    python benchmarks/bench_diagnostics.py
+    python benchmarks/bench_diagnostics.py --dtcs 2000 --thresholds 500 --vehicles 200000
+"""
+import argparse
+import operator
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diagnostics
+
+MODELS = ["F-150", "Sedan", "SUV", "Truck", "Coupe", "Van"]
+OPS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+RANGES = {"engine_temp": (80, 130), "oil_life": (0, 100), "tire_pressure": (20, 40), "odometer": (0, 200_000)}
+
+def synthetic_rules(dtcs, thresholds, rng):
+    rows = []
+    for model in ["*"] + MODELS:
+        for _ in range(dtcs):
+            code = f"P{rng.randint(0, 3999):04d}"
+            rows.append((model, code, None, None, None, "WARNING", int(rng.random() < 0.1), f"{code} on {model}"))
+        for _ in range(thresholds):
+            metric = rng.choice(list(RANGES))
+            low, high = RANGES[metric]
+            op = rng.choice(list(OPS))
+            # Limits sit in the outer fifth of the range, so most vehicles trip few rules
+            span = (high - low) * rng.uniform(0, 0.2)
+            value = high - span if op[0] == ">" else low + span
+            rows.append((model, None, metric, op, value, "WARNING", int(rng.random() < 0.05), f"{metric} {op} rule"))
+    return [diagnostics.Rule(i, *row) for i, row in enumerate(rows, start=1)]
+
+def synthetic_fleet(vehicles, rng):
+    return [{
+        "vehicle_id": f"Vehicle-{i:07d}", "model": rng.choice(MODELS),
+        "error_code": f"P{rng.randint(0, 3999):04d}" if rng.random() < 0.3 else "None",
+        **{metric: rng.randint(low, high) for metric, (low, high) in RANGES.items()},
+    } for i in range(vehicles)]
+
+def linear_scan(rules, data):
+    """Baseline: test every rule in turn."""
+    fired = []
+    for r in rules:
+        if r.model not in ("*", data["model"]):
+            continue
+        if r.code:
+            if r.code == data["error_code"]:
+                fired.append(r)
+        elif OPS[r.op](data[r.metric], r.value):
+            fired.append(r)
+    return fired
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dtcs", type=int, default=500, help="DTC rules per model (and for '*')")
+    parser.add_argument("--thresholds", type=int, default=200, help="Threshold rules per model (and for '*')")
+    parser.add_argument("--vehicles", type=int, default=100_000)
+    parser.add_argument("--sample", type=int, default=2_000, help="Vehicles timed one by one")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(11)
+    rules = synthetic_rules(args.dtcs, args.thresholds, rng)
+    fleet = synthetic_fleet(args.vehicles, rng)
+    sample = fleet[:args.sample]
+    print(f"🧪 {len(rules):,} rules ({len(MODELS) + 1} scopes), {len(fleet):,} vehicles")
+
+    compiled, compile_s = timed(lambda: diagnostics.RuleSet(rules))
+    print(f"compile                   {compile_s * 1000:10.1f} ms")
+
+    scanned, scan_s = timed(lambda: [linear_scan(rules, d) for d in sample])
+    matched, match_s = timed(lambda: [compiled.matches(d["error_code"], d, d["model"]) for d in sample])
+    assert [sorted(r.id for r in f) for f in scanned] == [[r.id for r in f] for f in matched]
+    print(f"one vehicle, linear scan  {scan_s / len(sample) * 1e6:10.1f} µs")
+    print(f"one vehicle, compiled     {match_s / len(sample) * 1e6:10.1f} µs   ({scan_s / match_s:.0f}x)")
+
+    columns, columns_s = timed(lambda: diagnostics.columns_from_rows(fleet))
+    (alert, tripped), screen_s = timed(lambda: compiled.screen(columns))
+    looped, loop_s = timed(lambda: [compiled.is_alert(d) for d in sample])
+    assert list(alert[:len(sample)]) == looped
+    assert [int(t) for t in tripped[:len(sample)]] == [len(f) for f in matched]
+    per_vehicle_s = loop_s / len(sample) * len(fleet)
+    print(f"fleet, is_alert loop      {per_vehicle_s * 1000:10.1f} ms   (extrapolated from {len(sample):,})")
+    print(f"fleet, screen             {screen_s * 1000:10.1f} ms   ({per_vehicle_s / screen_s:.0f}x, "
+          f"+{columns_s * 1000:.0f} ms to build columns from dicts)")
+    print(f"flagged {int(alert.sum()):,} vehicles, {int(tripped.sum()):,} rule hits")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Fleet forecast cost on a synthetic large fleet.
+
+Times the initial fit of forecasting.DegradationModel over the whole history,
+an incremental update with one new reading per vehicle (a simulation tick),
+and the vectorized forecast itself.
+
+Usage:
+    python benchmarks/bench_forecasting.py
+    python benchmarks/bench_forecasting.py --vehicles 200000 --readings 50
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import forecasting
+
+MODELS = np.array(["F-150", "Sedan", "SUV", "Truck", "Coupe", "Van"], dtype=object)
+
+def synthetic_history(vehicles, readings, rng, start=1_700_000_000):
+    """Hourly readings: 20-40 mi/h, ~1% oil per 50 miles (with oil changes), slow temp drift."""
+    vids = np.array([f"Vehicle-{i:07d}" for i in range(vehicles)], dtype=object)
+    hours = np.arange(readings)
+    mph = rng.integers(20, 41, vehicles)
+    odo0 = rng.integers(1_000, 150_000, vehicles)
+    oil0 = rng.integers(30, 101, vehicles)
+    drift = rng.normal(0.0, 0.05, vehicles)
+
+    miles = mph[:, None] * hours[None, :]
+    oil = oil0[:, None] - miles // 50
+    oil = np.where(oil < 5, oil + 95, oil) # an oil change partway through
+    temp = 90 + drift[:, None] * hours[None, :] + rng.normal(0, 1, (vehicles, readings))
+    return {
+        "vehicle_id": np.repeat(vids, readings),
+        "recorded_at": (start + hours * 3600)[None, :].repeat(vehicles, axis=0).ravel(),
+        "odometer": (odo0[:, None] + miles).ravel(),
+        "oil_life": np.clip(oil, 0, 100).ravel(),
+        "engine_temp": temp.round().ravel(),
+    }, vids, start + readings * 3600
+
+def current_fleet(vids, rng):
+    n = len(vids)
+    return {
+        "vehicle_id": vids,
+        "model": MODELS[rng.integers(0, len(MODELS), n)],
+        "engine_temp": rng.integers(85, 115, n).astype(float),
+        "oil_life": rng.integers(0, 101, n).astype(float),
+        "odometer": rng.integers(1_000, 150_000, n).astype(float),
+        "error_code": np.where(rng.random(n) < 0.1, "P0420", "None").astype(object),
+    }
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, default=100_000)
+    parser.add_argument("--readings", type=int, default=50, help="History readings per vehicle")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    history, vids, next_t = synthetic_history(args.vehicles, args.readings, rng)
+    print(f"🔮 Synthetic fleet: {args.vehicles:,} vehicles, {len(history['vehicle_id']):,} telemetry readings")
+
+    model = forecasting.DegradationModel()
+    _, fit_s = timed(lambda: model.update(*history.values()))
+    print(f"   initial fit:        {fit_s * 1000:>8.0f} ms")
+
+    tick = {
+        "vehicle_id": vids,
+        "recorded_at": np.full(len(vids), next_t),
+        "odometer": history["odometer"][args.readings - 1::args.readings] + 30,
+        "oil_life": history["oil_life"][args.readings - 1::args.readings],
+        "engine_temp": history["engine_temp"][args.readings - 1::args.readings],
+    }
+    _, tick_s = timed(lambda: model.update(*tick.values()))
+    print(f"   incremental tick:   {tick_s * 1000:>8.0f} ms ({len(vids):,} new readings, no refit)")
+
+    fleet = current_fleet(vids, rng)
+    result, forecast_s = timed(lambda: forecasting.forecast(model, fleet))
+    print(f"   forecast:           {forecast_s * 1000:>8.0f} ms")
+    print(f"   -> {result['due_within_horizon']:,} vehicles due within {result['horizon_days']} days, "
+          f"{result['estimated_hours']:,.0f} labour hours; median {result['fleet_trends']['miles_per_day']} mi/day")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Per-refresh payload of the Streamlit dashboard, before and after paging.
+
+Runs the FastAPI app in-process against a synthetic fleet and compares what
+one dashboard refresh fetched before (the old `/` body with every vehicle id
++ every alert, every 2 s) with what it fetches now (`/health` and
+`/alerts?limit=1` every 2 s plus one 50-row `/vehicles` page per 10 s cache
+TTL, revalidated with If-None-Match). Also counts the sidebar elements
+Streamlit has to diff: one st.code per vehicle vs one table.
+
+Usage:
+    python benchmarks/bench_frontend_payload.py
+    python benchmarks/bench_frontend_payload.py --vehicles 50000 --alerts 500
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import main as backend
+
+ALERT_POLL_SECONDS = 2
+FLEET_REFRESH_SECONDS = 10
+PAGE_SIZE = 50
+
+def build_fleet(path, vehicles, seed=7):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE vehicles (vehicle_id TEXT PRIMARY KEY, model TEXT, engine_temp INTEGER, oil_life INTEGER,
+                                           tire_pressure INTEGER, odometer INTEGER, error_code TEXT, status TEXT)""")
+    conn.executemany("INSERT INTO vehicles VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (
+        (f"Vehicle-{i:07d}", rng.choice(["F-150", "Sedan", "SUV", "Van"]), 90, 50, 32, 10000, "None", "Active")
+        for i in range(vehicles)
+    ))
+    conn.commit()
+    conn.close()
+
+def fetch(client, url, headers=None):
+    t0 = time.perf_counter()
+    res = client.get(url, headers=headers)
+    assert res.status_code in (200, 304), res.status_code
+    return len(res.content), time.perf_counter() - t0, res
+
+def old_root():
+    """What `/` used to return on every ping."""
+    t0 = time.perf_counter()
+    body = json.dumps({"status": "Fleet Command AI is Online", "monitored_vehicles": backend.get_monitored_vehicles()})
+    return len(body), time.perf_counter() - t0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vehicles", type=int, default=10_000)
+    parser.add_argument("--alerts", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend.DB_NAME = os.path.join(tmp, "fleet.db")
+        build_fleet(backend.DB_NAME, args.vehicles)
+        backend.active_alerts[:] = [{
+            "vehicle_id": f"Vehicle-{i:07d}", "severity": "CRITICAL", "message": "Overheating. " * 60,
+            "timestamp": "Just now", "thread_id": f"alert_{i}", "booked_slot": None,
+        } for i in range(args.alerts)]
+        client = TestClient(backend.app)
+
+        root_b, root_s = old_root()
+        alerts_b, alerts_s, _ = fetch(client, "/alerts")
+        before_b, before_s = root_b + alerts_b, root_s + alerts_s
+
+        health_b, health_s, _ = fetch(client, "/health")
+        latest_b, latest_s, _ = fetch(client, "/alerts?limit=1")
+        page_b, page_s, res = fetch(client, f"/vehicles?limit={PAGE_SIZE}")
+        revalidate_b, revalidate_s, res = fetch(client, f"/vehicles?limit={PAGE_SIZE}", {"If-None-Match": res.headers["ETag"]})
+        assert res.status_code == 304
+        amortized = ALERT_POLL_SECONDS / FLEET_REFRESH_SECONDS # vehicle page is fetched once per TTL
+        after_b = health_b + latest_b + page_b * amortized
+        after_s = health_s + latest_s + page_s * amortized
+
+    print(f"🖥️  Dashboard refresh: {args.vehicles:,} vehicles, {args.alerts} alerts")
+    print(f"{'':<10} {'bytes/refresh':>14} {'server ms':>10} {'sidebar elements':>17}")
+    print(f"{'before':<10} {before_b:>14,.0f} {before_s * 1000:>10.1f} {args.vehicles:>17,}")
+    print(f"{'after':<10} {after_b:>14,.0f} {after_s * 1000:>10.1f} {1:>17,}")
+    print(f"-> {before_b / after_b:,.0f}x fewer bytes per refresh; an unchanged page revalidates as a "
+          f"{revalidate_b}-byte 304 ({revalidate_s * 1000:.1f} ms) instead of {page_b:,} bytes")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Scan cost per message for the UEBA guardrail engine as the rule set grows.
+
+Compares the compiled engine against the naive "for rule in rules: test it"
+loop (substring test or regex search per rule), and shows
+the Aho-Corasick automaton on its own: in pure Python it only pays off from
+a few hundred literal rules, which is why the engine falls back to the
+substring loop below guardrails.AUTOMATON_MIN_PATTERNS.
+
+Usage:
+    python benchmarks/bench_guardrails.py
+    python benchmarks/bench_guardrails.py --rules 1000 10000 50000 --messages 2000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from guardrails import AUTOMATON_MIN_PATTERNS, DEFAULT_RULES, AhoCorasick, GuardrailEngine, normalize
+
+VOCAB = (
+    "engine temp oil life coolant sensor vehicle booking slot service brake tire "
+    "pressure warning check status fleet truck sedan noise smell smoke battery "
+    "please can you book tomorrow morning error code diagnostic history"
+).split()
+
+def synthetic_rules(count, rng):
+    rules = list(DEFAULT_RULES)
+    for i in range(count - len(rules)):
+        phrase = " ".join(rng.choice(VOCAB) + str(rng.randint(0, 999)) for _ in range(rng.randint(2, 4)))
+        rules.append((f"syn-{i}", "synthetic", phrase, "flag"))
+    return rules
+
+def synthetic_messages(count, rng, length=40):
+    return [" ".join(rng.choice(VOCAB) for _ in range(length)) for _ in range(count)]
+
+def naive_scan(phrases, regexes, text):
+    norm = normalize(text)
+    return [p for p in phrases if p in norm] + [r for r in regexes if r.search(norm)]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, nargs="+", default=[100, 1000, 5000, 10000])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    messages = synthetic_messages(args.messages, rng)
+    print(f"🛡️  Guardrail scan benchmark ({args.messages} messages, ~{len(messages[0])} chars each)")
+    print(f"{'rules':>8} {'build ms':>10} {'engine us/msg':>14} {'automaton us':>13} {'naive us/msg':>13} {'speedup':>8}  matcher")
+
+    for count in args.rules:
+        rules = synthetic_rules(count, rng)
+        t0 = time.perf_counter()
+        engine = GuardrailEngine(rules)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        for msg in messages:
+            engine.match(msg)
+        engine_us = (time.perf_counter() - t0) / len(messages) * 1e6
+
+        phrases = [normalize(p) for _, _, p, _ in rules if not p.startswith("re:")]
+        regexes = [re.compile(p[3:], re.IGNORECASE) for _, _, p, _ in rules if p.startswith("re:")]
+        automaton = AhoCorasick(phrases)
+        t0 = time.perf_counter()
+        for msg in messages:
+            automaton.search(normalize(msg))
+        automaton_us = (time.perf_counter() - t0) / len(messages) * 1e6
+
+        t0 = time.perf_counter()
+        for msg in messages:
+            naive_scan(phrases, regexes, msg)
+        naive_us = (time.perf_counter() - t0) / len(messages) * 1e6
+
+        matcher = "automaton" if len(phrases) >= AUTOMATON_MIN_PATTERNS else "substring"
+        print(f"{count:>8} {build_ms:>10.1f} {engine_us:>14.1f} {automaton_us:>13.1f} {naive_us:>13.1f} "
+              f"{naive_us / engine_us:>7.1f}x  {matcher}")
+
+if __name__ == "__main__":
+    main()
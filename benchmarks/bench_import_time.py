@@ -0,0 +1,110 @@
+"""
+Cold-start benchmark for the backend modules.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter several
+times per module and reports the cumulative import time of the module itself,
+plus the heaviest imports it pulls in. Exits non-zero when a module goes over
+its budget, so it can be wired into CI.
+
+Usage:
+    python benchmarks/bench_import_time.py
+    python benchmarks/bench_import_time.py --runs 10 --budget agents=400
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold-start budget per module, in milliseconds
+DEFAULT_BUDGETS_MS = {
+    "agents": 1000,
+    "main": 1400,
+    "test_agents": 1000,
+}
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+def measure_once(module):
+    """Returns (cumulative_us, [(cumulative_us, name), ...]) for one cold import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_us = None
+    top_level = []
+    for line in proc.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        if name == module and total_us is None and len(indent) == 1:
+            total_us = int(cumulative)
+        # Direct children of the measured module (one level of indentation deeper)
+        if len(indent) == 3:
+            top_level.append((int(cumulative), name))
+    return total_us or 0, top_level
+
+def bench(module, runs):
+    samples = []
+    children = []
+    for _ in range(runs):
+        total_us, children = measure_once(module)
+        samples.append(total_us / 1000)
+    return {
+        "module": module,
+        "min_ms": min(samples),
+        "median_ms": statistics.median(samples),
+        "max_ms": max(samples),
+        "heaviest": sorted(children, reverse=True)[:5],
+    }
+
+def parse_budgets(items):
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for item in items or []:
+        name, _, value = item.partition("=")
+        budgets[name] = float(value)
+    return budgets
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_BUDGETS_MS))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", action="append", metavar="MODULE=MS", help="Override a module's budget")
+    args = parser.parse_args(argv)
+
+    budgets = parse_budgets(args.budget)
+    over_budget = []
+
+    print(f"⏱️  Import-time benchmark ({args.runs} cold runs per module)")
+    for module in args.modules:
+        result = bench(module, args.runs)
+        budget = budgets.get(module)
+        verdict = ""
+        if budget is not None:
+            ok = result["median_ms"] <= budget
+            verdict = f"  budget {budget:.0f} ms {'✅' if ok else '❌'}"
+            if not ok:
+                over_budget.append(module)
+        print(
+            f"\n{module}: median {result['median_ms']:.1f} ms "
+            f"(min {result['min_ms']:.1f}, max {result['max_ms']:.1f}){verdict}"
+        )
+        for cumulative_us, name in result["heaviest"]:
+            print(f"   {cumulative_us / 1000:8.1f} ms  {name}")
+
+    if over_budget:
+        print(f"\n❌ Over budget: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
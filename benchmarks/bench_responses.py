@@ -0,0 +1,106 @@
+"""
+Bytes on the wire and serialization time for the heavy JSON endpoints.
+
+For /alerts, a 500-row /vehicles page and a /chat/batch NDJSON stream built
+from a synthetic large fleet, compares:
+  * FastAPI's default path (jsonable_encoder + json.dumps)
+  * main.dumps with the stdlib encoder (what the endpoints use now)
+  * main.dumps with orjson (FLEET_FAST_JSON=1)
+and the gzip size at the middleware's level. Then checks end to end that
+the app actually sends Content-Encoding: gzip above the threshold.
+
+Usage:
+    python benchmarks/bench_responses.py
+    python benchmarks/bench_responses.py --alerts 5000 --batch 1000
+"""
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+import main as backend
+
+WORDS = ("engine coolant temperature sensor P0118 thermostat replace inspect batch defect "
+         "recommended slot booking quality supplier radiator fan circuit voltage 🔧 ⚠️").split()
+
+def llm_message(rng, words=250):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def synthetic_payloads(alerts, page, batch, rng):
+    alert_rows = [{
+        "vehicle_id": f"Vehicle-{i:07d}", "severity": "CRITICAL", "message": llm_message(rng),
+        "timestamp": "Just now", "thread_id": f"alert_Vehicle-{i:07d}_{i}", "booked_slot": "2026-10-20 09:00",
+    } for i in range(alerts)]
+    vehicle_page = {"vehicles": [{
+        "vehicle_id": f"Vehicle-{i:07d}", "model": rng.choice(["F-150", "Sedan", "SUV", "Van"]),
+        "status": rng.choice(["Active", "Warning", "Critical"]), "engine_temp": rng.randint(85, 125),
+        "error_code": rng.choice(["None", "P0118", "P0420"]),
+    } for i in range(page)], "next_after": f"Vehicle-{page - 1:07d}", "total": 100_000}
+    batch_lines = [{
+        "index": i, "vehicle_id": f"Vehicle-{i:07d}", "thread_id": f"batch_ab12cd34_{i}", "response": llm_message(rng, 120),
+    } for i in range(batch)]
+    return alert_rows, vehicle_page, batch_lines
+
+def best_of(fn, runs=5):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    return out, min(times)
+
+def encode_with(fast, payload, ndjson):
+    backend.FAST_JSON = fast
+    if ndjson:
+        return lambda: b"".join(backend.dumps(line) + b"\n" for line in payload)
+    return lambda: backend.dumps(payload)
+
+def fastapi_default(payload, ndjson):
+    if ndjson:
+        return lambda: b"".join(JSONResponse(jsonable_encoder(line)).body + b"\n" for line in payload)
+    return lambda: JSONResponse(jsonable_encoder(payload)).body
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alerts", type=int, default=2000)
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(7)
+    alerts, page, batch = synthetic_payloads(args.alerts, args.page, args.batch, rng)
+    cases = [("/alerts", alerts, False), ("/vehicles page", page, False), ("/chat/batch", batch, True)]
+
+    print(f"📦 Response encoding ({args.alerts} alerts, {args.page}-row page, {args.batch} batch lines)")
+    print(f"{'endpoint':<16} {'fastapi ms':>10} {'json ms':>8} {'orjson ms':>10} {'raw KB':>8} {'gzip KB':>8} {'gzip ms':>8}")
+    for name, payload, ndjson in cases:
+        _, default_s = best_of(fastapi_default(payload, ndjson))
+        body, std_s = best_of(encode_with(False, payload, ndjson))
+        orjson_s = float("nan")
+        if backend.orjson is not None:
+            _, orjson_s = best_of(encode_with(True, payload, ndjson))
+        packed, gzip_s = best_of(lambda: gzip.compress(body, compresslevel=backend.GZIP_LEVEL))
+        print(f"{name:<16} {default_s * 1000:>10.1f} {std_s * 1000:>8.1f} {orjson_s * 1000:>10.1f} "
+              f"{len(body) / 1024:>8.0f} {len(packed) / 1024:>8.0f} {gzip_s * 1000:>8.1f}")
+    backend.FAST_JSON = False
+
+    # End to end: the middleware compresses /alerts for gzip-capable clients
+    backend.active_alerts[:] = alerts
+    client = TestClient(backend.app)
+    res = client.get("/alerts", headers={"Accept-Encoding": "gzip"})
+    print(f"GET /alerts -> Content-Encoding: {res.headers.get('content-encoding', 'identity')}, "
+          f"{res.num_bytes_downloaded / 1024:,.0f} KB on the wire for {len(res.content) / 1024:,.0f} KB of JSON")
+    small = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    print(f"GET /health  -> Content-Encoding: {small.headers.get('content-encoding', 'identity')} "
+          f"({len(small.content)} bytes < {backend.COMPRESS_MIN_BYTES} threshold)")
+
+if __name__ == "__main__":
+    main()
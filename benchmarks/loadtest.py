@@ -0,0 +1,261 @@
+"""
+Replays chat/alert traffic against main.py and reports throughput, latency
+percentiles and error rates, for sizing a deployment before a fleet rollout.
+
+Ollama is replaced by fake_llm.FakeFleetModel with an injected per-call delay
+(--latency, plus up to --jitter at random), so the numbers show what the
+backend (graph, SQLite, serialization, HTTP) does under a given model
+latency. Everything runs against a scratch copy of fleet_data.db.
+
+Traffic is either a file recorded by the backend itself
+(FLEET_RECORD_TRAFFIC=traffic.jsonl uvicorn main:app, one request per line:
+t, method, path, query, body or body_text) or, without --traffic, a
+synthetic mix of /chat, GET /alerts, /chat/batch and /trigger_check.
+
+Requests are sent open-loop: each has a scheduled start (the recorded
+offsets divided by --speed, or a fixed --rate) and latency is measured from
+that start, so a backed-up server shows as latency, not as a slower send
+rate. --concurrency caps requests in flight, like a client connection pool.
+Requests on the same chat thread are sent in order.
+
+Usage:
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --requests 1000 --rate 100 --concurrency 64 --latency 0.5 --jitter 0.5
+    python benchmarks/loadtest.py --traffic traffic.jsonl --speed 4 --server uvicorn --json report.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import agents
+import database_setup
+import db_writer
+import fake_llm
+import forecasting
+import main as backend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHAT_MESSAGES = (
+    "check my vehicle", "Any error codes I should worry about?", "Is it safe to drive?",
+    "book 10am please", "The service was great, 5 stars.", "What is the fleet forecast?",
+)
+# (path, weight) of the synthetic mix
+MIX = (("/chat", 60), ("/alerts", 25), ("/chat/batch", 10), ("/trigger_check", 5))
+
+# --- 1. TRAFFIC ---
+def load_traffic(path):
+    """Recorded requests, sorted, with offsets starting at 0."""
+    with open(path) as f:
+        traffic = [json.loads(line) for line in f if line.strip()]
+    traffic.sort(key=lambda r: r.get("t", 0))
+    start = traffic[0].get("t", 0) if traffic else 0
+    for req in traffic:
+        req["t"] = req.get("t", 0) - start
+    return traffic
+
+def synthetic_traffic(count, vehicles, rng, threads=None):
+    """Weighted mix; chats reuse a pool of threads so some are multi-turn."""
+    threads = threads or max(1, count // 4)
+    paths, weights = zip(*MIX)
+    traffic = []
+    for _ in range(count):
+        path = rng.choices(paths, weights)[0]
+        req = {"method": "GET" if path == "/alerts" else "POST", "path": path, "query": "", "body": None}
+        if path == "/chat":
+            req["body"] = {"message": rng.choice(CHAT_MESSAGES), "vehicle_id": rng.choice(vehicles),
+                           "thread_id": f"load_{rng.randrange(threads)}"}
+        elif path == "/chat/batch":
+            req["body"] = {"items": [{"vehicle_id": rng.choice(vehicles), "message": rng.choice(CHAT_MESSAGES)}
+                                     for _ in range(5)], "concurrency": 5}
+        elif path == "/alerts":
+            req["query"] = "limit=20"
+        traffic.append(req)
+    return traffic
+
+def schedule(traffic, rate=None, speed=1.0):
+    """Sets each request's start offset "at": fixed rate, or recorded offsets / speed."""
+    for i, req in enumerate(traffic):
+        req["at"] = i / rate if rate else req.get("t", 0) / speed
+    return traffic
+
+# --- 2. REPLAY ---
+async def send(client, req):
+    """Returns an error label, or None when the request succeeded."""
+    if "body_text" in req: # recorded as sent, e.g. malformed JSON
+        res = await client.request(req["method"], req["path"], params=req.get("query") or None,
+                                   content=req["body_text"], headers={"content-type": "application/json"})
+    else:
+        res = await client.request(req["method"], req["path"], params=req.get("query") or None, json=req.get("body"))
+    if res.status_code >= 400:
+        return f"HTTP {res.status_code}"
+    if req["path"] == "/chat/batch":
+        # Per-item failures come back as 200 + an "error" line
+        if any("error" in json.loads(line) for line in res.text.splitlines() if line):
+            return "batch item error"
+    return None
+
+async def replay(client, traffic, concurrency, timeout):
+    in_flight = asyncio.Semaphore(concurrency)
+    thread_locks = defaultdict(asyncio.Lock)
+
+    async def one(req):
+        await asyncio.sleep(max(0.0, start + req["at"] - time.perf_counter()))
+        thread_id = (req.get("body") or {}).get("thread_id") if req["path"] == "/chat" else None
+        in_order = thread_locks[thread_id] if thread_id else contextlib.nullcontext()
+        async with in_order, in_flight:
+            try:
+                error = await asyncio.wait_for(send(client, req), timeout)
+            except Exception as e:
+                error = type(e).__name__
+        return {"path": req["path"], "latency": time.perf_counter() - (start + req["at"]), "error": error}
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(req) for req in traffic))
+    return results, time.perf_counter() - start
+
+# --- 3. REPORT ---
+def percentile(ordered, q):
+    """Nearest-rank percentile of an already sorted list."""
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+def summarize(results, wall):
+    def stats(rows):
+        ordered = sorted(r["latency"] for r in rows)
+        errors = sum(1 for r in rows if r["error"])
+        return {
+            "requests": len(rows), "errors": errors, "error_rate": errors / len(rows),
+            "throughput_rps": len(rows) / wall,
+            **{f"p{q}_ms": percentile(ordered, q) * 1000 for q in (50, 90, 95, 99)},
+            "max_ms": ordered[-1] * 1000,
+        }
+    by_path = defaultdict(list)
+    for r in results:
+        by_path[r["path"]].append(r)
+    return {
+        "wall_s": wall,
+        "overall": stats(results),
+        "endpoints": {path: stats(rows) for path, rows in sorted(by_path.items())},
+        "error_kinds": dict(Counter(r["error"] for r in results if r["error"])),
+    }
+
+def print_report(summary):
+    print(f"{'endpoint':<16} {'count':>6} {'err %':>6} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    rows = [*summary["endpoints"].items(), ("ALL", summary["overall"])]
+    for name, s in rows:
+        print(f"{name:<16} {s['requests']:>6} {s['error_rate'] * 100:>6.1f} {s['throughput_rps']:>7.1f} "
+              f"{s['p50_ms']:>8.0f} {s['p90_ms']:>8.0f} {s['p95_ms']:>8.0f} {s['p99_ms']:>8.0f} {s['max_ms']:>8.0f}")
+    for kind, count in summary["error_kinds"].items():
+        print(f"⚠️ {count} x {kind}")
+
+# --- 4. BACKEND UNDER TEST ---
+def prepare_backend(latency, jitter, workdir):
+    """Stub model + scratch DB, and the startup work that lifespan would have done."""
+    agents._make_llm = lambda: fake_llm.FakeFleetModel(latency=latency, jitter=jitter)
+    for factory in agents._LAZY_ATTRS.values():
+        factory.cache_clear()
+    db_path = os.path.join(workdir, "fleet_data.db")
+    source = os.path.join(ROOT, "fleet_data.db")
+    if os.path.exists(source):
+        shutil.copyfile(source, db_path)
+    else:
+        database_setup.DB_NAME = db_path
+        database_setup.init_db()
+    agents.DB_NAME = backend.DB_NAME = db_path
+    forecasting.ensure_schema(db_path)
+    backend.ensure_vehicle_indexes()
+    agents.get_app()
+    return db_path
+
+@contextlib.contextmanager
+def uvicorn_server():
+    """main.app on a free local port, in a background thread (no simulation loop)."""
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(backend.app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+async def run(args, traffic):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    with contextlib.ExitStack() as stack:
+        if args.server == "uvicorn":
+            client = httpx.AsyncClient(base_url=stack.enter_context(uvicorn_server()), limits=limits, timeout=timeout)
+        else:
+            transport = httpx.ASGITransport(app=backend.app)
+            client = httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout)
+        async with client:
+            return await replay(client, traffic, args.concurrency, args.timeout)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--traffic", help="Recorded JSONL traffic (default: synthetic mix)")
+    parser.add_argument("--requests", type=int, default=200, help="Synthetic requests to generate")
+    parser.add_argument("--rate", type=float, default=None, help="Requests/s (default: recorded timing, or 20/s synthetic)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay recorded traffic this many times faster")
+    parser.add_argument("--concurrency", type=int, default=32, help="Max requests in flight")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub model delay per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Extra random delay per call, up to (s)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout (s)")
+    parser.add_argument("--server", choices=("asgi", "uvicorn"), default="asgi",
+                        help="In-process ASGI transport, or a local uvicorn over real HTTP")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the summary to this file")
+    parser.add_argument("--verbose", action="store_true", help="Keep the backend's own log output")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed) # stub jitter
+    workdir = tempfile.mkdtemp(prefix="fleet-load-")
+    try:
+        prepare_backend(args.latency, args.jitter, workdir)
+        if args.traffic:
+            traffic = schedule(load_traffic(args.traffic), args.rate, args.speed)
+        else:
+            vehicles = [row["vehicle_id"] for row in agents.query_db("SELECT vehicle_id FROM vehicles")]
+            traffic = schedule(synthetic_traffic(args.requests, vehicles, random.Random(args.seed)), args.rate or 20.0)
+
+        print(f"🚦 Replaying {len(traffic)} requests over ~{traffic[-1]['at']:.1f}s via {args.server} "
+              f"(concurrency {args.concurrency}, model {args.latency * 1000:.0f}+{args.jitter * 1000:.0f} ms/call)")
+        backend_log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with backend_log:
+            results, wall = asyncio.run(run(args, traffic))
+        summary = summarize(results, wall)
+        print_report(summary)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"config": vars(args), **summary}, f, indent=2)
+            print(f"📝 Wrote {args.json}")
+    finally:
+        db_writer.close_writer(os.path.join(workdir, "fleet_data.db"))
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
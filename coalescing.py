@@ -0,0 +1,129 @@
+"""
+Request coalescing for the chat endpoints.
+
+* ThreadGate: one in-flight graph run per conversation thread. Later
+  requests for the same thread wait in FIFO order (asyncio.Lock is fair),
+  so two runs never interleave on one MemorySaver thread; a thread with
+  too many waiters is rejected instead of queueing without bound.
+* IdempotencyCache: requests with the same key share one execution. A
+  duplicate that arrives while the first is running awaits the same task
+  (coalesced); one that arrives after it finished, within the TTL, gets the
+  stored result (replayed). Failures are not stored, so a retry re-runs.
+  Reusing a key for a different request is an error.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import metrics
+
+class ThreadBusy(Exception):
+    """Too many requests already queued for one thread."""
+
+class KeyConflict(Exception):
+    """Idempotency key reused with a different request body."""
+
+def fingerprint(*parts):
+    """Stable hash of a request's identifying fields."""
+    return hashlib.blake2b(json.dumps(parts, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+# --- 1. PER-THREAD SERIALIZATION ---
+class ThreadGate:
+    def __init__(self, max_waiting=8):
+        self.max_waiting = max_waiting
+        self._locks = {}   # thread_id -> asyncio.Lock
+        self._waiting = {} # thread_id -> requests holding or waiting for the lock
+        self.queued = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def hold(self, thread_id, label="chat"):
+        waiting = self._waiting.get(thread_id, 0)
+        if waiting > self.max_waiting:
+            self.rejected += 1
+            metrics.REGISTRY.inc("thread_rejected", label)
+            raise ThreadBusy(f"{waiting} requests already queued for thread {thread_id}")
+        lock = self._locks.setdefault(thread_id, asyncio.Lock())
+        self._waiting[thread_id] = waiting + 1
+        if lock.locked():
+            self.queued += 1
+            metrics.REGISTRY.inc("thread_queued", label)
+        start = time.perf_counter()
+        try:
+            async with lock:
+                metrics.REGISTRY.observe("thread_gate", label, time.perf_counter() - start)
+                yield
+        finally:
+            self._waiting[thread_id] -= 1
+            if not self._waiting[thread_id]:
+                # Last one out: forget the thread so idle conversations cost nothing
+                del self._waiting[thread_id]
+                del self._locks[thread_id]
+
+    def stats(self):
+        return {
+            "active_threads": len(self._locks),
+            "waiting": sum(self._waiting.values()) - len(self._waiting),
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+# --- 2. IDEMPOTENCY / DEDUPLICATION ---
+class IdempotencyCache:
+    def __init__(self, max_entries=10_000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> (fingerprint, task, expires_at)
+        self.outcomes = {"ran": 0, "coalesced": 0, "replayed": 0}
+        self._last_purge = 0.0
+
+    def _purge(self, now):
+        """Drops finished entries past their TTL, then the oldest finished ones over max_entries."""
+        if now - self._last_purge < 1.0 and len(self._entries) <= self.max_entries:
+            return
+        self._last_purge = now
+        for key in [k for k, (_, task, expires) in self._entries.items() if task.done() and expires <= now]:
+            del self._entries[key]
+        excess = len(self._entries) - self.max_entries
+        if excess > 0:
+            # Oldest first; entries still running are never evicted
+            for key in [k for k, (_, task, _) in self._entries.items() if task.done()][:excess]:
+                del self._entries[key]
+
+    async def run(self, key, request_fingerprint, ttl, factory, label="chat"):
+        """
+        Runs `factory()` once per key within `ttl` seconds of its completion
+        (ttl=0: only while it is running). Returns (result, outcome) with outcome "ran", "coalesced" or "replayed".
+        """
+        now = time.monotonic()
+        self._purge(now)
+        entry = self._entries.get(key)
+        if entry and (not entry[1].done() or entry[2] > now):
+            if entry[0] != request_fingerprint:
+                raise KeyConflict("Idempotency key was already used for a different request")
+            outcome = "replayed" if entry[1].done() else "coalesced"
+            task = entry[1]
+        else:
+            outcome = "ran"
+            task = asyncio.ensure_future(factory())
+            # The TTL starts when the run finishes; until then the entry never expires
+            self._entries[key] = (request_fingerprint, task, float("inf"))
+            task.add_done_callback(lambda t, key=key: self._finished(key, t, ttl))
+        self.outcomes[outcome] += 1
+        metrics.REGISTRY.inc(f"{label}_requests", outcome)
+        # shield: a client that disconnects must not cancel the run others are waiting on
+        return await asyncio.shield(task), outcome
+
+    def _finished(self, key, task, ttl):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] is not task:
+            return
+        if task.cancelled() or task.exception() is not None or ttl <= 0:
+            del self._entries[key] # don't replay failures, or anything when ttl=0
+        else:
+            self._entries[key] = (entry[0], task, time.monotonic() + ttl)
+
+    def stats(self):
+        return {"entries": len(self._entries), **self.outcomes}
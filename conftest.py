@@ -0,0 +1,115 @@
+"""
+Shared pytest fixtures.
+
+* Every agent runs on fake_llm.FakeFleetModel: deterministic, no Ollama.
+* Every test gets its own copy of a seeded fleet_data.db (seeded once per
+  xdist worker), so tests can book slots and update statuses in parallel.
+* Per-test durations, with the graph path each agent run took, are printed
+  at the end of the run and can be saved with --timings-json.
+
+    python -m pytest -n auto
+    python -m pytest -n auto --timings-json test-timings.json
+"""
+import json
+import random
+import shutil
+import uuid
+
+import pytest
+
+import agents
+import coalescing
+import database_setup
+import db_writer
+import fake_llm
+import main
+
+_timings = []
+
+def pytest_addoption(parser):
+    parser.addoption("--timings-json", default=None, help="Write per-test durations and graph paths to this JSON file")
+    parser.addoption("--slowest", type=int, default=10, help="How many of the slowest tests to list (0 = none)")
+
+# --- FAKE MODEL ---
+@pytest.fixture(scope="session", autouse=True)
+def fake_model():
+    """Rebuilds every lazy agent/LLM singleton on top of the fake model."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(agents, "_make_llm", lambda: fake_llm.FakeFleetModel())
+        for factory in agents._LAZY_ATTRS.values():
+            factory.cache_clear()
+        yield
+    for factory in agents._LAZY_ATTRS.values():
+        factory.cache_clear()
+
+# --- ISOLATED DATABASE ---
+@pytest.fixture(scope="session")
+def seeded_db(tmp_path_factory):
+    """database_setup.py run once per worker, with a fixed random seed."""
+    path = tmp_path_factory.mktemp("seed") / "fleet_data.db"
+    random.seed(1234)
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database_setup, "DB_NAME", str(path))
+        database_setup.init_db()
+    return path
+
+@pytest.fixture(autouse=True)
+def fleet_db(seeded_db, tmp_path, monkeypatch):
+    """Points agents/main at a private copy of the seeded DB and starts from cold caches."""
+    path = str(tmp_path / "fleet_data.db")
+    shutil.copyfile(seeded_db, path)
+    monkeypatch.setattr(agents, "DB_NAME", path)
+    monkeypatch.setattr(main, "DB_NAME", path)
+    for cache in (agents.telemetry_cache, agents.history_cache, agents.capa_cache, agents.rca_cache):
+        cache.invalidate()
+    main.active_alerts.clear()
+    monkeypatch.setattr(main, "chat_requests", coalescing.IdempotencyCache())
+    yield path
+    db_writer.close_writer(path)
+
+@pytest.fixture
+def query(fleet_db):
+    """Runs a read-only query against this test's database."""
+    return agents.query_db
+
+# --- GRAPH RUNS ---
+@pytest.fixture
+def run_graph(record_property):
+    """
+    Runs the compiled graph and returns (final state, node path). The path is
+    attached to the test report so the timing summary shows which route was slow.
+    """
+    def run(messages, thread_id=None, is_proactive=False):
+        app = agents.get_app()
+        config = {"configurable": {"thread_id": thread_id or str(uuid.uuid4())}, "recursion_limit": 25}
+        path = []
+        for update in app.stream({"messages": messages, "is_proactive": is_proactive}, config, stream_mode="updates"):
+            path.extend(update)
+        record_property("graph_path", " -> ".join(path))
+        return app.get_state(config).values, path
+    return run
+
+# --- PER-TEST TIMING ---
+def pytest_runtest_logreport(report):
+    # With xdist this runs on the controller, so it sees every worker's tests
+    if report.when == "call":
+        _timings.append({
+            "test": report.nodeid,
+            "seconds": round(report.duration, 4),
+            "outcome": report.outcome,
+            "graph_paths": [value for key, value in report.user_properties if key == "graph_path"],
+        })
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not _timings:
+        return
+    count = config.getoption("slowest")
+    if count:
+        terminalreporter.section(f"slowest {count} tests")
+        for entry in sorted(_timings, key=lambda t: t["seconds"], reverse=True)[:count]:
+            paths = f"  [{' | '.join(entry['graph_paths'])}]" if entry["graph_paths"] else ""
+            terminalreporter.write_line(f"{entry['seconds'] * 1000:8.1f} ms  {entry['test']}{paths}")
+    out = config.getoption("timings_json")
+    if out:
+        with open(out, "w") as f:
+            json.dump(sorted(_timings, key=lambda t: t["test"]), f, indent=2)
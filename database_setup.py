@@ -2,6 +2,8 @@ import sqlite3
 import random
 from datetime import datetime, timedelta
 
+import diagnostics
+
 DB_NAME = "fleet_data.db"
 
 def init_db():
@@ -17,6 +19,13 @@ def init_db():
     cursor.execute("DROP TABLE IF EXISTS maintenance_history")
     cursor.execute("DROP TABLE IF EXISTS capa_records")
     cursor.execute("DROP TABLE IF EXISTS appointments")
+    cursor.execute("DROP TABLE IF EXISTS telemetry_history")
+    cursor.execute("DROP TABLE IF EXISTS diagnostic_rules")
+
+    # Freed pages can be returned incrementally by retention.py instead of a
+    # full VACUUM; the mode only takes effect on a (cheap, now empty) VACUUM.
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+    cursor.execute("VACUUM")
 
     # --- 3. CREATE SCHEMA ---
     
@@ -31,6 +40,10 @@ def init_db():
         error_code TEXT,
         status TEXT
     )''')
+    # Filter indexes for GET /vehicles (each ends in vehicle_id for keyset paging)
+    cursor.execute("CREATE INDEX idx_vehicles_status ON vehicles (status, vehicle_id)")
+    cursor.execute("CREATE INDEX idx_vehicles_error_code ON vehicles (error_code, vehicle_id)")
+    cursor.execute("CREATE INDEX idx_vehicles_model ON vehicles (model, vehicle_id)")
 
     # Maintenance History (Historical Records)
     cursor.execute('''CREATE TABLE maintenance_history (
@@ -58,6 +71,20 @@ def init_db():
         booked_vehicle_id TEXT
     )''')
 
+    # Telemetry History (sampled every few minutes per vehicle; feeds forecasting.py)
+    cursor.execute('''CREATE TABLE telemetry_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        vehicle_id TEXT,
+        recorded_at INTEGER,
+        odometer INTEGER,
+        oil_life INTEGER,
+        engine_temp INTEGER
+    )''')
+    cursor.execute("CREATE INDEX idx_telemetry_history_vehicle ON telemetry_history (vehicle_id, recorded_at)")
+
+    # Diagnostic Rules (DTC + sensor thresholds, compiled by diagnostics.py)
+    cursor.executescript(diagnostics.SCHEMA_SQL)
+
     # --- 4. SEED DATA ---
     
     # A. Vehicles (The 10 Specific Profiles)
@@ -123,6 +150,9 @@ def init_db():
     ]
     cursor.executemany("INSERT INTO capa_records VALUES (?, ?, ?, ?)", capa)
 
+    # C2. Diagnostic Rules (the defaults; add per-model rules with `diagnostics.py import`)
+    cursor.executemany(diagnostics.INSERT_RULE_SQL, diagnostics.DEFAULT_RULES)
+
     # D. Schedule Slots
     print("   ...Seeding Appointment Slots...")
     slots = []
@@ -133,6 +163,21 @@ def init_db():
     
     cursor.executemany("INSERT INTO appointments (slot_time, is_booked, booked_vehicle_id) VALUES (?, ?, ?)", slots)
 
+    # E. Telemetry History (hourly readings for the last 2 days)
+    print("   ...Backfilling Telemetry History...")
+    telemetry_records = []
+    now = int(today.timestamp())
+    for vid, _, temp, oil, _, odo, code, _ in vehicles:
+        miles_per_hour = random.randint(20, 40)
+        for hours_ago in range(48, 0, -1):
+            miles_ago = miles_per_hour * hours_ago
+            past_oil = min(100, oil + miles_ago // 50) # ~1% oil life per 50 miles
+            # Coolant faults (P0118) have been heating up; the rest idle at 88-92
+            past_temp = temp - hours_ago // 4 if code == "P0118" else 88 + random.randint(0, 4)
+            telemetry_records.append((vid, now - hours_ago * 3600, odo - miles_ago, past_oil, past_temp))
+
+    cursor.executemany("INSERT INTO telemetry_history (vehicle_id, recorded_at, odometer, oil_life, engine_temp) VALUES (?, ?, ?, ?, ?)", telemetry_records)
+
     conn.commit()
     conn.close()
     print(f"✅ Database 'fleet_data.db' reset. Seeded {len(history_records)} historical records.")
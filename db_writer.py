@@ -0,0 +1,248 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+# --- 1. CONFIGURATION ---
+# How long the writer waits to gather more writes into the same transaction
+FLUSH_INTERVAL = float(os.getenv("FLEET_WRITE_FLUSH_MS", "50")) / 1000
+MAX_BATCH = int(os.getenv("FLEET_WRITE_MAX_BATCH", "256"))
+# sqlite busy handler: how long BEGIN IMMEDIATE waits for another writer
+BUSY_TIMEOUT = 5.0
+COMMIT_RETRIES = 3
+
+class _Job:
+    __slots__ = ("statements", "future", "enqueued_at", "single")
+
+    def __init__(self, statements, single):
+        self.statements = statements
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.single = single
+
+_STOP = object()
+
+def _is_lock_error(exc):
+    msg = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ("locked" in msg or "busy" in msg)
+
+# --- 2. WRITER ---
+class WriteBehindWriter:
+    """
+    Single writer thread for one SQLite file. Callers enqueue statements and
+    get a concurrent.futures.Future back; the thread groups everything queued
+    within FLUSH_INTERVAL into one BEGIN IMMEDIATE ... COMMIT transaction.
+
+    Each job runs inside its own SAVEPOINT, so a bad statement only fails
+    that job's future. Futures resolve after COMMIT succeeds (result =
+    rowcount, or a list of rowcounts for submit_many; a statement that
+    returns rows, e.g. DELETE ... RETURNING, gives its rows instead). If the commit keeps
+    hitting "database is locked", every future in the batch gets the error
+    instead of it being swallowed.
+    """
+
+    def __init__(self, db_path, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self.failed = 0
+        self.lock_contention = 0
+        self._queue = queue.Queue()
+        self._attachments = {} # alias -> path, applied by the writer thread between batches
+        self._attach_lock = threading.Lock()
+        self._closed = False
+        self._close_lock = threading.Lock() # no job can be queued behind _STOP
+        self._thread = threading.Thread(target=self._run, name=f"db-writer:{db_path}", daemon=True)
+        self._thread.start()
+
+    # --- Public API ---
+    def submit(self, sql, args=()):
+        """Queues one statement. Future result: cursor.rowcount (or its rows, if it returns any)."""
+        return self._enqueue(_Job([(sql, tuple(args))], single=True))
+
+    def submit_many(self, statements):
+        """Queues statements that must commit together. Future result: list of rowcounts."""
+        return self._enqueue(_Job([(sql, tuple(args)) for sql, args in statements], single=False))
+
+    def execute(self, sql, args=(), timeout=30):
+        """Blocking helper for sync callers (tools): waits for the commit and re-raises failures."""
+        return self.submit(sql, args).result(timeout=timeout)
+
+    def attach(self, alias, path):
+        """
+        Makes `alias` (another database file) visible to later jobs, e.g. for
+        INSERT INTO archive.t SELECT ... FROM main.t. ATTACH can't run inside
+        a transaction, so the thread does it before its next batch.
+        """
+        with self._attach_lock:
+            self._attachments[alias] = path
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "writes": self.writes,
+            "failed": self.failed,
+            "lock_contention": self.lock_contention,
+            "avg_batch_size": round(self.writes / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def close(self, timeout=5):
+        """Commits everything already queued, then stops; later submits fail at once."""
+        with self._close_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _enqueue(self, job):
+        with self._close_lock:
+            if not self._closed and self._thread.is_alive():
+                self._queue.put(job)
+                return job.future
+        job.future.set_exception(RuntimeError("DB writer is stopped"))
+        return job.future
+
+    # --- Writer thread ---
+    def _run(self):
+        conn = None
+        try:
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+            while True:
+                first = self._queue.get()
+                if first is _STOP:
+                    return
+                batch = [first]
+                stop = self._collect(batch)
+                self._flush(conn, batch)
+                if stop:
+                    return
+        finally:
+            if conn is not None:
+                conn.close()
+            self._drain()
+
+    def _drain(self):
+        """Fails whatever is still queued, so no caller waits on a thread that has exited."""
+        with self._close_lock:
+            self._closed = True
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not _STOP:
+                self.failed += 1
+                job.future.set_exception(RuntimeError("DB writer is stopped"))
+
+    def _collect(self, batch):
+        """Gathers more jobs until the flush interval elapses or the batch is full."""
+        deadline = time.perf_counter() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                job = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                return False
+            if job is _STOP:
+                return True
+            batch.append(job)
+        return False
+
+    def _sync_attachments(self, conn):
+        with self._attach_lock:
+            wanted = dict(self._attachments)
+        attached = {name: file for _, name, file in conn.execute("PRAGMA database_list")}
+        for alias, path in wanted.items():
+            if alias in attached and os.path.abspath(path) == os.path.abspath(attached[alias] or ""):
+                continue
+            if alias in attached:
+                conn.execute(f"DETACH DATABASE {alias}")
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+
+    def _flush(self, conn, batch):
+        for attempt in range(COMMIT_RETRIES):
+            outcomes = []
+            try:
+                self._sync_attachments(conn)
+                with metrics.timer("sql_write", "lock_wait"):
+                    conn.execute("BEGIN IMMEDIATE")
+                with metrics.timer("sql_write", "batch"):
+                    for i, job in enumerate(batch):
+                        outcomes.append(self._apply(conn, job, i))
+                    conn.execute("COMMIT")
+                break
+            except Exception as e: # not just sqlite3.Error: any failure must reach the futures
+                if conn.in_transaction:
+                    try:
+                        conn.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        pass
+                if _is_lock_error(e):
+                    self.lock_contention += 1
+                    metrics.REGISTRY.inc("sql_lock_contention", os.path.basename(self.db_path))
+                    if attempt < COMMIT_RETRIES - 1:
+                        time.sleep(0.05 * (attempt + 1))
+                        continue
+                print(f"⚠️ [DB Writer] Batch of {len(batch)} failed: {e}")
+                outcomes = [e] * len(batch)
+                break
+
+        now = time.perf_counter()
+        self.batches += 1
+        for job, outcome in zip(batch, outcomes):
+            metrics.REGISTRY.observe("sql_write", "queue_to_commit", now - job.enqueued_at, isinstance(outcome, Exception))
+            if isinstance(outcome, Exception):
+                self.failed += 1
+                job.future.set_exception(outcome)
+            else:
+                self.writes += 1
+                job.future.set_result(outcome[0] if job.single else outcome)
+
+    @staticmethod
+    def _apply(conn, job, index):
+        """Runs one job inside a savepoint; returns rowcounts/rows or the exception it raised."""
+        savepoint = f"job_{index}"
+        conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            rowcounts = []
+            for sql, args in job.statements:
+                cur = conn.execute(sql, args)
+                rowcounts.append(cur.fetchall() if cur.description else cur.rowcount)
+        except Exception as e:
+            if _is_lock_error(e):
+                raise # whole batch retries
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+            return e
+        conn.execute(f"RELEASE {savepoint}")
+        return rowcounts
+
+# --- 3. SHARED WRITERS ---
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_writer(db_path):
+    """One writer thread per database file, started on first use."""
+    with _writers_lock:
+        writer = _writers.get(db_path)
+        if writer is None:
+            writer = _writers[db_path] = WriteBehindWriter(db_path)
+        return writer
+
+def writer_stats():
+    with _writers_lock:
+        return {path: w.stats() for path, w in _writers.items()}
+
+def close_writer(db_path):
+    """Stops and forgets the writer for one file (e.g. a per-test database)."""
+    with _writers_lock:
+        writer = _writers.pop(db_path, None)
+    if writer is not None:
+        writer.close()
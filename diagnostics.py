@@ -0,0 +1,393 @@
+"""
+Diagnostic rules as data.
+
+Rules live in the `diagnostic_rules` table, one row per DTC or sensor
+threshold, optionally scoped to one vehicle model ('*' = every model), and
+are compiled into a RuleSet, recompiled whenever the table changes:
+  * DTC rules: a hash lookup by (model, code)
+  * threshold rules: grouped by (model, metric, operator) with the
+    thresholds sorted, so one bisect finds every rule a reading trips; the
+    same sorted arrays are searched with numpy for a whole fleet at once
+    (RuleSet.screen)
+
+diagnose_issue (agents.py), the proactive sweep (main.py) and the
+write-time alert trigger (alerting.py) all use the same RuleSet, so each
+threshold is defined once. Rules with `alert = 1` are the ones that start a
+proactive diagnosis.
+
+CLI:
+    python diagnostics.py list
+    python diagnostics.py import rules.csv    # replaces every rule
+"""
+import argparse
+import bisect
+import csv
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+# --- 1. SCHEMA & DEFAULTS ---
+DB_NAME = "fleet_data.db"
+CRITICAL_TEMP = 110          # °C, the default overheating alert rule
+# How often get_rules looks at the version row (seconds); edits from another
+# process show up within this long
+RULES_CHECK_INTERVAL = float(os.getenv("FLEET_RULES_CHECK_S", "5"))
+
+# Numeric vehicle columns a threshold rule may test
+METRICS = ("engine_temp", "oil_life", "tire_pressure", "odometer")
+OPERATORS = (">", ">=", "<", "<=")
+SEVERITIES = ("CRITICAL", "WARNING", "INFO")
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS diagnostic_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT NOT NULL DEFAULT '*',
+    code TEXT,
+    metric TEXT,
+    op TEXT,
+    value REAL,
+    severity TEXT NOT NULL DEFAULT 'WARNING',
+    alert INTEGER NOT NULL DEFAULT 0,
+    message TEXT NOT NULL
+);
+-- Bumped by every edit of the rules, so a running server notices an import
+CREATE TABLE IF NOT EXISTS diagnostic_rules_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO diagnostic_rules_version (id, version) VALUES (1, 0);
+CREATE TRIGGER IF NOT EXISTS diagnostic_rules_inserted AFTER INSERT ON diagnostic_rules
+BEGIN UPDATE diagnostic_rules_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS diagnostic_rules_updated AFTER UPDATE ON diagnostic_rules
+BEGIN UPDATE diagnostic_rules_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS diagnostic_rules_deleted AFTER DELETE ON diagnostic_rules
+BEGIN UPDATE diagnostic_rules_version SET version = version + 1; END;
+"""
+RULE_COLUMNS = ("model", "code", "metric", "op", "value", "severity", "alert", "message")
+INSERT_RULE_SQL = f"INSERT INTO diagnostic_rules ({', '.join(RULE_COLUMNS)}) VALUES ({', '.join('?' * len(RULE_COLUMNS))})"
+
+# The checks diagnose_issue used to hardcode. Messages may use {value} (the
+# reading), {threshold} and {code}.
+DEFAULT_RULES = [
+    ("*", None, "engine_temp", ">", CRITICAL_TEMP, "CRITICAL", 1, "CRITICAL OVERHEATING detected (Temp: {value}°C)."),
+    ("*", "P0118", None, None, None, "WARNING", 0, "Sensor Failure: Coolant Temperature Circuit High input."),
+    ("*", "P0420", None, None, None, "WARNING", 0, "Catalyst System Efficiency Below Threshold."),
+]
+
+Rule = namedtuple("Rule", ("id",) + RULE_COLUMNS)
+
+def default_rules():
+    return [Rule(i, *rule) for i, rule in enumerate(DEFAULT_RULES, start=1)]
+
+def ensure_schema(db_path):
+    """Creates the rules table and seeds DEFAULT_RULES into an empty one."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA_SQL)
+        if conn.execute("SELECT COUNT(*) FROM diagnostic_rules").fetchone()[0] == 0:
+            conn.executemany(INSERT_RULE_SQL, DEFAULT_RULES)
+            conn.commit()
+    finally:
+        conn.close()
+
+def load_rules(db_path):
+    """Rule rows from the database; the defaults if it predates the table."""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute(f"SELECT id, {', '.join(RULE_COLUMNS)} FROM diagnostic_rules ORDER BY id").fetchall()
+    except sqlite3.OperationalError:
+        return default_rules()
+    finally:
+        conn.close()
+    return [Rule(*row) for row in rows]
+
+def rules_version(db_path):
+    """Edit counter of the rule table (0 if the database predates it)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT version FROM diagnostic_rules_version").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+def _number(value):
+    """Readings arrive as ints, floats or strings like '40%'; None if unusable."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        text = str(value).strip().rstrip("%")
+        return int(text) if text.lstrip("-").isdigit() else float(text)
+    except ValueError:
+        return None
+
+def _sql_literal(value):
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+# --- 2. COMPILED RULES ---
+class _ThresholdGroup:
+    """
+    Rules on one (model, metric, operator family). Readings and thresholds
+    are multiplied by `sign` (-1 for < / <=) so every rule reads "x > cut"
+    (or ">="), and with cuts sorted ascending the rules a reading trips are
+    always a prefix: bisect gives its length.
+    """
+
+    def __init__(self, sign, strict, rules):
+        self.sign = sign
+        self.strict = strict
+        rules = sorted(rules, key=lambda r: sign * r.value)
+        self.rules = rules
+        self.cuts = [sign * r.value for r in rules]
+        # The lowest cut of an alert rule: tripping it (or more) means alert
+        self.alert_from = next((i for i, r in enumerate(rules) if r.alert), None)
+        self._array = None
+
+    def tripped(self, value):
+        x = self.sign * value
+        count = bisect.bisect_left(self.cuts, x) if self.strict else bisect.bisect_right(self.cuts, x)
+        return self.rules[:count]
+
+    def counts(self, values, np):
+        """Rules tripped per reading, for a float array (NaN = no reading)."""
+        if self._array is None:
+            self._array = np.asarray(self.cuts, dtype=float)
+        x = self.sign * values
+        counts = np.searchsorted(self._array, x, side="left" if self.strict else "right")
+        counts[np.isnan(x)] = 0
+        return counts
+
+    def sql_predicate(self, column):
+        if self.alert_from is None:
+            return None
+        op = (">" if self.strict else ">=") if self.sign > 0 else ("<" if self.strict else "<=")
+        return f"{column} {op} {_sql_literal(self.sign * self.cuts[self.alert_from])}"
+
+class RuleSet:
+    """Compiled diagnostic rules: DTC hash lookup + sorted threshold groups, keyed by model."""
+
+    def __init__(self, rules):
+        self.rules = []
+        self.dtc = {}      # (model, code) -> [Rule]
+        self.groups = {}   # model -> {(metric, sign, strict): _ThresholdGroup}
+        pending = {}
+        for rule in rules:
+            problem = self._problem(rule)
+            if problem:
+                print(f"⚠️ [Rules] Skipping rule {rule.id}: {problem}")
+                continue
+            self.rules.append(rule)
+            if rule.code:
+                self.dtc.setdefault((rule.model, rule.code), []).append(rule)
+            else:
+                key = (rule.metric, 1 if rule.op.startswith(">") else -1, len(rule.op) == 1)
+                pending.setdefault(rule.model, {}).setdefault(key, []).append(rule)
+        for model, by_key in pending.items():
+            self.groups[model] = {key: _ThresholdGroup(key[1], key[2], rs) for key, rs in by_key.items()}
+
+    @staticmethod
+    def _problem(rule):
+        if rule.code:
+            return None
+        if rule.metric not in METRICS:
+            return f"unknown metric {rule.metric!r}"
+        if rule.op not in OPERATORS:
+            return f"unknown operator {rule.op!r}"
+        if _number(rule.value) is None:
+            return f"threshold {rule.value!r} is not a number"
+        return None
+
+    def _models(self, model):
+        return ("*", model) if model and model != "*" else ("*",)
+
+    # --- One vehicle ---
+    def matches(self, error_code, readings, model=None):
+        """Every rule this vehicle trips, in rule-id order."""
+        fired = []
+        for m in self._models(model):
+            fired.extend(self.dtc.get((m, error_code), ()))
+            for (metric, _, _), group in self.groups.get(m, {}).items():
+                value = _number(readings.get(metric))
+                if value is not None:
+                    fired.extend(group.tripped(value))
+        return sorted(fired, key=lambda r: r.id)
+
+    def findings(self, error_code, readings, model=None):
+        """Formatted messages of the tripped rules."""
+        out = []
+        for rule in self.matches(error_code, readings, model):
+            value = readings.get(rule.metric) if rule.metric else None
+            try:
+                out.append(rule.message.format(value=value, threshold=rule.value, code=error_code))
+            except (KeyError, IndexError, ValueError):
+                out.append(rule.message)
+        return out
+
+    def is_alert(self, data):
+        """True if a telemetry dict trips any alert rule."""
+        return any(r.alert for r in self.matches(data.get("error_code"), data, data.get("model")))
+
+    def alert_threshold(self, metric, model=None):
+        """Lowest reading of `metric` an upper-limit (> / >=) alert rule fires at for this model; None if none does."""
+        cuts = [group.cuts[group.alert_from]
+                for m in self._models(model)
+                for (name, sign, _), group in self.groups.get(m, {}).items()
+                if name == metric and sign > 0 and group.alert_from is not None]
+        return min(cuts) if cuts else None
+
+    # --- Whole fleet ---
+    def screen(self, columns):
+        """
+        Vectorized over a fleet: `columns` maps vehicle column names to
+        equal-length sequences (see columns_from_rows). Returns
+        (alert mask, number of rules tripped) as numpy arrays.
+        """
+        import numpy as np # only the batch path needs numpy
+
+        n = len(columns["vehicle_id"])
+        models = np.asarray(columns.get("model", ["*"] * n), dtype=str)
+        codes = np.asarray(columns.get("error_code", ["None"] * n), dtype=str)
+        alert = np.zeros(n, dtype=bool)
+        tripped = np.zeros(n, dtype=np.int64)
+
+        by_model = {}
+        for (model, code), rules in self.dtc.items():
+            entry = by_model.setdefault(model, ([], []))
+            entry[0].append(code)
+            entry[1].append((len(rules), any(r.alert for r in rules)))
+        # Distinct codes are few: hash-look those up, then broadcast back to vehicles
+        distinct, inverse = np.unique(codes, return_inverse=True)
+        for model, (known, info) in by_model.items():
+            index = {code: i for i, code in enumerate(known)}
+            hit = np.array([index.get(c, -1) for c in distinct], dtype=np.int64)[inverse]
+            if model != "*":
+                hit[models != model] = -1
+            found = hit >= 0
+            counts = np.array([c for c, _ in info])
+            alerts = np.array([a for _, a in info])
+            tripped[found] += counts[hit[found]]
+            alert[found] |= alerts[hit[found]]
+
+        values = {metric: np.asarray(columns.get(metric, [np.nan] * n), dtype=float)
+                  for metric in {metric for groups in self.groups.values() for (metric, _, _) in groups}}
+        everyone = slice(None)
+        for model, groups in self.groups.items():
+            # Model-scoped rules only search that model's vehicles
+            rows = everyone if model == "*" else np.flatnonzero(models == model)
+            for (metric, _, _), group in groups.items():
+                counts = group.counts(values[metric][rows], np)
+                tripped[rows] += counts
+                if group.alert_from is not None:
+                    alert[rows] |= counts > group.alert_from
+        return alert, tripped
+
+    # --- SQL (alert trigger / hot-vehicle query) ---
+    def sql_condition(self, alias):
+        """SQL boolean: does row `alias` trip any alert rule? ('0' if there are none)."""
+        column = (lambda c: f"{alias}.{c}") if alias else (lambda c: c)
+        terms = []
+        for m in sorted({m for m, _ in self.dtc} | set(self.groups)):
+            parts = []
+            codes = sorted(c for (model, c), rules in self.dtc.items() if model == m and any(r.alert for r in rules))
+            if codes:
+                parts.append(f"{column('error_code')} IN ({', '.join(_sql_literal(c) for c in codes)})")
+            for (metric, _, _), group in sorted(self.groups.get(m, {}).items()):
+                predicate = group.sql_predicate(column(metric))
+                if predicate:
+                    parts.append(predicate)
+            if not parts:
+                continue
+            clause = " OR ".join(parts)
+            terms.append(f"({clause})" if m == "*" else f"({column('model')} = {_sql_literal(m)} AND ({clause}))")
+        return " OR ".join(terms) or "0"
+
+    def watched_columns(self):
+        """Vehicle columns the alert rules read (what the trigger must watch)."""
+        cols = {metric for groups in self.groups.values() for (metric, _, _), g in groups.items() if g.alert_from is not None}
+        if any(r.alert for rules in self.dtc.values() for r in rules):
+            cols.add("error_code")
+        if any(m != "*" for m, _ in self.dtc) or any(m != "*" for m in self.groups):
+            cols.add("model")
+        return sorted(cols)
+
+def columns_from_rows(rows):
+    """Telemetry dicts -> the column layout RuleSet.screen takes ('40%' -> 40.0, missing -> NaN)."""
+    nan = float("nan")
+    columns = {
+        "vehicle_id": [r["vehicle_id"] for r in rows],
+        "model": [r.get("model") or "*" for r in rows],
+        "error_code": [str(r.get("error_code")) for r in rows],
+    }
+    for metric in METRICS:
+        values = (_number(r.get(metric)) for r in rows)
+        columns[metric] = [nan if v is None else v for v in values]
+    return columns
+
+_compiled = {} # db_path -> (rules_version, RuleSet, checked_at)
+
+def get_rules(db_path=DB_NAME):
+    """
+    The compiled RuleSet for one database. The table's version is read at
+    most every RULES_CHECK_INTERVAL seconds, so an import from another
+    process is picked up that much later without a query per call.
+    """
+    now = time.monotonic()
+    cached = _compiled.get(db_path)
+    if cached is not None and now - cached[2] < RULES_CHECK_INTERVAL:
+        return cached[1]
+    version = rules_version(db_path)
+    if cached is None or cached[0] != version:
+        cached = (version, RuleSet(load_rules(db_path)), now)
+    _compiled[db_path] = (cached[0], cached[1], now)
+    return cached[1]
+
+def reload_rules():
+    _compiled.clear()
+
+# --- 3. CLI ---
+def import_csv(db_path, path):
+    """Replaces every rule with the rows of a CSV (header = RULE_COLUMNS)."""
+    with open(path, newline="") as f:
+        rows = [tuple(row.get(c) or None for c in RULE_COLUMNS) for row in csv.DictReader(f)]
+    rows = [(m or "*", code, metric, op, _number(value), sev or "WARNING", int(alert or 0), msg)
+            for m, code, metric, op, value, sev, alert, msg in rows]
+    # Compile first so a bad file is reported before the table is touched
+    compiled = RuleSet([Rule(i, *row) for i, row in enumerate(rows, start=1)])
+    ensure_schema(db_path)
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM diagnostic_rules")
+            conn.executemany(INSERT_RULE_SQL, rows)
+    finally:
+        conn.close()
+    reload_rules()
+    import alerting
+    alerting.ensure_schema(db_path) # the trigger is generated from the rules
+    return len(compiled.rules), len(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("list", "import"))
+    parser.add_argument("path", nargs="?", help="CSV file for import")
+    parser.add_argument("--db", default=DB_NAME)
+    args = parser.parse_args(argv)
+
+    if args.command == "import":
+        if not args.path:
+            parser.error("import needs a CSV path")
+        valid, total = import_csv(args.db, args.path)
+        print(f"✅ Imported {total} rules ({valid} valid) into {args.db}")
+        return
+    rules = get_rules(args.db)
+    for r in rules.rules:
+        test = f"code={r.code}" if r.code else f"{r.metric} {r.op} {r.value:g}"
+        print(f"{r.id:>5} {r.model:<10} {test:<22} {r.severity:<8} {'ALERT' if r.alert else '':<5} {r.message}")
+    print(f"📋 {len(rules.rules)} rules, alert condition: {rules.sql_condition('')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Deterministic local stand-in for the Ollama chat model.
+
+FakeFleetModel plays each worker role (recognised from the agent's system
+prompt) with fixed rules: it calls the tool the prompt asks for, then turns
+the tool result into the phrases the supervisor routes on ("CRITICAL",
+"QUALITY CHECK COMPLETE", "OPEN SLOTS", "BOOKING COMPLETE", ...). Same input,
+same output, no network, so the graph can be tested and load-tested
+without a model server. `latency` adds a fixed delay per model call and
+`jitter` up to that much more at random, to stand in for inference time.
+
+    agents._make_llm = lambda: FakeFleetModel()
+"""
+import asyncio
+import random
+import re
+import time
+from typing import Any, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+VEHICLE_RE = re.compile(r"\bVehicle-[\w-]+")
+DTC_RE = re.compile(r"\bP\d{4}\b")
+TEMP_RE = re.compile(r"(?:engine_temp['\"]?\s*:\s*|Engine Temp\s*(?:is\s*)?)(None|\d+)", re.IGNORECASE)
+TIME_RE = re.compile(r"\b(\d{1,2}(?::\d{2})?)\s*(am|pm)\b|\b(\d{1,2}:\d{2})\b", re.IGNORECASE)
+RATING_RE = re.compile(r"\b([1-5])\s*stars?\b", re.IGNORECASE)
+
+# (substring of the agent's system prompt, role)
+ROLES = (
+    ("Lead Data Analyst", "analyst"),
+    ("Vehicle Health Expert", "diagnostician"),
+    ("Quality Engineer", "quality"),
+    ("Service Concierge", "scheduler"),
+    ("Log feedback", "feedback"),
+)
+
+def _text(messages):
+    return " ".join(m.content for m in messages if isinstance(m.content, str))
+
+def _last_human(messages):
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            return msg.content
+    return ""
+
+def _last_match(pattern, text, default=None):
+    found = pattern.findall(text)
+    return found[-1] if found else default
+
+class FakeFleetModel(BaseChatModel):
+    """Rule-based chat model with the same bind_tools / structured-output surface as ChatOllama."""
+
+    tool_names: Sequence[str] = ()
+    latency: float = 0.0
+    jitter: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-fleet"
+
+    def bind_tools(self, tools, **kwargs):
+        names = tuple(getattr(t, "name", None) or t["function"]["name"] for t in tools)
+        return self.model_copy(update={"tool_names": names})
+
+    def with_structured_output(self, schema, **kwargs):
+        # The supervisor routes in Python; the LLM router is only a fallback
+        return RunnableLambda(lambda _: schema(next="FINISH"))
+
+    def _delay(self):
+        return self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency or self.jitter:
+            time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self.respond(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.latency or self.jitter:
+            await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self.respond(messages))])
+
+    # --- Policy ---
+    def respond(self, messages):
+        system = messages[0].content if messages and isinstance(messages[0], SystemMessage) else ""
+        role = next((r for marker, r in ROLES if marker in system), None)
+        last = messages[-1] if messages else None
+        result = last if isinstance(last, ToolMessage) else None
+        handler = getattr(self, f"_{role}", None) if role else None
+        if handler is None:
+            return AIMessage(content="Acknowledged.")
+        return handler(messages, result)
+
+    def _call(self, name, args, messages):
+        if name not in self.tool_names:
+            return AIMessage(content=f"I cannot use {name} here.")
+        call_id = f"call_{name}_{len(messages)}"
+        return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+    def _analyst(self, messages, result):
+        if result is not None:
+            return AIMessage(content=str(result.content))
+        request = _last_human(messages)
+        lowered = request.lower()
+        if "fleet" in lowered or "forecast" in lowered or "demand" in lowered:
+            if "cost" in lowered or "interval" in lowered:
+                report = "cost_per_model" if "cost" in lowered else "service_intervals"
+                return self._call("fleet_analytics", {"report": report}, messages)
+            return self._call("analyze_fleet_trends", {"scope": "all"}, messages)
+        vehicle = _last_match(VEHICLE_RE, request, "Vehicle-123")
+        return self._call("fetch_telematics_data", {"vehicle_id": vehicle}, messages)
+
+    def _diagnostician(self, messages, result):
+        if result is not None and result.name == "diagnose_issue":
+            if "Insufficient" in result.content:
+                return AIMessage(content="Insufficient data: the telemetry is missing, so I cannot diagnose this vehicle.")
+            return AIMessage(content=f"{result.content} I am alerting the maintenance team and checking appointment slots immediately.")
+        # Any other trailing tool result (e.g. seeded telemetry) is input to diagnose
+        history = _text(messages)
+        temp = _last_match(TEMP_RE, history)
+        if temp in (None, "None"):
+            return AIMessage(content="Insufficient data: the telemetry is missing, so I cannot diagnose this vehicle.")
+        code = _last_match(DTC_RE, history, "None")
+        return self._call("diagnose_issue", {"error_code": code, "engine_temp": int(temp)}, messages)
+
+    def _quality(self, messages, result):
+        if result is not None:
+            return AIMessage(content=f"Good news—we have seen this before. {result.content} QUALITY CHECK COMPLETE")
+        history = _text(messages)
+        diagnosis = _last_match(DTC_RE, history) or ("overheating" if "OVERHEATING" in history else "unknown issue")
+        return self._call("get_rca_insights", {"diagnosis": diagnosis}, messages)
+
+    def _scheduler(self, messages, result):
+        request = _last_human(messages)
+        vehicle = _last_match(VEHICLE_RE, _text(messages), "Vehicle-123")
+        if result is not None and result.name == "book_appointment":
+            return AIMessage(content=str(result.content))
+        if result is not None and result.name == "check_schedule_availability":
+            wanted = TIME_RE.search(request)
+            if wanted:
+                slot = wanted.group(3) or f"{wanted.group(1)}{wanted.group(2).lower()}"
+                return self._call("book_appointment", {"slot": slot, "vehicle_id": vehicle}, messages)
+            return AIMessage(content=f"To prevent damage, I have located priority slots. {result.content} "
+                                     "Which of these times works best for you?")
+        if result is not None:
+            return AIMessage(content=str(result.content))
+        return self._call("check_schedule_availability", {}, messages)
+
+    def _feedback(self, messages, result):
+        if result is not None:
+            return AIMessage(content=f"{result.content} Thank you for the feedback, goodbye!")
+        request = _last_human(messages)
+        rating = int(_last_match(RATING_RE, request, "5"))
+        return self._call("log_customer_feedback", {"feedback": request, "rating": rating}, messages)
@@ -0,0 +1,398 @@
+"""
+Predictive maintenance forecasting.
+
+Fits per-vehicle degradation trends from telemetry_history with closed-form
+least squares over sufficient statistics (n, Σx, Σy, Σxy, Σx²) kept in NumPy
+arrays, so a new batch of readings is folded in with np.add.at instead of
+refitting from scratch:
+
+  * oil_life vs odometer  -> oil decay per mile (restarted after an oil change)
+  * odometer vs time      -> miles driven per day
+  * engine_temp vs time   -> temperature drift per day
+
+Vehicles without enough readings fall back to their model's median trend,
+and to the model's median oil-change interval from maintenance_history.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+import diagnostics
+
+# --- 1. CONFIGURATION ---
+OIL_SERVICE_THRESHOLD = 20   # % oil life that triggers a service
+HORIZON_DAYS = 7
+MAX_DUE_LISTED = 50          # due_vehicles lists only the soonest N; the counts cover everyone
+MIN_POINTS = 3
+SERVICE_HOURS = {"oil": 1.0, "overheating": 3.0, "dtc": 3.0}
+FETCH_BATCH = 200_000
+SECONDS_PER_DAY = 86_400.0
+# Each vehicle is sampled once every N simulation ticks (30 x 10 s = 5 min);
+# plenty for day-scale trends and 30x fewer history rows than every tick
+RECORD_EVERY_TICKS = max(1, int(os.getenv("FLEET_HISTORY_EVERY_TICKS", "30")))
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS telemetry_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    vehicle_id TEXT,
+    recorded_at INTEGER,
+    odometer INTEGER,
+    oil_life INTEGER,
+    engine_temp INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_telemetry_history_vehicle ON telemetry_history (vehicle_id, recorded_at);
+"""
+
+# Appended to every simulation tick with record_args(tick): each tick samples
+# a different 1/RECORD_EVERY_TICKS of the fleet (by rowid), so the inserts
+# are spread evenly instead of landing on one tick
+RECORD_READINGS_SQL = (
+    "INSERT INTO telemetry_history (vehicle_id, recorded_at, odometer, oil_life, engine_temp) "
+    "SELECT vehicle_id, CAST(strftime('%s', 'now') AS INTEGER), odometer, oil_life, engine_temp FROM vehicles "
+    "WHERE rowid % ? = ?"
+)
+
+def record_args(tick, every=None):
+    every = every or RECORD_EVERY_TICKS
+    return (every, tick % every)
+
+def ensure_schema(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executescript(SCHEMA_SQL)
+    finally:
+        conn.close()
+
+# --- 2. INCREMENTAL LEAST SQUARES ---
+class LinearTrend:
+    """Per-vehicle simple linear regression kept as running sums (vectorized)."""
+
+    def __init__(self, size=0):
+        self.n = np.zeros(size)
+        self.sx = np.zeros(size)
+        self.sy = np.zeros(size)
+        self.sxy = np.zeros(size)
+        self.sxx = np.zeros(size)
+
+    def grow(self, size):
+        extra = size - len(self.n)
+        if extra > 0:
+            for name in ("n", "sx", "sy", "sxy", "sxx"):
+                setattr(self, name, np.concatenate([getattr(self, name), np.zeros(extra)]))
+
+    def add(self, idx, x, y):
+        np.add.at(self.n, idx, 1.0)
+        np.add.at(self.sx, idx, x)
+        np.add.at(self.sy, idx, y)
+        np.add.at(self.sxy, idx, x * y)
+        np.add.at(self.sxx, idx, x * x)
+
+    def reset(self, idx):
+        for arr in (self.n, self.sx, self.sy, self.sxy, self.sxx):
+            arr[idx] = 0.0
+
+    def slope(self):
+        denom = self.n * self.sxx - self.sx ** 2
+        ok = (self.n >= MIN_POINTS) & (denom > 1e-9)
+        out = np.full(len(self.n), np.nan)
+        out[ok] = (self.n[ok] * self.sxy[ok] - self.sx[ok] * self.sy[ok]) / denom[ok]
+        return out
+
+# --- 3. DEGRADATION MODEL ---
+class DegradationModel:
+    """Fitted trends for every vehicle seen so far; update() folds in new readings."""
+
+    def __init__(self):
+        self.index = {}
+        self.vehicle_ids = []
+        self.oil = LinearTrend()      # x = miles since first reading, y = oil_life
+        self.mileage = LinearTrend()  # x = days since first reading,  y = odometer
+        self.temp = LinearTrend()     # x = days since first reading,  y = engine_temp
+        self.x0_odo = np.zeros(0)
+        self.t0 = np.zeros(0)
+        self.last_t = np.zeros(0)
+        self.last_oil = np.zeros(0)
+        self.last_rowid = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+    def _indices(self, vehicle_ids):
+        """Maps an array of ids to dense indexes, registering unseen vehicles."""
+        uniq, inverse = np.unique(np.asarray(vehicle_ids, dtype=object), return_inverse=True)
+        new = [v for v in uniq if v not in self.index]
+        if new:
+            start = len(self.vehicle_ids)
+            for offset, vid in enumerate(new):
+                self.index[vid] = start + offset
+            self.vehicle_ids.extend(new)
+            size = len(self.vehicle_ids)
+            for trend in (self.oil, self.mileage, self.temp):
+                trend.grow(size)
+            pad = lambda arr, fill: np.concatenate([arr, np.full(size - len(arr), fill)])
+            self.x0_odo = pad(self.x0_odo, np.nan)
+            self.t0 = pad(self.t0, np.nan)
+            self.last_t = pad(self.last_t, -np.inf)
+            self.last_oil = pad(self.last_oil, np.nan)
+        lookup = np.fromiter((self.index[v] for v in uniq), dtype=np.int64, count=len(uniq))
+        return lookup[inverse]
+
+    def update(self, vehicle_ids, recorded_at, odometer, oil_life, engine_temp):
+        """Folds a batch of readings (any order, any vehicles) into the running fits."""
+        if len(vehicle_ids) == 0:
+            return
+        idx = self._indices(vehicle_ids)
+        t = np.asarray(recorded_at, dtype=float)
+        odo = np.asarray(odometer, dtype=float)
+        oil = np.asarray(oil_life, dtype=float)
+        temp = np.asarray(engine_temp, dtype=float)
+
+        order = np.lexsort((t, idx))
+        idx, t, odo, oil, temp = idx[order], t[order], odo[order], oil[order], temp[order]
+
+        group_start = np.ones(len(idx), dtype=bool)
+        group_start[1:] = idx[1:] != idx[:-1]
+        group_last = np.ones(len(idx), dtype=bool)
+        group_last[:-1] = group_start[1:]
+
+        # First time we see a vehicle: anchor its x axes at this reading
+        first_rows = group_start & np.isnan(self.x0_odo[idx])
+        self.x0_odo[idx[first_rows]] = odo[first_rows]
+        self.t0[idx[first_rows]] = t[first_rows]
+
+        # Oil changes show up as oil_life going *up*; only the segment after
+        # the most recent change describes the current oil's decay.
+        prev_oil = np.empty(len(oil))
+        prev_oil[1:] = oil[:-1]
+        prev_oil[group_start] = self.last_oil[idx[group_start]]
+        reset = oil > prev_oil # NaN (no previous) compares False
+        pos = np.arange(len(idx))
+        seg_start = np.maximum.accumulate(np.where(reset | group_start, pos, 0))
+        last_seg_start = np.zeros(len(self), dtype=np.int64)
+        last_seg_start[idx[group_last]] = seg_start[group_last]
+        keep = seg_start == last_seg_start[idx]
+        reset_vehicles = np.unique(idx[reset])
+        self.oil.reset(reset_vehicles)
+
+        days = (t - self.t0[idx]) / SECONDS_PER_DAY
+        self.oil.add(idx[keep], odo[keep] - self.x0_odo[idx[keep]], oil[keep])
+        self.mileage.add(idx, days, odo)
+        self.temp.add(idx, days, temp)
+
+        self.last_t[idx[group_last]] = t[group_last]
+        self.last_oil[idx[group_last]] = oil[group_last]
+
+    def trends(self):
+        """Per-vehicle slopes: oil %/mile, miles/day, °C/day (NaN where not enough data)."""
+        return self.oil.slope(), self.mileage.slope(), self.temp.slope()
+
+# --- 4. LOADING FROM SQLITE ---
+def refresh_from_db(model, db_path):
+    """Reads only telemetry_history rows newer than the last refresh. Returns rows added."""
+    conn = sqlite3.connect(db_path)
+    added = 0
+    try:
+        cur = conn.execute(
+            "SELECT id, vehicle_id, recorded_at, odometer, oil_life, engine_temp FROM telemetry_history WHERE id > ? ORDER BY id",
+            (model.last_rowid,)
+        )
+        while True:
+            rows = cur.fetchmany(FETCH_BATCH)
+            if not rows:
+                break
+            ids, vids, t, odo, oil, temp = zip(*rows)
+            model.update(vids, t, odo, oil, temp)
+            model.last_rowid = ids[-1]
+            added += len(rows)
+    except sqlite3.OperationalError as e:
+        if "no such table" not in str(e):
+            raise
+    finally:
+        conn.close()
+    return added
+
+def load_current_fleet(db_path):
+    """Current vehicles table as column arrays."""
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT vehicle_id, model, engine_temp, oil_life, odometer, error_code FROM vehicles").fetchall()
+    finally:
+        conn.close()
+    if not rows:
+        return None
+    vids, models, temp, oil, odo, codes = zip(*rows)
+    return {
+        "vehicle_id": np.array(vids, dtype=object),
+        "model": np.array(models, dtype=object),
+        "engine_temp": np.array(temp, dtype=float),
+        "oil_life": np.array(oil, dtype=float),
+        "odometer": np.array(odo, dtype=float),
+        "error_code": np.array(codes, dtype=object),
+    }
+
+_intervals = {} # db_path -> (maintenance_history version, {vehicle_id: julian day of last change}, model_interval)
+
+def oil_change_intervals(db_path):
+    """
+    From maintenance_history: {vehicle_id: days since last oil change} and the
+    median oil-change interval (days) per model, as a fallback forecast. The
+    history is only re-read when maintenance_history has changed (new max id
+    or row count); the ages are then recomputed against the current time.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        version = conn.execute("SELECT MAX(id), COUNT(*) FROM maintenance_history").fetchone()
+        cached = _intervals.get(db_path)
+        if cached is None or cached[0] != version:
+            rows = conn.execute(
+                "SELECT h.vehicle_id, v.model, julianday(h.service_date) "
+                "FROM maintenance_history h JOIN vehicles v ON v.vehicle_id = h.vehicle_id "
+                "WHERE h.service_type = 'Oil Change' ORDER BY h.vehicle_id, h.service_date"
+            ).fetchall()
+            cached = _intervals[db_path] = (version, *_intervals_from_rows(rows))
+    finally:
+        conn.close()
+    _, last_change, model_interval = cached
+    today = time.time() / SECONDS_PER_DAY + 2440587.5 # julian day now
+    return {vid: today - day for vid, day in last_change.items()}, model_interval
+
+def _intervals_from_rows(rows):
+    if not rows:
+        return {}, {}
+    vids = np.array([r[0] for r in rows], dtype=object)
+    models = np.array([r[1] for r in rows], dtype=object)
+    day = np.array([r[2] for r in rows], dtype=float)
+    same = vids[1:] == vids[:-1]
+    gaps = (day[1:] - day[:-1])[same]
+    gap_models = models[1:][same]
+    model_interval = {m: float(np.median(gaps[gap_models == m])) for m in np.unique(gap_models)}
+    last = np.ones(len(vids), dtype=bool)
+    last[:-1] = ~same
+    return dict(zip(vids[last], day[last])), model_interval
+
+# --- 5. FORECAST ---
+def _fill_by_model(values, models):
+    """Replaces NaN slopes with the median slope of the vehicle's model (then the fleet)."""
+    out = values.copy()
+    fleet = np.nanmedian(values) if np.isfinite(values).any() else np.nan
+    for m in np.unique(models):
+        mask = models == m
+        known = values[mask & np.isfinite(values)]
+        fill = np.median(known) if len(known) else fleet
+        out[mask & ~np.isfinite(out)] = fill
+    return out
+
+def _overheat_temps(rules, models):
+    """Per vehicle: the engine_temp its model's alert rules fire at (inf = none do)."""
+    distinct, inverse = np.unique(np.asarray(models, dtype=str), return_inverse=True)
+    limits = [rules.alert_threshold("engine_temp", m) for m in distinct]
+    return np.array([np.inf if t is None else t for t in limits], dtype=float)[inverse]
+
+def forecast(model, fleet, horizon_days=HORIZON_DAYS, history_fallback=None, rules=None, max_listed=MAX_DUE_LISTED):
+    """
+    Vectorized fleet forecast. `fleet` holds current column arrays (see
+    load_current_fleet); overheating means tripping an engine_temp alert rule
+    of `rules` (default: the stock rules). Returns per-reason due counts,
+    projected labour hours and the `max_listed` vehicles due soonest.
+    """
+    n = len(fleet["vehicle_id"])
+    oil_slope, miles_per_day, temp_per_day = model.trends()
+    idx = np.fromiter((model.index.get(v, -1) for v in fleet["vehicle_id"]), dtype=np.int64, count=n)
+    seen = idx >= 0
+
+    def per_vehicle(values):
+        out = np.full(n, np.nan)
+        out[seen] = values[idx[seen]]
+        return _fill_by_model(out, fleet["model"])
+
+    oil_decay = -per_vehicle(oil_slope)       # % per mile (positive = wearing)
+    mpd = per_vehicle(miles_per_day)
+    drift = per_vehicle(temp_per_day)
+
+    oil_now, temp_now = fleet["oil_life"], fleet["engine_temp"]
+    critical_temp = _overheat_temps(rules or diagnostics.RuleSet(diagnostics.default_rules()), fleet["model"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        oil_days = np.where(
+            oil_now <= OIL_SERVICE_THRESHOLD, 0.0,
+            np.where((oil_decay > 0) & (mpd > 0), (oil_now - OIL_SERVICE_THRESHOLD) / (oil_decay * mpd), np.inf)
+        )
+        temp_days = np.where(
+            temp_now > critical_temp, 0.0,
+            np.where(drift > 0, (critical_temp - temp_now) / drift, np.inf)
+        )
+
+    # No usable oil trend: fall back to the model's usual oil-change interval
+    if history_fallback:
+        since_last, model_interval = history_fallback
+        no_trend = ~np.isfinite(oil_days)
+        for i in np.flatnonzero(no_trend):
+            interval = model_interval.get(fleet["model"][i])
+            age = since_last.get(fleet["vehicle_id"][i])
+            if interval is not None and age is not None:
+                oil_days[i] = max(0.0, interval - age)
+
+    has_dtc = np.fromiter((c not in (None, "None") for c in fleet["error_code"]), dtype=bool, count=n)
+    due_oil = oil_days <= horizon_days
+    due_temp = temp_days <= horizon_days
+    due = due_oil | due_temp | has_dtc
+    immediate = (oil_days == 0) | (temp_days == 0) | has_dtc
+
+    hours = (due_oil * SERVICE_HOURS["oil"] + due_temp * SERVICE_HOURS["overheating"]
+             + has_dtc * SERVICE_HOURS["dtc"])
+    days_until = np.minimum(oil_days, temp_days)
+    days_until[has_dtc] = 0.0
+    # Soonest first, fleet order breaking ties. Only what can make the list
+    # is sorted: everything up to the max_listed-th soonest (ties included).
+    due_ids = np.flatnonzero(due)
+    if len(due_ids) > max_listed > 0:
+        cut = np.partition(days_until[due_ids], max_listed - 1)[max_listed - 1]
+        due_ids = due_ids[days_until[due_ids] <= cut]
+    due_ids = due_ids[np.argsort(days_until[due_ids], kind="stable")][:max_listed]
+
+    return {
+        "vehicles": n,
+        "horizon_days": horizon_days,
+        "immediate": int(immediate.sum()),
+        "due_within_horizon": int(due.sum()),
+        "by_reason": {"oil": int(due_oil.sum()), "overheating": int(due_temp.sum()), "dtc": int(has_dtc.sum())},
+        "estimated_hours": float(hours.sum()),
+        "due_vehicles": [
+            {"vehicle_id": fleet["vehicle_id"][i], "model": fleet["model"][i], "days": round(float(days_until[i]), 1)}
+            for i in due_ids
+        ],
+        "fleet_trends": {
+            "oil_pct_per_1000_miles": round(float(np.nanmedian(oil_decay)) * 1000, 2) if np.isfinite(oil_decay).any() else None,
+            "miles_per_day": round(float(np.nanmedian(mpd)), 1) if np.isfinite(mpd).any() else None,
+        },
+    }
+
+# --- 6. SHARED, CACHED MODELS ---
+_models = {}
+_models_lock = threading.Lock()
+
+def get_model(db_path):
+    """One incrementally-updated model per database file."""
+    with _models_lock:
+        model = _models.get(db_path)
+        if model is None:
+            model = _models[db_path] = DegradationModel()
+        return model
+
+def forecast_fleet(db_path, horizon_days=HORIZON_DAYS):
+    """Refreshes the cached model with new readings only, then forecasts the current fleet."""
+    t0 = time.perf_counter()
+    model = get_model(db_path)
+    with model.lock:
+        added = refresh_from_db(model, db_path)
+        fleet = load_current_fleet(db_path)
+        if fleet is None:
+            return None
+        result = forecast(model, fleet, horizon_days, history_fallback=oil_change_intervals(db_path),
+                          rules=diagnostics.get_rules(db_path))
+    result["new_readings"] = added
+    result["compute_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return result
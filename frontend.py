@@ -1,12 +1,16 @@
 import streamlit as st
 import requests
-import time
 import uuid
 
 # --- CONFIGURATION ---
 BACKEND_URL = "http://localhost:8000"
+ALERT_POLL_SECONDS = 2    # how often the alert fragment reruns
+FLEET_REFRESH_SECONDS = 10 # how often the vehicle list fragment reruns (and its cache TTL)
+VEHICLE_PAGE_SIZE = 50
+CHAT_WINDOW = 50          # messages drawn on a full rerun ("Show earlier" extends it)
+REQUEST_TIMEOUT = 5
 st.set_page_config(
-    page_title="Fleet Command AI", 
+    page_title="Fleet Command AI",
     page_icon="🚗",
     layout="wide"
 )
@@ -23,92 +27,147 @@ if "thread_id" not in st.session_state:
 if "processed_alerts" not in st.session_state:
     st.session_state.processed_alerts = set()
 
+# Keyset cursors of the pages visited so far ([None] = first page)
+if "page_cursors" not in st.session_state:
+    st.session_state.page_cursors = [None]
+
+if "fleet_total" not in st.session_state:
+    st.session_state.fleet_total = None
+
+if "chat_window" not in st.session_state:
+    st.session_state.chat_window = CHAT_WINDOW
+
+# Messages already drawn by the last full rerun; the alert fragment draws the rest
+if "rendered_messages" not in st.session_state:
+    st.session_state.rendered_messages = 0
+
+# --- BACKEND CLIENT ---
+@st.cache_resource
+def get_session():
+    """One pooled keep-alive session for every rerun (no new TCP connection per request)."""
+    return requests.Session()
+
+@st.cache_resource
+def get_page_validators():
+    """after-cursor -> (ETag, page) of the last full response, for If-None-Match."""
+    return {}
+
+@st.cache_data(ttl=FLEET_REFRESH_SECONDS, show_spinner=False)
+def fetch_vehicle_page(after):
+    """
+    One page of /vehicles; cached, so reruns within the TTL make no request at
+    all, and after the TTL an unchanged page comes back as an empty 304.
+    """
+    params = {"limit": VEHICLE_PAGE_SIZE}
+    if after:
+        params["after"] = after
+    validators = get_page_validators()
+    cached = validators.get(after)
+    headers = {"If-None-Match": cached[0]} if cached else {}
+    res = get_session().get(f"{BACKEND_URL}/vehicles", params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+    if res.status_code == 304 and cached:
+        return cached[1]
+    res.raise_for_status()
+    page = res.json()
+    if "ETag" in res.headers:
+        validators[after] = (res.headers["ETag"], page)
+    return page
+
+@st.cache_data(ttl=ALERT_POLL_SECONDS, show_spinner=False)
+def fetch_health():
+    res = get_session().get(f"{BACKEND_URL}/health", timeout=REQUEST_TIMEOUT)
+    res.raise_for_status()
+    return res.json()
+
+@st.cache_data(ttl=ALERT_POLL_SECONDS, show_spinner=False)
+def fetch_latest_alert():
+    """Only the newest alert is ever shown, so only the newest alert is fetched."""
+    res = get_session().get(f"{BACKEND_URL}/alerts", params={"limit": 1}, timeout=REQUEST_TIMEOUT)
+    res.raise_for_status()
+    alerts = res.json()
+    return alerts[-1] if alerts else None
+
 # --- SIDEBAR: FLEET STATUS ---
+@st.fragment(run_every=FLEET_REFRESH_SECONDS)
+def monitored_assets():
+    """Paginated fleet list; reruns on its own timer without redrawing the page."""
+    cursors = st.session_state.page_cursors
+    try:
+        page = fetch_vehicle_page(cursors[-1])
+    except requests.exceptions.RequestException as e:
+        st.error(f"Fleet list unavailable: {e}")
+        return
+    if "total" in page:
+        st.session_state.fleet_total = page["total"]
+
+    st.subheader("Monitored Assets")
+    if st.session_state.fleet_total is not None:
+        st.caption(f"{st.session_state.fleet_total:,} vehicles · page {len(cursors)}")
+    # One virtualized table instead of one st.code element per vehicle
+    st.dataframe(page["vehicles"], hide_index=True, use_container_width=True)
+
+    prev_col, next_col = st.columns(2)
+    if prev_col.button("◀ Prev", disabled=len(cursors) == 1, use_container_width=True):
+        cursors.pop()
+        st.rerun(scope="fragment")
+    if next_col.button("Next ▶", disabled=not page["next_after"], use_container_width=True):
+        cursors.append(page["next_after"])
+        st.rerun(scope="fragment")
+
 with st.sidebar:
     st.header("📡 Fleet Telemetry")
-    
-    # 1. Fetch live status from Backend
+
+    # 1. Fetch live status from Backend (/health doesn't touch the vehicles table)
     try:
-        response = requests.get(f"{BACKEND_URL}/")
-        if response.status_code == 200:
-            data = response.json()
-            st.success("🟢 System Online")
-            
-            # --- MANUAL TRIGGER BUTTON (THE MISSING PIECE) ---
-            st.markdown("---")
-            st.write("**Manual Controls**")
-            if st.button("🔄 Run Health Check", type="primary"):
-                with st.spinner("Scanning fleet sensors..."):
-                    try:
-                        # Call the trigger endpoint we made in main.py
-                        trigger_res = requests.post(f"{BACKEND_URL}/trigger_check")
-                        if trigger_res.status_code == 200:
-                            st.success("Scan Initiated Successfully")
-                        else:
-                            st.error(f"Trigger Failed: {trigger_res.status_code}")
-                    except Exception as e:
-                        st.error(f"Connection Error: {e}")
-            # -------------------------------------------------
-
-            st.markdown("---")
-            st.subheader("Monitored Assets")
-            for vehicle in data.get("monitored_vehicles", []):
-                st.code(f"🚛 {vehicle}")
-        else:
-            st.error("🔴 Backend Error")
+        fetch_health()
+        st.success("🟢 System Online")
+
+        # --- MANUAL TRIGGER BUTTON (THE MISSING PIECE) ---
+        st.markdown("---")
+        st.write("**Manual Controls**")
+        if st.button("🔄 Run Health Check", type="primary"):
+            with st.spinner("Scanning fleet sensors..."):
+                try:
+                    # Call the trigger endpoint we made in main.py
+                    trigger_res = get_session().post(f"{BACKEND_URL}/trigger_check")
+                    if trigger_res.status_code == 200:
+                        st.success("Scan Initiated Successfully")
+                        # The sweep changed statuses and alerts; don't wait for the TTL
+                        fetch_vehicle_page.clear()
+                        fetch_latest_alert.clear()
+                    else:
+                        st.error(f"Trigger Failed: {trigger_res.status_code}")
+                except Exception as e:
+                    st.error(f"Connection Error: {e}")
+        # -------------------------------------------------
+
+        st.markdown("---")
+        monitored_assets()
     except requests.exceptions.ConnectionError:
         st.error("🔴 Backend Offline")
         st.info("Ensure main.py is running.")
         st.stop()
+    except requests.exceptions.RequestException:
+        st.error("🔴 Backend Error")
 
 # --- MAIN DASHBOARD ---
 st.title("🤖 Autonomous Service Agent")
 st.markdown("### Interactive Command Center")
 
-# --- PROACTIVE ALERT POLLING ---
-try:
-    alerts_res = requests.get(f"{BACKEND_URL}/alerts")
-    if alerts_res.status_code == 200:
-        alerts = alerts_res.json()
-        
-        if alerts:
-            latest = alerts[-1]
-            # Create unique ID for this specific alert event
-            alert_unique_id = f"{latest['vehicle_id']}_{latest['timestamp']}"
-            
-            if alert_unique_id not in st.session_state.processed_alerts:
-                
-                # --- MEMORY SYNC ---
-                # Adopt the backend's thread ID so the user joins the active session
-                remote_thread_id = latest.get("thread_id")
-                if remote_thread_id:
-                    st.session_state.thread_id = remote_thread_id
-                    st.toast(f"🔗 Connected to Agent Session: {remote_thread_id}")
-
-                # Show notification
-                st.toast(f"🚨 CRITICAL ALERT: {latest['vehicle_id']}", icon="🔥")
-                
-                # Inject Agent's opening message
-                ai_opening_message = (
-                    f"**⚠️ PROACTIVE ALERT**\n\n"
-                    f"I have detected a critical anomaly on **{latest['vehicle_id']}**.\n"
-                    f"**Analysis:** {latest['message']}\n\n"
-                    "Would you like me to proceed with the recommended repair?"
-                )
-                
-                st.session_state.messages.append({"role": "assistant", "content": ai_opening_message})
-                st.session_state.processed_alerts.add(alert_unique_id)
-                
-except Exception as e:
-    st.error(f"Polling Error: {e}")
-
 # --- CHAT INTERFACE ---
-
-# 1. Display chat history
-for message in st.session_state.messages:
+def render_message(message):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
+# 1. Display chat history (full reruns only: a user message or a new alert)
+messages = st.session_state.messages
+hidden = max(0, len(messages) - st.session_state.chat_window)
+if hidden and st.button(f"Show {min(hidden, CHAT_WINDOW)} earlier messages"):
+    st.session_state.chat_window += CHAT_WINDOW
+    st.rerun()
+for message in messages[-st.session_state.chat_window:]:
+    render_message(message)
+
 # 2. User Input Area
 if prompt := st.chat_input("Type your response..."):
     # Add User message to UI
@@ -124,23 +183,70 @@ if prompt := st.chat_input("Type your response..."):
                 "thread_id": st.session_state.thread_id,
                 "vehicle_id": "Vehicle-123"
             }
-            
-            res = requests.post(f"{BACKEND_URL}/chat", json=payload)
-            
+
+            # One key per message: a retry after a dropped connection gets the
+            # first run's answer instead of running the agents again
+            headers = {"Idempotency-Key": str(uuid.uuid4())}
+            try:
+                res = get_session().post(f"{BACKEND_URL}/chat", json=payload, headers=headers)
+            except requests.exceptions.ConnectionError:
+                res = get_session().post(f"{BACKEND_URL}/chat", json=payload, headers=headers)
+
             if res.status_code == 200:
                 ai_response = res.json()["response"]
-                
+
                 # Add AI response to UI
                 st.session_state.messages.append({"role": "assistant", "content": ai_response})
                 with st.chat_message("assistant"):
                     st.markdown(ai_response)
             else:
                 st.error(f"Error: {res.status_code}")
-                
+
         except Exception as e:
             st.error(f"Connection Failed: {e}")
 
-# --- AUTO-REFRESH ---
-# Polls backend every 2 seconds
-time.sleep(2)
-st.rerun()
\ No newline at end of file
+st.session_state.rendered_messages = len(st.session_state.messages)
+
+# --- PROACTIVE ALERT POLLING ---
+# Replaces the old "sleep 2s + st.rerun()" loop: only this fragment reruns
+# every ALERT_POLL_SECONDS, and it only draws messages added since the last
+# full rerun instead of redrawing the whole chat history.
+@st.fragment(run_every=ALERT_POLL_SECONDS)
+def poll_alerts():
+    try:
+        latest = fetch_latest_alert()
+
+        if latest:
+            # Create unique ID for this specific alert event
+            alert_unique_id = f"{latest['vehicle_id']}_{latest['timestamp']}"
+
+            if alert_unique_id not in st.session_state.processed_alerts:
+
+                # --- MEMORY SYNC ---
+                # Adopt the backend's thread ID so the user joins the active session
+                remote_thread_id = latest.get("thread_id")
+                if remote_thread_id:
+                    st.session_state.thread_id = remote_thread_id
+                    st.toast(f"🔗 Connected to Agent Session: {remote_thread_id}")
+
+                # Show notification
+                st.toast(f"🚨 CRITICAL ALERT: {latest['vehicle_id']}", icon="🔥")
+
+                # Inject Agent's opening message
+                ai_opening_message = (
+                    f"**⚠️ PROACTIVE ALERT**\n\n"
+                    f"I have detected a critical anomaly on **{latest['vehicle_id']}**.\n"
+                    f"**Analysis:** {latest['message']}\n\n"
+                    "Would you like me to proceed with the recommended repair?"
+                )
+
+                st.session_state.messages.append({"role": "assistant", "content": ai_opening_message})
+                st.session_state.processed_alerts.add(alert_unique_id)
+
+    except Exception as e:
+        st.error(f"Polling Error: {e}")
+
+    for message in st.session_state.messages[st.session_state.rendered_messages:]:
+        render_message(message)
+
+poll_alerts()
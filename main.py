@@ -1,19 +1,101 @@
 import asyncio
+import hashlib
 import sqlite3
+import time
 import random
 import json  # Essential for passing valid data to AI
-from typing import List, Dict
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+import os
+import threading
+import uuid
+from typing import List, Dict, Optional
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 # Import ToolMessage for proper history injection
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
 
-# Import the Agent Graph (now with Memory) from agents.py
-from agents import app as agent_app, fetch_telematics_data
+# The Agent Graph (now with Memory) is built lazily by agents.get_app(), so the
+# server starts without waiting for LangGraph/Ollama to load.
+from agents import DB_NAME, cache_stats, get_app, fetch_telematics_data, get_rca_insights, prefetch_telemetry, telemetry_cache
+import alerting
+import coalescing
+import db_writer
+import diagnostics
+import metrics
+import profiling
+import retention
+import scheduling
+
+try:
+    import orjson
+except ImportError: # optional: only used when FLEET_FAST_JSON=1
+    orjson = None
 
 # --- 1. SETUP ---
 app = FastAPI(title="Fleet Command AI Backend")
+STARTED_AT = time.time()
+
+# Responses smaller than this aren't worth compressing (headers + CPU > savings)
+COMPRESS_MIN_BYTES = int(os.getenv("FLEET_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("FLEET_GZIP_LEVEL", "6"))
+try:
+    # Optional: brotli for clients that send "br", gzip for everyone else
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESS_MIN_BYTES, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESS_MIN_BYTES, compresslevel=GZIP_LEVEL)
+
+# --- 1b. RESPONSE ENCODING ---
+# The heavy endpoints (/alerts, /vehicles, /chat/batch) build their own
+# Response from plain dicts, skipping FastAPI's jsonable_encoder walk.
+# FLEET_FAST_JSON=1 swaps the stdlib encoder for orjson when it is installed.
+FAST_JSON = os.getenv("FLEET_FAST_JSON", "0") == "1" and orjson is not None
+
+def dumps(payload) -> bytes:
+    if FAST_JSON:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+
+def json_response(payload, headers=None):
+    return Response(content=dumps(payload), media_type="application/json", headers=headers)
+
+# --- 1c. TRAFFIC RECORDING ---
+# FLEET_RECORD_TRAFFIC=traffic.jsonl appends every chat/alert request (offset,
+# method, path, query, body, status) to that file, for benchmarks/loadtest.py
+# to replay. A body that isn't JSON is kept as "body_text". Off by default.
+RECORD_TRAFFIC = os.getenv("FLEET_RECORD_TRAFFIC")
+RECORDED_PATHS = ("/chat", "/chat/batch", "/trigger_check", "/alerts")
+_record_lock = threading.Lock()
+
+def _append_record(line):
+    with _record_lock, open(RECORD_TRAFFIC, "a") as f:
+        f.write(line)
+
+if RECORD_TRAFFIC:
+    @app.middleware("http")
+    async def record_traffic(request: Request, call_next):
+        if request.url.path not in RECORDED_PATHS:
+            return await call_next(request)
+        received = time.time()
+        body = await request.body()
+        response = await call_next(request)
+        entry = {
+            "t": round(received - STARTED_AT, 3),
+            "method": request.method,
+            "path": request.url.path,
+            "query": request.url.query,
+            "body": None,
+            "status": response.status_code,
+        }
+        if body:
+            try:
+                entry["body"] = json.loads(body)
+            except ValueError: # malformed JSON or not UTF-8: record it as sent
+                entry["body_text"] = body.decode("utf-8", "replace")
+        # File I/O off the event loop
+        await asyncio.to_thread(_append_record, json.dumps(entry) + "\n")
+        return response
 
 # In-memory storage for demo purposes
 conversation_history: Dict[str, List] = {}
@@ -25,6 +107,15 @@ class ChatRequest(BaseModel):
     thread_id: str
     vehicle_id: str = "Vehicle-123"
 
+class BatchChatItem(BaseModel):
+    vehicle_id: str
+    message: str
+    thread_id: Optional[str] = None # default: a fresh thread per item
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+    concurrency: int = 8
+
 class Alert(BaseModel):
     vehicle_id: str
     severity: str
@@ -38,48 +129,136 @@ async def fleet_simulation_loop():
     Every 10 seconds, it updates odometer and fluctuates engine temp for all cars.
     """
     print("🚗 [Sim] Starting Fleet Physics Engine...")
+    import forecasting # numpy; kept off the import path of main.py
+    tick_no = 0
     while True:
         await asyncio.sleep(10) # Update every 10s
+        tick_no += 1
         try:
-            conn = sqlite3.connect("fleet_data.db")
-            cur = conn.cursor()
-            
-            # 1. Increment Odometer (Driving)
-            cur.execute("UPDATE vehicles SET odometer = odometer + 1")
-            
-            # 2. Fluctuate Temp (Random physics)
-            # Vehicles with P0118 (Coolant issue) get hotter faster!
-            cur.execute("UPDATE vehicles SET engine_temp = engine_temp + 2 WHERE error_code = 'P0118' AND engine_temp < 135")
-            cur.execute("UPDATE vehicles SET engine_temp = engine_temp - 1 WHERE error_code = 'P0118' AND engine_temp > 130") # Thermostat cycling
-            
-            # Normal cars stay cool (fluctuate between 88-92)
-            cur.execute("UPDATE vehicles SET engine_temp = 90 + (ABS(RANDOM()) % 5) WHERE error_code = 'None'")
-            
-            conn.commit()
-            conn.close()
+            # One grouped transaction on the shared writer thread, so the tick
+            # no longer races the agents' status/booking writes for the lock.
+            with metrics.timer("sql", "fleet_simulation_tick"):
+                tick = db_writer.get_writer(DB_NAME).submit_many([
+                    # 1. Increment Odometer (Driving)
+                    ("UPDATE vehicles SET odometer = odometer + 1", ()),
+                    # 2. Fluctuate Temp (Random physics)
+                    # Vehicles with P0118 (Coolant issue) get hotter faster!
+                    ("UPDATE vehicles SET engine_temp = engine_temp + 2 WHERE error_code = 'P0118' AND engine_temp < 135", ()),
+                    ("UPDATE vehicles SET engine_temp = engine_temp - 1 WHERE error_code = 'P0118' AND engine_temp > 130", ()), # Thermostat cycling
+                    # Normal cars stay cool (fluctuate between 88-92)
+                    ("UPDATE vehicles SET engine_temp = 90 + (ABS(RANDOM()) % 5) WHERE error_code = 'None'", ()),
+                    # 3. Oil wears ~1% every 50 miles
+                    ("UPDATE vehicles SET oil_life = oil_life - 1 WHERE oil_life > 0 AND odometer % 50 = 0", ()),
+                    # 4. Sample readings for the forecasting model (telemetry_history)
+                    (forecasting.RECORD_READINGS_SQL, forecasting.record_args(tick_no)),
+                    # 5. Vehicles this tick pushed over the threshold (recorded by trigger)
+                    (alerting.DRAIN_SQL, ()),
+                ])
+                crossings = (await asyncio.wrap_future(tick))[-1]
+            # Every row just changed, so cached telemetry snapshots are stale
+            telemetry_cache.invalidate()
+            for vid, temp in crossings:
+                print(f"🚨 [Alert] {vid} tripped an alert rule ({temp}°C)")
+                alert_dispatcher.publish(vid, temp)
             # print("🔄 [Sim] Fleet Telematics Updated") # Uncomment to see heartbeat
         except Exception as e:
             print(f"⚠️ [Sim Error] {e}")
 
+# --- 3b. BACKGROUND TASK: RETENTION ---
+RETENTION_INTERVAL = float(os.getenv("FLEET_RETENTION_INTERVAL", "3600")) # 0 disables
+
+async def retention_loop():
+    """Archives expired history, vacuums freed pages and checkpoints the WAL on a schedule."""
+    while True:
+        await asyncio.sleep(RETENTION_INTERVAL)
+        try:
+            await asyncio.to_thread(retention.run_maintenance, DB_NAME)
+        except Exception as e:
+            print(f"⚠️ [Retention Error] {e}")
+
 # Start simulation on app launch
 @app.on_event("startup")
 async def start_sim():
+    import forecasting
+    forecasting.ensure_schema(DB_NAME) # older DBs predate telemetry_history
+    alerting.ensure_schema(DB_NAME) # seeds diagnostic_rules, builds the alert trigger from them
+    await asyncio.to_thread(ensure_vehicle_indexes)
+    # Crossings are detected at write time; vehicles that were already hot
+    # before we started listening get one event each.
+    alert_dispatcher.start()
+    for vid, temp in await asyncio.to_thread(alerting.hot_vehicles, DB_NAME):
+        alert_dispatcher.publish(vid, temp)
     asyncio.create_task(fleet_simulation_loop())
+    if RETENTION_INTERVAL > 0:
+        asyncio.create_task(retention_loop())
+    if SWEEP_INTERVAL > 0:
+        get_scheduler().start()
+    # Warm the agent graph off the event loop so the first /chat doesn't pay for it
+    asyncio.get_running_loop().run_in_executor(None, get_app)
 
 # --- 4. PROACTIVE MONITORING ---
+def seed_telemetry_messages(vid, data):
+    """
+    We construct a fake history so the Agent "remembers" doing the work:
+    a fetch_telematics_data call and its REAL SQL result.
+    """
+    tool_call_id = f"call_init_{vid}" # Unique ID per vehicle
+    return [
+        # 1. Fake the AI trying to call the tool
+        AIMessage(
+            content="", 
+            tool_calls=[{
+                "name": "fetch_telematics_data", 
+                "args": {"vehicle_id": vid}, 
+                "id": tool_call_id
+            }]
+        ),
+        # 2. Fake the Tool returning the REAL SQL data
+        ToolMessage(
+            content=json.dumps(data), 
+            tool_call_id=tool_call_id
+        )
+    ]
+
 def get_monitored_vehicles():
     """Fetches all vehicle IDs from the database."""
     try:
-        conn = sqlite3.connect("fleet_data.db")
-        cur = conn.cursor()
-        cur.execute("SELECT vehicle_id FROM vehicles")
-        rows = cur.fetchall()
-        conn.close()
+        with metrics.timer("sql", "monitored_vehicles"):
+            conn = sqlite3.connect(DB_NAME)
+            cur = conn.cursor()
+            cur.execute("SELECT vehicle_id FROM vehicles")
+            rows = cur.fetchall()
+            conn.close()
         return [r[0] for r in rows]
     except:
         return ["Vehicle-123"] # Fallback
 
-async def proactive_health_check():
+async def proactive_health_check(profile: bool = False):
+    # One trace per sweep: every node/tool/SQL span of every alert run lands in it.
+    # Profiling is opt-in (?profile=true or FLEET_PROFILE=1); returns its report if on.
+    with metrics.trace("proactive_sweep"), profiling.maybe_profile("proactive_sweep", profile) as prof:
+        await _run_health_check()
+    return prof.report if prof else None
+
+def seed_booking_messages(vid, slot_time):
+    """Fake book_appointment call/result for a slot the batch scheduler already reserved."""
+    tool_call_id = f"call_book_{vid}"
+    return [
+        AIMessage(
+            content="",
+            tool_calls=[{
+                "name": "book_appointment",
+                "args": {"slot": slot_time, "vehicle_id": vid},
+                "id": tool_call_id
+            }]
+        ),
+        ToolMessage(
+            content=f"BOOKING COMPLETE: {vid} scheduled for {slot_time} (priority slot reserved by the batch scheduler).",
+            tool_call_id=tool_call_id
+        )
+    ]
+
+async def _run_health_check():
     print("\n🔍 [System] Running proactive fleet health check...")
     
     # 1. Clear old alerts so the frontend shows the FRESH state of the fleet.
@@ -89,90 +268,167 @@ async def proactive_health_check():
     # Dynamic list from DB
     monitored_vehicles = get_monitored_vehicles()
     
-    for vid in monitored_vehicles:
-        # 2. Fetch data directly using the Real SQL Tool
+    # 2. One query for the whole fleet (also primes the telemetry cache)
+    fleet = list((await asyncio.to_thread(prefetch_telemetry, monitored_vehicles)).values())
+
+    # 3. Rule Engine: every alert rule from diagnostic_rules, vectorized over the fleet
+    alert, _ = diagnostics.get_rules(DB_NAME).screen(diagnostics.columns_from_rows(fleet))
+    flagged = [data for data, hit in zip(fleet, alert) if hit]
+    for data in flagged:
+        print(f"🚨 [Alert] Critical anomaly detected for {data['vehicle_id']} (Temp: {data['engine_temp']}°C)!")
+
+    # 4. Batch scheduling: rank every flagged vehicle by severity and assign
+    # slots in one pass/one transaction, instead of each agent run racing for
+    # the same first 4 open slots.
+    try:
+        bookings = await asyncio.to_thread(scheduling.book_flagged_vehicles, flagged)
+    except Exception as e:
+        print(f"⚠️ [Scheduler] Batch booking failed, agents will schedule individually: {e}")
+        bookings = {}
+
+    for data in scheduling.rank_vehicles(flagged):
         try:
-            # We invoke the tool directly to get the dictionary
-            data = fetch_telematics_data.invoke({"vehicle_id": vid})
-            
-            if "error" in data: continue
-
-            # 3. Rule Engine Trigger (Threshold: 110°C)
-            if data.get("engine_temp", 0) > 110:
-                print(f"🚨 [Alert] Critical anomaly detected for {vid} (Temp: {data['engine_temp']}°C)!")
-                
-                # Generate a unique ID for this specific alert event
-                alert_thread_id = f"alert_{vid}_{int(asyncio.get_event_loop().time())}"
-
-                # --- SEEDING MEMORY ---
-                # We construct a fake history so the Agent "remembers" doing the work.
-                tool_call_id = f"call_init_{vid}" # Unique ID per vehicle
-                
-                inputs = {
-                    "messages": [
-                        HumanMessage(content=f"System Alert: Check vehicle {vid}."),
-                        # 1. Fake the AI trying to call the tool
-                        AIMessage(
-                            content="", 
-                            tool_calls=[{
-                                "name": "fetch_telematics_data", 
-                                "args": {"vehicle_id": vid}, 
-                                "id": tool_call_id
-                            }]
-                        ),
-                        # 2. Fake the Tool returning the REAL SQL data
-                        ToolMessage(
-                            content=json.dumps(data), 
-                            tool_call_id=tool_call_id
-                        )
-                    ],
-                    "is_proactive": True 
-                }
-                
-                config = {"configurable": {"thread_id": alert_thread_id}}
-                
-                try:
-                    # Run the Agent (recursion limit prevents infinite loops)
-                    # It will now flow: Diag -> Quality -> Scheduler -> STOP
-                    result = await agent_app.ainvoke(inputs, config={**config, "recursion_limit": 25})
-                    
-                    final_response = result["messages"][-1].content
-                    
-                    active_alerts.append({
-                        "vehicle_id": vid,
-                        "severity": "CRITICAL",
-                        "message": final_response, # Contains "Recommended... Slots: [9:00, 10:00]"
-                        "timestamp": "Just now",
-                        "thread_id": alert_thread_id
-                    })
-                except Exception as e:
-                    print(f"❌ [Error] Agent crashed on {vid}: {e}")
+            active_alerts.append(await diagnose_vehicle(data, bookings.get(data["vehicle_id"])))
         except Exception as e:
-            print(f"⚠️ [Check Error] Skipping {vid}: {e}")
+            print(f"❌ [Error] Agent crashed on {data['vehicle_id']}: {e}")
+
+async def diagnose_vehicle(data, booked_slot=None):
+    """Runs the proactive agent flow for one flagged vehicle and returns its alert."""
+    vid = data["vehicle_id"]
+    # Generate a unique ID for this specific alert event
+    alert_thread_id = f"alert_{vid}_{int(asyncio.get_event_loop().time())}"
+
+    # --- SEEDING MEMORY ---
+    messages = [
+        HumanMessage(content=f"System Alert: Check vehicle {vid}."),
+        *seed_telemetry_messages(vid, data)
+    ]
+    if booked_slot:
+        messages.extend(seed_booking_messages(vid, booked_slot))
+    inputs = {
+        "messages": messages,
+        "is_proactive": True 
+    }
+    
+    config = {"configurable": {"thread_id": alert_thread_id}}
+    
+    # Run the Agent (recursion limit prevents infinite loops)
+    # It will now flow: Diag -> Quality -> Scheduler -> STOP
+    # (or Diag -> Quality -> STOP when the batch scheduler booked a slot)
+    result = await get_app().ainvoke(inputs, config={**config, "recursion_limit": 25})
+    
+    final_response = result["messages"][-1].content
+    
+    return {
+        "vehicle_id": vid,
+        "severity": "CRITICAL",
+        "message": final_response, # Contains "Recommended... Slots: [9:00, 10:00]"
+        "timestamp": "Just now",
+        "thread_id": alert_thread_id,
+        "booked_slot": booked_slot
+    }
+
+# --- 4b. EVENT-DRIVEN ALERTS ---
+async def handle_crossing(vid):
+    """Alert worker: diagnoses one vehicle that just crossed the threshold."""
+    with metrics.trace("threshold_alert", vehicle_id=vid):
+        data = await asyncio.to_thread(fetch_telematics_data.invoke, {"vehicle_id": vid})
+        if "error" in data or not diagnostics.get_rules(DB_NAME).is_alert(data):
+            return # gone, or no longer tripping an alert rule
+        bookings = await asyncio.to_thread(scheduling.book_flagged_vehicles, [data])
+        alert = await diagnose_vehicle(data, bookings.get(vid))
+    # One live alert per vehicle: a newer event replaces the old one
+    active_alerts[:] = [a for a in active_alerts if a["vehicle_id"] != vid] + [alert]
+
+alert_dispatcher = alerting.AlertDispatcher(handle_crossing)
 
-# --- SCHEDULER (DISABLED FOR MANUAL TESTING) ---
-scheduler = AsyncIOScheduler()
-scheduler.add_job(proactive_health_check, 'interval', seconds=60) 
+# --- SCHEDULER ---
+# Crossings are event-driven now (4b); the full sweep is only a safety net.
+SWEEP_INTERVAL = int(os.getenv("FLEET_SWEEP_INTERVAL", "900")) # 0 disables
+_scheduler = None
+
+def get_scheduler():
+    """Creates the APScheduler job on first use (keeps apscheduler off the import path)."""
+    global _scheduler
+    if _scheduler is None:
+        from apscheduler.schedulers.asyncio import AsyncIOScheduler
+        _scheduler = AsyncIOScheduler()
+        _scheduler.add_job(proactive_health_check, 'interval', seconds=SWEEP_INTERVAL)
+    return _scheduler
+
+@app.on_event("shutdown")
+async def stop_background_work():
+    if _scheduler is not None and _scheduler.running:
+        _scheduler.shutdown(wait=False)
+    await alert_dispatcher.stop()
 
 # --- 5. API ENDPOINTS ---
 
 @app.get("/")
 async def root():
-    return {"status": "Fleet Command AI is Online", "monitored_vehicles": get_monitored_vehicles()}
+    # The fleet list moved to the paginated /vehicles; this stays cheap to ping.
+    return {"status": "Fleet Command AI is Online", "vehicles": "/vehicles", "health": "/health"}
+
+@app.get("/health")
+async def health():
+    """Liveness for pollers and load balancers: no query, no vehicles table scan."""
+    return {
+        "status": "ok",
+        "uptime_s": round(time.time() - STARTED_AT, 1),
+        "db_writer": db_writer.writer_stats(),
+        "alerts": alert_dispatcher.stats(),
+        "chat": {**thread_gate.stats(), "dedup": chat_requests.stats()},
+        "caches": cache_stats(),
+    }
 
 @app.post("/trigger_check")
-async def manual_trigger():
-    """Manually run the health check via Frontend Button."""
-    await proactive_health_check()
-    return {"status": "Check triggered"}
+async def manual_trigger(profile: bool = False):
+    """Manually run the health check via Frontend Button. Pass ?profile=true to profile the sweep."""
+    report = await proactive_health_check(profile=profile)
+    response = {"status": "Check triggered"}
+    if report:
+        response["profile"] = report
+    return response
+
+# --- CHAT COALESCING ---
+# One in-flight graph run per thread (later requests queue behind it), and
+# duplicate requests share one run: an explicit Idempotency-Key header is
+# honoured for IDEMPOTENCY_TTL after the run; without one, an identical
+# (thread, vehicle, message) only joins a run that is still in flight. A user
+# who sends the same message again after the answer gets a new answer.
+IDEMPOTENCY_TTL = float(os.getenv("FLEET_IDEMPOTENCY_TTL", "600"))
+MAX_QUEUED_PER_THREAD = int(os.getenv("FLEET_MAX_QUEUED_PER_THREAD", "8"))
+thread_gate = coalescing.ThreadGate(max_waiting=MAX_QUEUED_PER_THREAD)
+chat_requests = coalescing.IdempotencyCache()
 
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request, profile: bool = False):
     """
     Main endpoint for User <-> Agent interaction.
+    Pass ?profile=true to profile the process while this request runs (it
+    includes any other requests served meanwhile; never deduplicated).
+    Send an Idempotency-Key header to make retries safe: a repeat of the same
+    key gets the first run's response instead of running the graph again.
     """
     print(f"📩 [Chat] Received: {request.message} (Thread: {request.thread_id})")
-    
+    if profile:
+        return await _run_chat(request, profile)
+
+    request_fingerprint = coalescing.fingerprint(request.thread_id, request.vehicle_id, request.message)
+    key = http_request.headers.get("idempotency-key")
+    if key:
+        cache_key, ttl = f"key:{request.thread_id}:{key}", IDEMPOTENCY_TTL
+    else:
+        cache_key, ttl = f"auto:{request_fingerprint}", 0
+    try:
+        response, outcome = await chat_requests.run(cache_key, request_fingerprint, ttl, lambda: _run_chat(request, False))
+    except coalescing.KeyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if outcome != "ran":
+        print(f"♻️ [Chat] {outcome} duplicate request on thread {request.thread_id}")
+    return json_response(response, headers={"Idempotent-Replayed": "true"} if outcome != "ran" else None)
+
+async def _run_chat(request: ChatRequest, profile: bool):
     # --- CONTEXT INJECTION ---
     # We remind the agent which vehicle we are talking about.
     augmented_message = f"Regarding {request.vehicle_id}: {request.message}"
@@ -186,19 +442,204 @@ async def chat_endpoint(request: ChatRequest):
     config = {"configurable": {"thread_id": request.thread_id}}
     
     try:
-        # The MemorySaver in agents.py will automatically load the previous history
-        result = await agent_app.ainvoke(inputs, config=config)
+        # The MemorySaver in agents.py will automatically load the previous history.
+        # Runs on one thread are serialized so they never interleave its state.
+        async with thread_gate.hold(request.thread_id):
+            with metrics.trace("chat", thread_id=request.thread_id, vehicle_id=request.vehicle_id), \
+                    profiling.maybe_profile("chat", profile) as prof:
+                result = await get_app().ainvoke(inputs, config=config)
         ai_response = result["messages"][-1].content
-        return {"response": ai_response, "vehicle_id": request.vehicle_id}
-        
+        response = {"response": ai_response, "vehicle_id": request.vehicle_id}
+        if prof:
+            response["profile"] = prof.report
+        return response
+
+    except coalescing.ThreadBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         print(f"❌ [Server Error] {e}") 
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- BATCH CHAT ---
+MAX_BATCH_ITEMS = 1000
+MAX_BATCH_CONCURRENCY = int(os.getenv("FLEET_BATCH_CONCURRENCY", "16"))
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(request: BatchChatRequest):
+    """
+    Runs many (vehicle_id, message) items and streams one NDJSON line per item
+    as soon as it finishes (so lines arrive out of order; use "index").
+    Shared work is done once up front: one telemetry query for all distinct
+    vehicles and one CAPA lookup per distinct DTC.
+    """
+    items = request.items
+    if not items:
+        raise HTTPException(status_code=422, detail="items must not be empty")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} items per batch")
+
+    batch_id = uuid.uuid4().hex[:8]
+    print(f"📦 [Batch] {batch_id}: {len(items)} items")
+
+    # --- SHARED WORK (deduplicated) ---
+    telemetry = await asyncio.to_thread(prefetch_telemetry, [item.vehicle_id for item in items])
+    dtcs = sorted({d["error_code"] for d in telemetry.values() if d.get("error_code") not in (None, "None")})
+    await asyncio.to_thread(lambda: [get_rca_insights.invoke({"diagnosis": code}) for code in dtcs])
+
+    limit = asyncio.Semaphore(max(1, min(request.concurrency, MAX_BATCH_CONCURRENCY)))
+
+    async def run_item(index, item):
+        thread_id = item.thread_id or f"batch_{batch_id}_{index}"
+        data = telemetry.get(item.vehicle_id)
+        messages = seed_telemetry_messages(item.vehicle_id, data) if data else []
+        messages.append(HumanMessage(content=f"Regarding {item.vehicle_id}: {item.message}"))
+        inputs = {"messages": messages, "is_proactive": False}
+        try:
+            # Items that share a thread_id (with each other or a live /chat) take turns
+            async with thread_gate.hold(thread_id, "chat_batch"), limit:
+                result = await get_app().ainvoke(inputs, config={"configurable": {"thread_id": thread_id}})
+            return {"index": index, "vehicle_id": item.vehicle_id, "thread_id": thread_id,
+                    "response": result["messages"][-1].content}
+        except Exception as e:
+            print(f"❌ [Batch] {batch_id} item {index} failed: {e}")
+            return {"index": index, "vehicle_id": item.vehicle_id, "thread_id": thread_id, "error": str(e)}
+
+    async def stream():
+        with metrics.trace("chat_batch", batch_id=batch_id, items=len(items)):
+            tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(items)]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield dumps(await finished) + b"\n"
+            finally:
+                # Client went away: stop the remaining graph runs
+                for task in tasks:
+                    task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# --- VEHICLE LIST (PAGINATED) ---
+VEHICLE_PAGE_MAX = 500
+
+# Every equality-filter index ends in vehicle_id, so "filter + keyset page" is
+# one index range scan plus a table lookup per returned row. The indexes are
+# deliberately not covering: engine_temp changes on every simulation tick, and
+# copying it into three more indexes would triple that write. Temperature
+# filters walk the primary key in vehicle_id order and test each row; for the
+# same reason there is no engine_temp index (older databases get it dropped).
+VEHICLE_INDEX_SQL = """
+CREATE INDEX IF NOT EXISTS idx_vehicles_status ON vehicles (status, vehicle_id);
+CREATE INDEX IF NOT EXISTS idx_vehicles_error_code ON vehicles (error_code, vehicle_id);
+CREATE INDEX IF NOT EXISTS idx_vehicles_model ON vehicles (model, vehicle_id);
+DROP INDEX IF EXISTS idx_vehicles_engine_temp;
+"""
+
+def ensure_vehicle_indexes():
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        conn.executescript(VEHICLE_INDEX_SQL)
+    finally:
+        conn.close()
+
+VEHICLE_COLUMNS = "vehicle_id, model, status, engine_temp, error_code"
+
+def _vehicle_filters(status, error_code, model, min_temp, max_temp):
+    clauses, args = [], []
+    for column, value in (("status", status), ("error_code", error_code), ("model", model)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            args.append(value)
+    if min_temp is not None:
+        clauses.append("engine_temp >= ?")
+        args.append(min_temp)
+    if max_temp is not None:
+        clauses.append("engine_temp <= ?")
+        args.append(max_temp)
+    return clauses, args
+
+def _vehicle_page(after, limit, filters=((), ())):
+    """Keyset page ordered by vehicle_id, so page N costs the same as page 1."""
+    clauses, args = filters
+    where = " AND ".join(["vehicle_id > ?", *clauses])
+    conn = sqlite3.connect(DB_NAME)
+    conn.row_factory = sqlite3.Row
+    try:
+        with metrics.timer("sql", "vehicle_page"):
+            rows = conn.execute(
+                f"SELECT {VEHICLE_COLUMNS} FROM vehicles WHERE {where} ORDER BY vehicle_id LIMIT ?",
+                (after or "", *args, limit + 1)
+            ).fetchall()
+            total = None
+            if after is None:
+                count_where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+                total = conn.execute(f"SELECT COUNT(*) FROM vehicles {count_where}", tuple(args)).fetchone()[0]
+    finally:
+        conn.close()
+    return [dict(row) for row in rows], total
+
+def etag_response(request: Request, payload):
+    """
+    JSON response with a content-hash ETag. A client that sends the same tag
+    back in If-None-Match gets an empty 304 instead of the body.
+    """
+    body = dumps(payload)
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/vehicles")
+async def list_vehicles(
+    request: Request,
+    after: Optional[str] = None,
+    limit: int = 50,
+    status: Optional[str] = None,
+    error_code: Optional[str] = None,
+    model: Optional[str] = None,
+    min_temp: Optional[int] = None,
+    max_temp: Optional[int] = None,
+):
+    """
+    One page of the fleet, optionally filtered. Pass the returned `next_after`
+    as ?after= (with the same filters) to get the next page; it is null on the
+    last one. `total` (matching vehicles) is only sent with page 1.
+    """
+    limit = max(1, min(limit, VEHICLE_PAGE_MAX))
+    filters = _vehicle_filters(status, error_code, model, min_temp, max_temp)
+    rows, total = await asyncio.to_thread(_vehicle_page, after, limit, filters)
+    page = rows[:limit]
+    response = {
+        "vehicles": page,
+        "next_after": page[-1]["vehicle_id"] if len(rows) > limit else None,
+    }
+    if total is not None:
+        response["total"] = total
+    return etag_response(request, response)
+
+@app.get("/vehicles/{vehicle_id}")
+async def get_vehicle(vehicle_id: str, request: Request):
+    """Full live row for one vehicle."""
+    data = await asyncio.to_thread(fetch_telematics_data.invoke, {"vehicle_id": vehicle_id})
+    if "error" in data:
+        raise HTTPException(status_code=404, detail=data["error"])
+    return etag_response(request, data)
+
 @app.get("/alerts")
-async def get_alerts():
-    """Frontend polls this to show "Red" notifications."""
-    return active_alerts
+async def get_alerts(limit: Optional[int] = None):
+    """Frontend polls this to show "Red" notifications. ?limit=N returns only the newest N."""
+    if limit is not None:
+        return json_response(active_alerts[-limit:] if limit > 0 else [])
+    return json_response(active_alerts)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Per-node, per-tool and per-query latency histograms in Prometheus text format."""
+    return PlainTextResponse(metrics.REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/storage")
+async def get_storage():
+    """DB/WAL/archive sizes, reclaimable pages, checkpoint state and the last retention run."""
+    return await asyncio.to_thread(retention.storage_stats, DB_NAME)
 
 # --- 6. EXECUTION ---
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+# --- 1. CONFIGURATION ---
+# Keep the most recent N samples per series for percentile estimation
+RESERVOIR_SIZE = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Set FLEET_TRACE_FILE=traces.jsonl to dump one JSON line per traced request
+TRACE_FILE_ENV = "FLEET_TRACE_FILE"
+
+# --- 2. HISTOGRAMS ---
+class Histogram:
+    """Latency series: total count/sum/errors plus a bounded sample window for percentiles."""
+
+    def __init__(self, size=RESERVOIR_SIZE):
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.samples = deque(maxlen=size)
+
+    def observe(self, seconds, error=False):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+        if error:
+            self.errors += 1
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "errors": self.errors,
+            **{f"p{int(q * 100)}": _nearest_rank(ordered, q) for q in QUANTILES},
+        }
+
+def _nearest_rank(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+class MetricsRegistry:
+    """Thread-safe collection of histograms keyed by (kind, name), e.g. ("node", "Supervisor")."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._counters = {}
+
+    def observe(self, kind, name, seconds, error=False):
+        with self._lock:
+            hist = self._series.get((kind, name))
+            if hist is None:
+                hist = self._series[(kind, name)] = Histogram()
+            hist.observe(seconds, error)
+
+    def inc(self, counter, name, amount=1):
+        """Plain monotonic counters (cache hits, retries, ...), exported as *_total."""
+        with self._lock:
+            self._counters[(counter, name)] = self._counters.get((counter, name), 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            series = {key: hist.snapshot() for key, hist in self._series.items()}
+            counters = dict(self._counters)
+        return series, counters
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+
+    def render_prometheus(self):
+        """Renders all series in the Prometheus text exposition format (v0.0.4)."""
+        series, counters = self.snapshot()
+        lines = []
+
+        kinds = sorted({kind for kind, _ in series})
+        for kind in kinds:
+            metric = f"fleet_{kind}_duration_seconds"
+            lines.append(f"# HELP {metric} Latency of {kind} executions.")
+            lines.append(f"# TYPE {metric} summary")
+            for (k, name), snap in sorted(series.items()):
+                if k != kind:
+                    continue
+                label = _escape_label(name)
+                for q in QUANTILES:
+                    lines.append(f'{metric}{{name="{label}",quantile="{q}"}} {snap[f"p{int(q * 100)}"]:.6f}')
+                lines.append(f'{metric}_sum{{name="{label}"}} {snap["sum"]:.6f}')
+                lines.append(f'{metric}_count{{name="{label}"}} {snap["count"]}')
+
+            errors = f"fleet_{kind}_errors_total"
+            lines.append(f"# HELP {errors} Failed {kind} executions.")
+            lines.append(f"# TYPE {errors} counter")
+            for (k, name), snap in sorted(series.items()):
+                if k == kind:
+                    lines.append(f'{errors}{{name="{_escape_label(name)}"}} {snap["errors"]}')
+
+        for counter in sorted({c for c, _ in counters}):
+            metric = f"fleet_{counter}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (c, name), value in sorted(counters.items()):
+                if c == counter:
+                    lines.append(f'{metric}{{name="{_escape_label(name)}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+REGISTRY = MetricsRegistry()
+
+# --- 3. TRACES ---
+_current_trace = contextvars.ContextVar("fleet_trace", default=None)
+
+class Trace:
+    """Spans recorded during one request (a /chat call or one proactive alert run)."""
+
+    def __init__(self, name, attributes=None):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes or {}
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add_span(self, kind, name, start, seconds, error):
+        with self._lock:
+            self.spans.append({
+                "kind": kind,
+                "name": name,
+                "start_ms": round((start - self._t0) * 1000, 3),
+                "duration_ms": round(seconds * 1000, 3),
+                "error": error,
+            })
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "attributes": self.attributes,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "spans": self.spans,
+        }
+
+@contextmanager
+def trace(name, **attributes):
+    """
+    Collects every span recorded inside the block into one Trace and, if
+    FLEET_TRACE_FILE is set, appends it to that JSONL file when the block exits.
+    """
+    current = Trace(name, attributes)
+    token = _current_trace.set(current)
+    try:
+        with timer("request", name):
+            yield current
+    finally:
+        _current_trace.reset(token)
+        current.duration_ms = round((time.perf_counter() - current._t0) * 1000, 3)
+        path = os.getenv(TRACE_FILE_ENV)
+        if path:
+            _append_jsonl(path, current.to_dict())
+
+_file_lock = threading.Lock()
+
+def _append_jsonl(path, record):
+    try:
+        with _file_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        print(f"⚠️ [Trace] Could not write trace to {path}: {e}")
+
+# --- 4. INSTRUMENTATION HELPERS ---
+@contextmanager
+def timer(kind, name, registry=None):
+    """Times the block into the registry (and the active trace, if any). Exceptions count as errors."""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        (registry or REGISTRY).observe(kind, name, seconds, error)
+        active = _current_trace.get()
+        if active is not None:
+            active.add_span(kind, name, start, seconds, error)
+
+def timed(kind, name=None):
+    """Decorator form of timer(); works for both sync and async functions."""
+    def decorator(func):
+        label = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with timer(kind, label):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(kind, label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def traced_runnable(kind, name, runnable):
+    """
+    Wraps a LangChain runnable (e.g. a create_react_agent subgraph) so both
+    invoke() and ainvoke() are timed. Used for the graph's worker nodes.
+    """
+    from langchain_core.runnables import RunnableLambda
+
+    def run(state, config=None):
+        with timer(kind, name):
+            return runnable.invoke(state, config)
+
+    async def arun(state, config=None):
+        with timer(kind, name):
+            return await runnable.ainvoke(state, config)
+
+    return RunnableLambda(run, afunc=arun, name=name)
@@ -0,0 +1,170 @@
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# --- 1. CONFIGURATION ---
+# FLEET_PROFILE=1 profiles every sweep/chat request; otherwise pass ?profile=true per request.
+PROFILE_ENV = "FLEET_PROFILE"
+PROFILE_DIR_ENV = "FLEET_PROFILE_DIR"
+DEFAULT_PROFILE_DIR = "profiles"
+
+SAMPLE_INTERVAL = 0.005   # 5ms between stack samples
+MAX_STACK_DEPTH = 128
+TOP_N = 25
+
+# Only one profile at a time: cProfile and the sampler are process-wide tools
+_active_lock = threading.Lock()
+# Sequence number in output filenames: two profiles can finish in the same second
+_profile_seq = itertools.count(1)
+
+def profiling_requested(flag=False):
+    """True if the request asked for it or the env var is set (read per call, no restart needed)."""
+    return bool(flag) or os.getenv(PROFILE_ENV, "").lower() in ("1", "true", "yes", "on")
+
+# --- 2. SAMPLING PROFILER (collapsed stacks) ---
+class StackSampler:
+    """
+    Background thread that snapshots every other thread's Python stack at a
+    fixed interval and counts identical stacks. The result is the "collapsed"
+    format read by flamegraph.pl and speedscope: `frame;frame;frame count`.
+    Unlike cProfile this also sees LangGraph's executor threads.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fleet-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.counts[_collapse(names.get(thread_id, str(thread_id)), frame)] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common()) + "\n"
+
+def _collapse(thread_name, frame):
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    frames.append(f"thread:{thread_name}")
+    # Semicolons separate frames in the collapsed format
+    return ";".join(f.replace(";", ":") for f in reversed(frames))
+
+# --- 3. REQUEST PROFILE ---
+class RequestProfile:
+    """
+    cProfile of the calling thread plus a stack sampler, written to disk on
+    finish(). Neither is scoped to one request: cProfile runs on the event
+    loop thread, so it also records every other coroutine that runs while
+    this request awaits, and the sampler sees every thread. Read a profile as
+    "the process during this request", and compare one taken on an idle
+    server against one taken under load.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.profiler = cProfile.Profile()
+        self.sampler = StackSampler()
+        self.report = None
+        self._t0 = None
+
+    def start(self):
+        self._t0 = time.perf_counter()
+        self.sampler.start()
+        self.profiler.enable()
+
+    def finish(self):
+        self.profiler.disable()
+        self.sampler.stop()
+        elapsed = time.perf_counter() - self._t0
+
+        out_dir = os.getenv(PROFILE_DIR_ENV, DEFAULT_PROFILE_DIR)
+        os.makedirs(out_dir, exist_ok=True)
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{next(_profile_seq)}"
+        base = os.path.join(out_dir, f"{self.name}_{stamp}")
+
+        stats = pstats.Stats(self.profiler)
+        stats.dump_stats(f"{base}.prof")
+
+        with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+            f.write(self.sampler.collapsed())
+
+        buf = io.StringIO()
+        pstats.Stats(self.profiler, stream=buf).sort_stats("cumulative").print_stats(TOP_N)
+        with open(f"{base}.txt", "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+
+        self.report = {
+            "elapsed_s": round(elapsed, 3),
+            "samples": self.sampler.samples,
+            "pstats_path": f"{base}.prof",
+            "collapsed_path": f"{base}.collapsed",
+            "summary_path": f"{base}.txt",
+            "top_cumulative": top_cumulative(stats),
+        }
+        print(f"🔬 [Profile] {self.name} took {elapsed:.2f}s -> {base}.collapsed")
+        return self.report
+
+def top_cumulative(stats, limit=10):
+    """Top functions by cumulative time as plain dicts (JSON friendly)."""
+    rows = []
+    for (filename, line, func), (cc, ncalls, tottime, cumtime, _callers) in stats.stats.items():
+        rows.append({
+            "function": f"{func} ({os.path.basename(filename)}:{line})",
+            "calls": ncalls,
+            "tottime_s": round(tottime, 4),
+            "cumtime_s": round(cumtime, 4),
+        })
+    rows.sort(key=lambda r: r["cumtime_s"], reverse=True)
+    return rows[:limit]
+
+@contextmanager
+def maybe_profile(name, flag=False):
+    """
+    Profiles the block when requested (process-wide, see RequestProfile).
+    Yields the RequestProfile (its .report is filled in on exit) or None if
+    profiling is off or another profile is already running.
+    """
+    if not profiling_requested(flag):
+        yield None
+        return
+    if not _active_lock.acquire(blocking=False):
+        print(f"⚠️ [Profile] Skipping {name}: another profile is already running.")
+        yield None
+        return
+
+    profile = RequestProfile(name)
+    try:
+        profile.start()
+        try:
+            yield profile
+        finally:
+            profile.finish()
+    finally:
+        _active_lock.release()
@@ -0,0 +1,225 @@
+"""
+Retention for the append-only tables.
+
+Rows older than a table's hot window move to an attached archive database
+(FLEET_ARCHIVE_DB, same schema, still queryable with ATTACH). The newest
+rows per vehicle always stay hot so get_maintenance_history (newest 5) never
+has to look at the archive. Pages freed by the move are handed back with
+incremental vacuum and the WAL is checkpointed, so the main file and its
+WAL stop growing with history.
+
+CLI:
+    python retention.py run [--dry-run]
+    python retention.py stats
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+
+import db_writer
+import metrics
+
+# --- 1. CONFIGURATION ---
+DB_NAME = "fleet_data.db"
+ARCHIVE_DB = os.getenv("FLEET_ARCHIVE_DB", "fleet_archive.db")
+BATCH_ROWS = 5000        # rows moved per transaction (keeps the write lock short)
+VACUUM_PAGES = 2000      # free pages returned per run by incremental_vacuum
+BUSY_TIMEOUT = 5.0
+WRITE_TIMEOUT = 60.0     # per batch, queued behind the simulation's writes
+
+# table: (age column, cutoff SQL with ? = hot days, newest rows kept hot per vehicle)
+POLICIES = {
+    "maintenance_history": ("service_date", "date('now', '-' || ? || ' days')", 5),
+    "telemetry_history": ("recorded_at", "CAST(strftime('%s', 'now') AS INTEGER) - ? * 86400", 0),
+}
+HOT_DAYS = {
+    "maintenance_history": int(os.getenv("FLEET_HISTORY_HOT_DAYS", "730")),
+    "telemetry_history": int(os.getenv("FLEET_TELEMETRY_HOT_DAYS", "14")),
+}
+
+_last_run = {}
+
+def _connect(db_path):
+    return sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+
+# --- 2. ARCHIVING ---
+def _ensure_archive_table(conn, table):
+    """Creates archive.<table> with the live table's schema (ids preserved)."""
+    row = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+    if row is None:
+        return False
+    ddl = re.sub(rf"^CREATE TABLE\s+\"?{table}\"?", f"CREATE TABLE IF NOT EXISTS archive.{table}", row[0], count=1)
+    conn.execute(ddl)
+    conn.execute(f"CREATE INDEX IF NOT EXISTS archive.idx_{table}_vehicle ON {table} (vehicle_id)")
+    return True
+
+def _candidate_sql(table):
+    age_col, cutoff_sql, keep = POLICIES[table]
+    if not keep:
+        return f"SELECT id FROM main.{table} WHERE {age_col} < {cutoff_sql}"
+    return (
+        f"SELECT id FROM ("
+        f"  SELECT id, {age_col} AS age, ROW_NUMBER() OVER (PARTITION BY vehicle_id ORDER BY {age_col} DESC, id DESC) AS rn"
+        f"  FROM main.{table}"
+        f") WHERE age < {cutoff_sql} AND rn > {int(keep)}"
+    )
+
+def archive_table(conn, writer, table, hot_days, dry_run=False):
+    """
+    Moves expired rows of one table in BATCH_ROWS-sized jobs. `conn` picks the
+    rows; the moves go through `writer` (the database's db_writer, with the
+    archive attached) so they queue behind the simulation's writes instead of
+    fighting it for the write lock. Returns rows moved.
+    """
+    if not _ensure_archive_table(conn, table):
+        return 0
+    # Pick the rows once; the batches below then walk them by id
+    conn.execute("DROP TABLE IF EXISTS temp.retention_ids")
+    conn.execute(f"CREATE TEMP TABLE retention_ids AS {_candidate_sql(table)} ORDER BY id", (hot_days,))
+    if dry_run:
+        return conn.execute("SELECT COUNT(*) FROM temp.retention_ids").fetchone()[0]
+
+    moved, last_id = 0, -1
+    while True:
+        ids = [r[0] for r in conn.execute(
+            "SELECT id FROM temp.retention_ids WHERE id > ? ORDER BY id LIMIT ?", (last_id, BATCH_ROWS)
+        )]
+        if not ids:
+            break
+        last_id = ids[-1]
+        placeholders = ",".join("?" * len(ids))
+        # One job = one savepoint: the copy and the delete land together.
+        # OR IGNORE: with WAL the two files commit separately, so a crash
+        # between them may leave rows that were already copied; rerunning is safe.
+        writer.submit_many([
+            (f"INSERT OR IGNORE INTO archive.{table} SELECT * FROM main.{table} WHERE id IN ({placeholders})", ids),
+            (f"DELETE FROM main.{table} WHERE id IN ({placeholders})", ids),
+        ]).result(timeout=WRITE_TIMEOUT)
+        moved += len(ids)
+    conn.execute("DROP TABLE temp.retention_ids")
+    metrics.REGISTRY.inc("retention_archived_rows", table, moved)
+    return moved
+
+# --- 3. SPACE RECLAMATION ---
+def enable_incremental_vacuum(conn):
+    """
+    auto_vacuum can only be switched on an existing file by a full VACUUM, so
+    this is a one-off offline step (`retention.py run --enable-incremental-vacuum`);
+    databases created by database_setup.py already have it.
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        print("🧹 [Retention] Switching database to auto_vacuum=INCREMENTAL (one-off VACUUM)...")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES):
+    """Returns up to `pages` free pages to the OS. Returns pages freed."""
+    before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    # executescript steps the pragma to completion; execute() frees a single page
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+def checkpoint(conn, mode="TRUNCATE"):
+    busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return {"mode": mode, "busy": bool(busy), "wal_frames": log_frames, "checkpointed_frames": checkpointed}
+
+# --- 4. MAINTENANCE RUN ---
+def run_maintenance(db_path=None, archive_path=None, dry_run=False):
+    """Archive every table per POLICIES, vacuum freed pages, checkpoint the WAL."""
+    db_path = db_path or DB_NAME
+    archive_path = archive_path or ARCHIVE_DB
+    started = time.time()
+    conn = _connect(db_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+        conn.execute("PRAGMA archive.journal_mode=WAL")
+        writer = db_writer.get_writer(db_path)
+        writer.attach("archive", archive_path)
+        archived = {}
+        for table in POLICIES:
+            with metrics.timer("retention", table):
+                archived[table] = archive_table(conn, writer, table, HOT_DAYS[table], dry_run=dry_run)
+        conn.execute("DETACH DATABASE archive")
+        freed = 0
+        if not dry_run and conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            with metrics.timer("retention", "incremental_vacuum"):
+                freed = incremental_vacuum(conn)
+        with metrics.timer("retention", "checkpoint"):
+            wal = checkpoint(conn, "PASSIVE" if dry_run else "TRUNCATE")
+    finally:
+        conn.close()
+
+    result = {
+        "dry_run": dry_run,
+        "archived_rows": archived,
+        "pages_freed": freed,
+        "checkpoint": wal,
+        "duration_s": round(time.time() - started, 3),
+        "finished_at": int(time.time()),
+    }
+    if not dry_run:
+        _last_run.clear()
+        _last_run.update(result)
+        print(f"🗄️ [Retention] Archived {sum(archived.values())} rows {archived}, freed {freed} pages.")
+    return result
+
+# --- 5. REPORTING ---
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+def storage_stats(db_path=None, archive_path=None):
+    """File sizes, page/freelist counts and WAL checkpoint state (no table scans)."""
+    db_path = db_path or DB_NAME
+    archive_path = archive_path or ARCHIVE_DB
+    conn = _connect(db_path)
+    try:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = {0: "none", 1: "full", 2: "incremental"}.get(conn.execute("PRAGMA auto_vacuum").fetchone()[0])
+        wal = checkpoint(conn, "PASSIVE")
+    finally:
+        conn.close()
+    return {
+        "db_bytes": _file_size(db_path),
+        "wal_bytes": _file_size(f"{db_path}-wal"),
+        "archive_bytes": _file_size(archive_path) + _file_size(f"{archive_path}-wal"),
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_pages": freelist,
+        "reclaimable_bytes": freelist * page_size,
+        "auto_vacuum": auto_vacuum,
+        "checkpoint": wal,
+        "hot_days": HOT_DAYS,
+        "last_run": dict(_last_run) or None,
+    }
+
+# --- 6. CLI ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["run", "stats"])
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--archive", default=ARCHIVE_DB)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the rows that would be archived")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="One-off full VACUUM that switches an older database to auto_vacuum=INCREMENTAL")
+    args = parser.parse_args(argv)
+
+    if args.enable_incremental_vacuum:
+        conn = _connect(args.db)
+        try:
+            enable_incremental_vacuum(conn)
+        finally:
+            conn.close()
+    if args.command == "run":
+        print(json.dumps(run_maintenance(args.db, args.archive, dry_run=args.dry_run), indent=2))
+    print(json.dumps(storage_stats(args.db, args.archive), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import agents
+import db_writer
+import diagnostics
+
+# --- 1. SEVERITY MODEL ---
+# Extra urgency per diagnostic trouble code; unknown non-empty codes get DEFAULT_DTC_SEVERITY
+DTC_SEVERITY = {
+    "P0118": 30, # Coolant temp circuit high -> overheating risk
+    "P0420": 15, # Catalyst efficiency
+}
+DEFAULT_DTC_SEVERITY = 10
+
+def _oil_life(value):
+    """Telemetry reports oil life as '40%'; the DB stores 40."""
+    if value is None:
+        return 100
+    try:
+        return int(str(value).rstrip("%"))
+    except ValueError:
+        return 100
+
+def severity_score(data, rules=None):
+    """
+    Higher = more urgent. Weighs overheating (past the vehicle's engine_temp
+    alert rule), low oil life and the DTC.
+    """
+    rules = rules or diagnostics.get_rules(agents.DB_NAME)
+    temp = data.get("engine_temp") or 0
+    oil = _oil_life(data.get("oil_life"))
+    code = data.get("error_code")
+    score = 0
+    critical = rules.alert_threshold("engine_temp", data.get("model"))
+    if critical is not None:
+        score += max(0, temp - critical) * 2 + 5 * (temp > critical)
+    score += max(0, 30 - oil)
+    if code and code != "None":
+        score += DTC_SEVERITY.get(code, DEFAULT_DTC_SEVERITY)
+    return score
+
+def rank_vehicles(vehicles):
+    """Most severe first; ties broken by vehicle_id so the order is stable."""
+    rules = diagnostics.get_rules(agents.DB_NAME)
+    return sorted(vehicles, key=lambda v: (-severity_score(v, rules), v["vehicle_id"]))
+
+# --- 2. ASSIGNMENT ---
+# How long a sweep waits for the DB writer to commit its bookings
+BOOKING_TIMEOUT = 30
+def plan_bookings(vehicles, open_slots):
+    """
+    Greedy single pass: the i-th most severe vehicle gets the i-th earliest
+    open slot. With interchangeable slots this minimises severity-weighted
+    waiting time, so a full assignment solver would not do better.
+    `open_slots` is a list of (slot_id, slot_time). Returns [(vehicle, slot)].
+    """
+    ordered_slots = sorted(open_slots, key=lambda s: (s[1], s[0]))
+    return list(zip(rank_vehicles(vehicles), ordered_slots))
+
+def _existing_bookings(vehicle_ids):
+    booked = {}
+    ids = list(vehicle_ids)
+    for i in range(0, len(ids), agents.PREFETCH_CHUNK):
+        chunk = ids[i:i + agents.PREFETCH_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        rows = agents.query_db(
+            f"SELECT booked_vehicle_id, slot_time FROM appointments WHERE is_booked = 1 AND booked_vehicle_id IN ({placeholders})",
+            tuple(chunk)
+        ) or []
+        for row in rows:
+            booked.setdefault(row["booked_vehicle_id"], row["slot_time"])
+    return booked
+
+def book_flagged_vehicles(vehicles):
+    """
+    Batch scheduling stage for a sweep. Takes the telemetry dicts of every
+    flagged vehicle, skips ones that already hold a booking, assigns the rest
+    in one pass and writes all bookings in a single transaction.
+
+    Returns {vehicle_id: slot_time} for every flagged vehicle that now has a
+    slot (new or pre-existing). Vehicles left out (no slots, or a slot taken
+    concurrently) fall back to the Scheduler agent. Raises
+    concurrent.futures.TimeoutError if the writer has not committed the
+    bookings within BOOKING_TIMEOUT; the `is_booked = 0` guard keeps a late
+    commit safe, and the next sweep finds those bookings as existing ones.
+    """
+    if not vehicles:
+        return {}
+    already = _existing_bookings(v["vehicle_id"] for v in vehicles)
+    pending = [v for v in vehicles if v["vehicle_id"] not in already]
+
+    open_slots = []
+    if pending:
+        rows = agents.query_db("SELECT id, slot_time FROM appointments WHERE is_booked = 0 ORDER BY slot_time, id LIMIT ?", (len(pending),)) or []
+        open_slots = [(row["id"], row["slot_time"]) for row in rows]
+
+    plan = plan_bookings(pending, open_slots)
+    assigned = dict(already)
+    if not plan:
+        return assigned
+
+    # One transaction; `is_booked = 0` guards against a slot claimed since our SELECT
+    rowcounts = db_writer.get_writer(agents.DB_NAME).submit_many([
+        ("UPDATE appointments SET is_booked = 1, booked_vehicle_id = ? WHERE id = ? AND is_booked = 0",
+         (vehicle["vehicle_id"], slot_id))
+        for vehicle, (slot_id, _) in plan
+    ]).result(timeout=BOOKING_TIMEOUT)
+
+    for (vehicle, (_, slot_time)), claimed in zip(plan, rowcounts):
+        if claimed:
+            assigned[vehicle["vehicle_id"]] = slot_time
+            agents.invalidate_vehicle(vehicle["vehicle_id"])
+    print(f"📅 [Scheduler] Batch-booked {sum(1 for c in rowcounts if c)}/{len(pending)} flagged vehicles.")
+    return assigned
@@ -0,0 +1,78 @@
+"""
+Event-driven alerts: write-time threshold detection, the dispatcher's
+debouncing, and a crossing going all the way to an alert.
+"""
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import alerting
+import db_writer
+import main
+
+def tick(db_path, *statements):
+    """Applies statements like the simulation tick does and returns the drained crossings."""
+    batch = [(sql, args) for sql, args in statements] + [(alerting.DRAIN_SQL, ())]
+    return db_writer.get_writer(db_path).submit_many(batch).result(timeout=10)[-1]
+
+def test_trigger_records_only_upward_crossings(fleet_db):
+    alerting.ensure_schema(fleet_db)
+    # Vehicle-101 cool -> hot crosses; Vehicle-123 is already hot (115) and just gets hotter
+    crossings = tick(fleet_db,
+                     ("UPDATE vehicles SET engine_temp = 118 WHERE vehicle_id = ?", ("Vehicle-101",)),
+                     ("UPDATE vehicles SET engine_temp = 120 WHERE vehicle_id = ?", ("Vehicle-123",)))
+    assert crossings == [("Vehicle-101", 118)]
+    # Drained: nothing changes, nothing reported
+    assert tick(fleet_db, ("UPDATE vehicles SET odometer = odometer + 1", ())) == []
+
+def test_dispatcher_debounces_per_vehicle():
+    handled = []
+
+    async def handler(vid):
+        handled.append(vid)
+
+    async def scenario():
+        dispatcher = alerting.AlertDispatcher(handler, workers=2, debounce=60)
+        dispatcher.start()
+        accepted = [dispatcher.publish(vid) for vid in ("Vehicle-1", "Vehicle-1", "Vehicle-2", "Vehicle-1")]
+        await dispatcher.join()
+        await dispatcher.stop()
+        return accepted, dispatcher.stats()
+
+    accepted, stats = asyncio.run(scenario())
+    assert accepted == [True, False, True, False]
+    assert sorted(handled) == ["Vehicle-1", "Vehicle-2"]
+    assert stats["debounced"] == 2 and stats["handled"] == 2
+
+def test_crossing_becomes_an_alert(fleet_db, query):
+    alerting.ensure_schema(fleet_db)
+    crossings = tick(fleet_db, ("UPDATE vehicles SET engine_temp = 118, error_code = 'P0118' WHERE vehicle_id = ?", ("Vehicle-101",)))
+
+    async def scenario():
+        dispatcher = alerting.AlertDispatcher(main.handle_crossing, workers=2, debounce=60)
+        dispatcher.start()
+        for vid, temp in crossings:
+            dispatcher.publish(vid, temp)
+        await dispatcher.join()
+        await dispatcher.stop()
+
+    asyncio.run(scenario())
+    [alert] = main.active_alerts
+    assert alert["vehicle_id"] == "Vehicle-101" and "QUALITY CHECK COMPLETE" in alert["message"]
+    row = query("SELECT slot_time FROM appointments WHERE booked_vehicle_id = ?", ("Vehicle-101",), one=True)
+    assert row["slot_time"] == alert["booked_slot"]
+
+def test_cooled_down_vehicle_is_skipped():
+    # Vehicle-101 is at 90°C by the time the worker looks
+    asyncio.run(main.handle_crossing("Vehicle-101"))
+    assert main.active_alerts == []
+
+def test_safety_net_sweep_runs_with_the_app(monkeypatch):
+    monkeypatch.setattr(main, "SWEEP_INTERVAL", 900)
+    monkeypatch.setattr(main, "_scheduler", None)
+    monkeypatch.setattr(main, "alert_dispatcher", alerting.AlertDispatcher(main.handle_crossing))
+    with TestClient(main.app):
+        scheduler = main.get_scheduler()
+        [job] = scheduler.get_jobs()
+        assert scheduler.running and job.trigger.interval.total_seconds() == 900
+    assert not scheduler.running
@@ -0,0 +1,87 @@
+"""
+Arrow snapshots: export/load round trip, one snapshot directory per
+database, and the reports and agent tool on top of them.
+"""
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+import agents
+import analytics
+
+@pytest.fixture(autouse=True)
+def snapshot_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    return tmp_path / "snapshots"
+
+def test_export_round_trip(fleet_db):
+    paths = analytics.export_snapshot(fleet_db, parquet=True)
+    out_dir = analytics.snapshot_dir(fleet_db)
+    assert set(paths) == set(analytics.TABLES) and all(os.path.dirname(p) == out_dir for p in paths.values())
+    # Only the finished files are left behind, no temp files
+    assert sorted(os.listdir(out_dir)) == sorted(f"{t}.{ext}" for t in analytics.TABLES for ext in ("arrow", "parquet"))
+
+    conn = sqlite3.connect(fleet_db)
+    try:
+        vehicles = conn.execute(analytics._QUERIES["vehicles"]).fetchall()
+        history = conn.execute(analytics._QUERIES["maintenance_history"]).fetchall()
+        readings = conn.execute("SELECT vehicle_id, recorded_at FROM telemetry_history ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    loaded = analytics.load_table("vehicles", out_dir)
+    assert [tuple(row.values()) for row in loaded.to_pylist()] == vehicles
+    hist = analytics.load_table("maintenance_history", out_dir)
+    assert hist.num_rows == len(history)
+    assert [d.isoformat() for d in hist["service_date"].to_pylist()] == [row[2] for row in history]
+    telemetry = analytics.load_table("telemetry", out_dir)
+    assert readings and telemetry.num_rows == len(readings)
+    captured = telemetry["captured_at"].cast(pa.int64()).to_pylist()
+    assert list(zip(telemetry["vehicle_id"].to_pylist(), captured)) == readings
+    assert telemetry["model"].null_count == 0
+
+def test_database_without_history_exports_the_live_readings(fleet_db):
+    conn = sqlite3.connect(fleet_db)
+    with conn:
+        conn.execute("DROP TABLE telemetry_history")
+        vehicles = conn.execute("SELECT COUNT(*) FROM vehicles").fetchone()[0]
+    conn.close()
+    analytics.export_snapshot(fleet_db)
+    telemetry = analytics.load_table("telemetry", analytics.snapshot_dir(fleet_db))
+    assert telemetry.num_rows == vehicles
+    assert telemetry.schema == analytics._telemetry_schema()
+
+def test_each_database_gets_its_own_snapshot(fleet_db, tmp_path):
+    other = str(tmp_path / "other" / "fleet_data.db")
+    os.makedirs(os.path.dirname(other))
+    shutil.copyfile(fleet_db, other)
+    conn = sqlite3.connect(other)
+    with conn:
+        conn.execute("UPDATE maintenance_history SET cost = cost * 10")
+    conn.close()
+
+    mine, theirs = analytics.ensure_snapshot(fleet_db), analytics.ensure_snapshot(other)
+    assert mine != theirs
+    total = lambda out_dir: sum(r["total_cost"] for r in analytics.cost_per_model(out_dir))
+    assert total(theirs) == 10 * total(mine)
+    # Fresh snapshots are reused, not re-exported
+    mtime = os.path.getmtime(os.path.join(mine, "vehicles.arrow"))
+    analytics.ensure_snapshot(fleet_db)
+    assert os.path.getmtime(os.path.join(mine, "vehicles.arrow")) == mtime
+
+def test_failed_write_leaves_no_temp_file(snapshot_root):
+    os.makedirs(snapshot_root)
+    path = str(snapshot_root / "vehicles.arrow")
+    with pytest.raises(RuntimeError):
+        with analytics._replacing(path) as tmp:
+            assert tmp != path and os.path.dirname(tmp) == str(snapshot_root)
+            raise RuntimeError("disk full")
+    assert os.listdir(snapshot_root) == []
+
+def test_fleet_analytics_tool_reads_this_databases_snapshot(fleet_db):
+    report = agents.fleet_analytics.invoke({"report": "service_intervals"})
+    assert report.startswith("📈 FLEET ANALYTICS: service_intervals")
+    assert os.path.isdir(analytics.snapshot_dir(fleet_db))
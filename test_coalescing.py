@@ -0,0 +1,150 @@
+"""
+/chat coalescing: one run per thread at a time, duplicate requests share a
+run, and Idempotency-Key replays.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import agents
+import coalescing
+import main
+
+async def post_all(*requests):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(client.post("/chat", json=body, headers=headers) for body, headers in requests))
+
+@pytest.fixture
+def slow_chat(monkeypatch):
+    """Replaces the graph run with a counted 50 ms stand-in."""
+    runs = []
+
+    async def fake_run(request, profile):
+        runs.append(request.message)
+        await asyncio.sleep(0.05)
+        return {"response": f"answer {len(runs)}", "vehicle_id": request.vehicle_id}
+
+    monkeypatch.setattr(main, "_run_chat", fake_run)
+    return runs
+
+def test_double_submit_runs_once(slow_chat):
+    body = {"message": "book 10am", "thread_id": "t-dup", "vehicle_id": "Vehicle-123"}
+    first, second = asyncio.run(post_all((body, {}), (body, {})))
+    assert slow_chat == ["book 10am"]
+    assert first.json() == second.json()
+    assert second.headers.get("idempotent-replayed") == "true"
+    assert main.chat_requests.stats()["coalesced"] == 1
+
+def test_repeat_after_the_answer_runs_again_without_a_key(slow_chat):
+    body = {"message": "status?", "thread_id": "t-again", "vehicle_id": "Vehicle-123"}
+
+    async def scenario():
+        first, = await post_all((body, {}))
+        again, = await post_all((body, {}))
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    assert slow_chat == ["status?", "status?"]
+    assert first.json()["response"] == "answer 1" and again.json()["response"] == "answer 2"
+    assert "idempotent-replayed" not in again.headers
+    assert main.chat_requests.stats()["entries"] == 0
+
+def test_idempotency_key_replays_and_rejects_reuse(slow_chat):
+    body = {"message": "status?", "thread_id": "t-key", "vehicle_id": "Vehicle-123"}
+    headers = {"Idempotency-Key": "abc"}
+
+    async def scenario():
+        first, = await post_all((body, headers))
+        retry, = await post_all((body, headers))
+        misuse, = await post_all(({**body, "message": "something else"}, headers))
+        return first, retry, misuse
+
+    first, retry, misuse = asyncio.run(scenario())
+    assert retry.json() == first.json() and retry.headers.get("idempotent-replayed") == "true"
+    assert misuse.status_code == 422
+    assert slow_chat == ["status?"]
+
+def test_failed_runs_are_not_replayed(monkeypatch):
+    calls = []
+
+    async def flaky(request, profile):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("model timeout")
+        return {"response": "ok", "vehicle_id": request.vehicle_id}
+
+    monkeypatch.setattr(main, "_run_chat", flaky)
+    body = {"message": "hi", "thread_id": "t-retry", "vehicle_id": "Vehicle-123"}
+    with pytest.raises(RuntimeError):
+        asyncio.run(post_all((body, {"Idempotency-Key": "k"})))
+    retry, = asyncio.run(post_all((body, {"Idempotency-Key": "k"})))
+    assert retry.json()["response"] == "ok" and len(calls) == 2
+
+def test_cache_more_than_half_full_keeps_live_entries():
+    cache = coalescing.IdempotencyCache(max_entries=100)
+    runs = []
+
+    async def work(i):
+        runs.append(i)
+        return i
+
+    async def scenario():
+        for i in range(60):
+            await cache.run(f"k{i}", f"fp{i}", 600, lambda i=i: work(i))
+        cache._last_purge = float("-inf") # force the next call to purge
+        return await cache.run("k0", "fp0", 600, lambda: work(0))
+
+    result, outcome = asyncio.run(scenario())
+    assert (result, outcome) == (0, "replayed")
+    assert len(runs) == 60 and cache.stats()["entries"] == 60
+
+def test_cache_evicts_oldest_finished_entries_over_the_cap():
+    cache = coalescing.IdempotencyCache(max_entries=10)
+
+    async def scenario():
+        for i in range(11):
+            cache._last_purge = float("-inf")
+            await cache.run(f"k{i}", f"fp{i}", 600, lambda i=i: asyncio.sleep(0, i))
+        cache._last_purge = float("-inf")
+        cache._purge(time.monotonic())
+
+    asyncio.run(scenario())
+    assert list(cache._entries) == [f"k{i}" for i in range(1, 11)]
+
+def test_thread_gate_serializes_and_bounds_the_queue():
+    gate = coalescing.ThreadGate(max_waiting=1)
+    active, peak = [0], [0]
+
+    async def run(thread):
+        async with gate.hold(thread):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            await asyncio.sleep(0.01)
+            active[0] -= 1
+
+    async def scenario():
+        # t1: one running + one waiting is allowed, a third is rejected
+        results = await asyncio.gather(run("t1"), run("t1"), run("t1"), return_exceptions=True)
+        await run("t2")
+        return results
+
+    results = asyncio.run(scenario())
+    assert peak[0] == 1
+    assert [type(r) for r in results] == [type(None), type(None), coalescing.ThreadBusy]
+    assert gate.stats()["active_threads"] == 0 and gate.stats()["queued"] == 1
+
+def test_real_graph_turns_on_one_thread_do_not_interleave():
+    # Two different messages on one thread at once: both run, one after the other
+    bodies = [{"message": m, "thread_id": "t-serial", "vehicle_id": "Vehicle-105"} for m in ("check it", "any codes?")]
+    responses = asyncio.run(post_all(*((b, {}) for b in bodies)))
+    assert all(r.status_code == 200 for r in responses)
+    assert main.chat_requests.stats()["ran"] == 2
+    history = agents.get_app().get_state({"configurable": {"thread_id": "t-serial"}}).values["messages"]
+    second_turn = next(i for i, m in enumerate(history) if isinstance(m, HumanMessage) and "any codes?" in m.content)
+    # The second turn starts only after the first one's final answer
+    assert isinstance(history[second_turn - 1], AIMessage)
+    assert history[second_turn - 1].content == responses[0].json()["response"]
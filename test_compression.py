@@ -0,0 +1,51 @@
+"""
+Response compression: Content-Encoding follows the client's Accept-Encoding,
+and small responses are sent as they are.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+@pytest.fixture
+def alerts():
+    """Enough alerts that GET /alerts is over the compression threshold."""
+    main.active_alerts[:] = [
+        {"vehicle_id": f"Vehicle-{i}", "timestamp": f"2024-01-01 10:{i:02d}:00",
+         "message": "CRITICAL OVERHEATING detected (Temp: 118°C).", "thread_id": f"alert-{i}"}
+        for i in range(40)
+    ]
+    return list(main.active_alerts)
+
+def get_alerts(encoding, params=None):
+    return TestClient(main.app).get("/alerts", params=params, headers={"Accept-Encoding": encoding})
+
+def test_gzip_when_the_client_accepts_it(alerts):
+    res = get_alerts("gzip")
+    assert res.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in res.headers["vary"].lower()
+    assert int(res.headers["content-length"]) < len(main.dumps(alerts))
+    assert res.json() == alerts
+
+def test_identity_gets_the_plain_body(alerts):
+    res = get_alerts("identity")
+    assert "content-encoding" not in res.headers
+    assert res.content == main.dumps(alerts)
+
+def test_small_responses_are_not_compressed(alerts):
+    res = get_alerts("gzip", params={"limit": 1})
+    assert len(res.content) < main.COMPRESS_MIN_BYTES
+    assert "content-encoding" not in res.headers
+    assert res.json() == alerts[-1:]
+
+def test_br_client_gets_brotli_or_gzip(alerts):
+    # brotli-asgi is optional; without it a "br, gzip" client still gets gzip
+    res = get_alerts("br, gzip")
+    assert res.headers["content-encoding"] == ("br" if hasattr(main, "BrotliMiddleware") else "gzip")
+
+def test_br_only_client(alerts):
+    res = get_alerts("br")
+    if hasattr(main, "BrotliMiddleware"):
+        assert res.headers["content-encoding"] == "br"
+    else:
+        assert "content-encoding" not in res.headers and res.content == main.dumps(alerts)
@@ -0,0 +1,129 @@
+"""
+The batching writer thread: per-job savepoints, ordered results, retries
+on a locked database, and a shutdown that never leaves a caller waiting.
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import db_writer
+
+INSERT = "INSERT INTO notes (body) VALUES (?)"
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "writer.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT NOT NULL)")
+    conn.close()
+    return path
+
+@pytest.fixture
+def writer(db):
+    # A long flush window, so everything submitted together lands in one batch
+    w = db_writer.WriteBehindWriter(db, flush_interval=0.2)
+    yield w
+    w.close()
+
+def bodies(db):
+    conn = sqlite3.connect(db)
+    try:
+        return [b for (b,) in conn.execute("SELECT body FROM notes ORDER BY id")]
+    finally:
+        conn.close()
+
+def test_failing_job_does_not_roll_back_its_batch(db, writer):
+    good = writer.submit(INSERT, ("first",))
+    bad = writer.submit_many([(INSERT, ("half",)), (INSERT, (None,))]) # NOT NULL fails the second
+    also_good = writer.submit(INSERT, ("last",))
+    assert good.result(5) == 1 and also_good.result(5) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        bad.result(5)
+    # The failed job is undone as a whole (no "half"), its neighbours committed
+    assert bodies(db) == ["first", "last"]
+    assert writer.stats()["batches"] == 1 and writer.stats()["failed"] == 1
+
+def test_submit_many_returns_results_in_order(db, writer):
+    result = writer.submit_many([
+        (INSERT, ("a",)),
+        ("INSERT INTO notes (body) SELECT 'b' UNION ALL SELECT 'c'", ()),
+        ("UPDATE notes SET body = upper(body) WHERE body != ?", ("a",)),
+        ("DELETE FROM notes WHERE body = ? RETURNING body", ("a",)),
+    ]).result(5)
+    assert result == [1, 2, 2, [("a",)]]
+    assert bodies(db) == ["B", "C"]
+
+def test_retries_while_another_connection_holds_the_lock(db, monkeypatch):
+    monkeypatch.setattr(db_writer, "BUSY_TIMEOUT", 0.01)
+    blocker = sqlite3.connect(db, isolation_level=None, check_same_thread=False)
+    blocker.execute("BEGIN IMMEDIATE")
+    w = db_writer.WriteBehindWriter(db, flush_interval=0)
+
+    def release_after_first_failure():
+        # Let go once the writer has hit the lock, before its retries run out
+        while not w.lock_contention:
+            time.sleep(0.001)
+        blocker.execute("COMMIT")
+
+    releaser = threading.Thread(target=release_after_first_failure)
+    releaser.start()
+    try:
+        assert w.submit(INSERT, ("eventually",)).result(5) == 1
+        assert w.stats()["lock_contention"] >= 1 and w.stats()["failed"] == 0
+    finally:
+        releaser.join(5)
+        w.close()
+        blocker.close()
+    assert bodies(db) == ["eventually"]
+
+def test_lock_held_past_every_retry_fails_the_batch(db, monkeypatch):
+    monkeypatch.setattr(db_writer, "BUSY_TIMEOUT", 0.01)
+    blocker = sqlite3.connect(db, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    w = db_writer.WriteBehindWriter(db, flush_interval=0.1)
+    try:
+        futures = [w.submit(INSERT, (str(i),)) for i in range(3)]
+        for future in futures:
+            with pytest.raises(sqlite3.OperationalError, match="locked"):
+                future.result(5)
+        assert w.stats()["lock_contention"] == db_writer.COMMIT_RETRIES
+    finally:
+        w.close()
+        blocker.execute("ROLLBACK")
+        blocker.close()
+
+def test_close_commits_queued_writes_then_stops(db):
+    w = db_writer.WriteBehindWriter(db, flush_interval=0.5)
+    futures = [w.submit(INSERT, (str(i),)) for i in range(5)]
+    w.close()
+    assert [f.result(0) for f in futures] == [1] * 5
+    assert bodies(db) == [str(i) for i in range(5)]
+    assert not w._thread.is_alive()
+    with pytest.raises(RuntimeError, match="stopped"):
+        w.submit(INSERT, ("late",)).result(0)
+
+def test_unexpected_errors_fail_the_batch_instead_of_hanging(db, writer, monkeypatch):
+    def broken(conn):
+        raise RuntimeError("attach failed")
+
+    monkeypatch.setattr(writer, "_sync_attachments", broken)
+    with pytest.raises(RuntimeError, match="attach failed"):
+        writer.submit(INSERT, ("x",)).result(5)
+    monkeypatch.undo()
+    # The thread survived and keeps committing
+    assert writer.submit(INSERT, ("y",)).result(5) == 1
+    assert bodies(db) == ["y"]
+
+def test_jobs_left_in_the_queue_at_shutdown_are_failed(db):
+    w = db_writer.WriteBehindWriter(db, flush_interval=0.2)
+    first = w.submit(INSERT, ("kept",))
+    w._queue.put(db_writer._STOP) # a stop that overtakes a later job
+    late = w.submit(INSERT, ("dropped",))
+    w._thread.join(5)
+    assert first.result(0) == 1
+    with pytest.raises(RuntimeError, match="stopped"):
+        late.result(0)
+    assert bodies(db) == ["kept"]
+    w.close()
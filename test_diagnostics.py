@@ -0,0 +1,101 @@
+"""
+Diagnostic rules: the default table reproduces the old hardcoded checks, and
+the single-vehicle, vectorized and SQL (trigger) evaluations agree.
+"""
+import random
+import sqlite3
+
+import pytest
+
+import agents
+import alerting
+import diagnostics
+import scheduling
+
+EXTRA_RULES = [
+    ("Van", None, "engine_temp", ">", 100, "CRITICAL", 1, "Van overheating ({value}°C)."),
+    ("*", None, "oil_life", "<=", 5, "CRITICAL", 1, "Oil life critical ({value})."),
+    ("*", None, "oil_life", "<", 20, "WARNING", 0, "Oil change due."),
+    ("*", None, "tire_pressure", "<", 30, "WARNING", 0, "Low tire pressure."),
+    ("Sedan", "P0300", None, None, None, "CRITICAL", 1, "Random misfire detected."),
+]
+
+def rule_set(extra=()):
+    rows = diagnostics.DEFAULT_RULES + list(extra)
+    return diagnostics.RuleSet([diagnostics.Rule(i, *row) for i, row in enumerate(rows, start=1)])
+
+@pytest.mark.parametrize("code, temp, expected", [
+    ("P0118", 115, "DIAGNOSIS REPORT: CRITICAL OVERHEATING detected (Temp: 115°C). Sensor Failure: Coolant Temperature Circuit High input."),
+    ("P0420", 105, "DIAGNOSIS REPORT: Catalyst System Efficiency Below Threshold."),
+    ("None", 110, "Status: Normal. All parameters within operating limits."),
+])
+def test_default_rules_match_the_old_tool(code, temp, expected):
+    assert agents.diagnose_issue.invoke({"error_code": code, "engine_temp": temp}) == expected
+
+def test_model_specific_and_lower_bound_rules():
+    rules = rule_set(EXTRA_RULES)
+    assert rules.findings("None", {"engine_temp": 104}, "Van") == ["Van overheating (104°C)."]
+    assert rules.findings("None", {"engine_temp": 104}, "Sedan") == []
+    assert rules.findings("None", {"oil_life": "5%"}) == ["Oil life critical (5%).", "Oil change due."]
+    assert rules.is_alert({"model": "Sedan", "error_code": "P0300", "engine_temp": 90})
+    assert not rules.is_alert({"model": "SUV", "error_code": "P0300", "engine_temp": 90})
+
+def test_screen_agrees_with_single_vehicle_rules():
+    rng = random.Random(3)
+    rules = rule_set(EXTRA_RULES)
+    fleet = [{
+        "vehicle_id": f"V-{i}", "model": rng.choice(["Van", "Sedan", "SUV"]),
+        "engine_temp": rng.randint(85, 120), "oil_life": f"{rng.randint(0, 100)}%",
+        "tire_pressure": rng.randint(26, 36), "error_code": rng.choice(["None", "P0118", "P0300", "P0420"]),
+    } for i in range(500)]
+    alert, tripped = rules.screen(diagnostics.columns_from_rows(fleet))
+    for data, hit, count in zip(fleet, alert, tripped):
+        matched = rules.matches(data["error_code"], data, data["model"])
+        assert count == len(matched)
+        assert hit == any(r.alert for r in matched)
+
+def test_trigger_follows_the_rule_table(fleet_db):
+    conn = sqlite3.connect(fleet_db)
+    with conn:
+        conn.executemany(diagnostics.INSERT_RULE_SQL, EXTRA_RULES)
+    conn.close()
+    alerting.ensure_schema(fleet_db)
+
+    conn = sqlite3.connect(fleet_db)
+    with conn:
+        conn.execute("UPDATE vehicles SET oil_life = 4 WHERE vehicle_id = 'Vehicle-101'")    # oil rule
+        conn.execute("UPDATE vehicles SET engine_temp = 101 WHERE vehicle_id = 'Vehicle-106'") # Van rule
+        conn.execute("UPDATE vehicles SET engine_temp = 101 WHERE vehicle_id = 'Vehicle-102'") # SUV: no rule
+    crossings = sorted(v for (v,) in conn.execute("SELECT vehicle_id FROM threshold_crossings"))
+    conn.close()
+    assert crossings == ["Vehicle-101", "Vehicle-106"]
+    hot = {vid for vid, _ in alerting.hot_vehicles(fleet_db)}
+    assert hot == {"Vehicle-101", "Vehicle-106", "Vehicle-108", "Vehicle-123"}
+
+def test_server_picks_up_rules_imported_by_another_process(fleet_db, monkeypatch):
+    vehicle = {"model": "Sedan", "error_code": "P0300", "engine_temp": 90}
+    assert not diagnostics.get_rules(fleet_db).is_alert(vehicle)
+    # What `python diagnostics.py import` does, minus this process's cache reset
+    conn = sqlite3.connect(fleet_db)
+    with conn:
+        conn.execute("DELETE FROM diagnostic_rules")
+        conn.execute(diagnostics.INSERT_RULE_SQL, ("Sedan", "P0300", None, None, None, "CRITICAL", 1, "Random misfire detected."))
+    conn.close()
+    # Within the check interval the compiled rules are used as they are
+    assert not diagnostics.get_rules(fleet_db).is_alert(vehicle)
+    monkeypatch.setattr(diagnostics, "RULES_CHECK_INTERVAL", 0)
+    assert diagnostics.get_rules(fleet_db).is_alert(vehicle)
+    assert agents.diagnose_issue.invoke({"error_code": "P0300", "engine_temp": 90, "vehicle_model": "Sedan"}) \
+        == "DIAGNOSIS REPORT: Random misfire detected."
+
+def test_overheating_thresholds_come_from_the_rules(fleet_db):
+    conn = sqlite3.connect(fleet_db)
+    with conn:
+        conn.execute(diagnostics.INSERT_RULE_SQL, ("Van", None, "engine_temp", ">=", 100, "CRITICAL", 1, "Van overheating."))
+    conn.close()
+    rules = diagnostics.get_rules(fleet_db)
+    assert rules.alert_threshold("engine_temp", "Van") == 100
+    assert rules.alert_threshold("engine_temp", "Sedan") == diagnostics.CRITICAL_TEMP
+    assert rules.alert_threshold("oil_life") is None
+    van, sedan = ({"vehicle_id": m, "model": m, "engine_temp": 105} for m in ("Van", "Sedan"))
+    assert scheduling.severity_score(van, rules) == 15 and scheduling.severity_score(sedan, rules) == 0
@@ -0,0 +1,115 @@
+"""
+Degradation fits: incremental updates match a full least-squares fit, oil
+trends restart after an oil change, history sampling covers the fleet, and
+the due list and oil-change fallback stay cheap.
+"""
+import sqlite3
+
+import numpy as np
+import pytest
+
+import forecasting
+
+DAY = forecasting.SECONDS_PER_DAY
+
+def readings(vid, odometer, oil_life, start=0.0):
+    """One reading per day for one vehicle, temperature flat at 90."""
+    n = len(odometer)
+    return [vid] * n, start + np.arange(n) * DAY, list(odometer), list(oil_life), [90] * n
+
+def test_incremental_batches_match_a_full_fit():
+    rng = np.random.default_rng(7)
+    vids = np.array([f"V-{i}" for i in range(20)], dtype=object)[rng.integers(0, 20, 600)]
+    t = rng.uniform(0, 30 * DAY, 600)
+    odo = 1000 + t / DAY * 40 + rng.normal(0, 5, 600)
+    temp = 90 + t / DAY * 0.3 + rng.normal(0, 1, 600)
+    oil = np.full(600, 60.0) # flat: no oil changes, so the whole history is one segment
+
+    model = forecasting.DegradationModel()
+    # Uneven batches, several readings per vehicle in each (np.add.at must sum them)
+    for chunk in np.array_split(np.arange(600), [50, 51, 300]):
+        model.update(vids[chunk], t[chunk], odo[chunk], oil[chunk], temp[chunk])
+
+    _, miles_per_day, temp_per_day = model.trends()
+    for vid, i in model.index.items():
+        mask = vids == vid
+        days = (t[mask] - t[mask].min()) / DAY
+        assert miles_per_day[i] == pytest.approx(np.polyfit(days, odo[mask], 1)[0])
+        assert temp_per_day[i] == pytest.approx(np.polyfit(days, temp[mask], 1)[0])
+
+def test_oil_trend_restarts_after_an_oil_change():
+    model = forecasting.DegradationModel()
+    # Old oil wore 2%/100 mi; after the change (oil_life jumps up) it wears 1%/100 mi
+    model.update(*readings("V-1", [0, 100, 200, 300, 400, 500], [90, 88, 86, 100, 99, 98]))
+    oil_slope, _, _ = model.trends()
+    assert oil_slope[model.index["V-1"]] == pytest.approx(-0.01)
+
+def test_oil_change_between_batches_restarts_the_trend():
+    model = forecasting.DegradationModel()
+    model.update(*readings("V-1", [0, 100, 200, 300], [90, 88, 86, 84]))
+    assert model.trends()[0][0] == pytest.approx(-0.02)
+    # The first reading of the next batch is already after the change
+    model.update(*readings("V-1", [400, 500, 600], [100, 97, 94], start=4 * DAY))
+    assert model.trends()[0][0] == pytest.approx(-0.03)
+    # Too few readings since the change: no trend yet rather than a stale one
+    model.update(*readings("V-1", [700], [100], start=7 * DAY))
+    assert np.isnan(model.trends()[0][0])
+
+def test_each_vehicle_is_sampled_once_per_cycle(fleet_db):
+    conn = sqlite3.connect(fleet_db)
+    try:
+        before = conn.execute("SELECT MAX(id) FROM telemetry_history").fetchone()[0]
+        for tick in range(1, 7):
+            conn.execute(forecasting.RECORD_READINGS_SQL, forecasting.record_args(tick, every=3))
+        counts = conn.execute(
+            "SELECT v.vehicle_id, COUNT(h.id) FROM vehicles v "
+            "LEFT JOIN telemetry_history h ON h.vehicle_id = v.vehicle_id AND h.id > ? GROUP BY v.vehicle_id", (before,)
+        ).fetchall()
+    finally:
+        conn.close()
+    # Six ticks, a cycle of three: every vehicle exactly twice
+    assert counts and all(n == 2 for _, n in counts)
+
+def test_due_list_is_the_soonest_first_and_capped():
+    n = 8
+    fleet = {
+        "vehicle_id": np.array([f"V-{i}" for i in range(n)], dtype=object),
+        "model": np.array(["Sedan"] * n, dtype=object),
+        "engine_temp": np.full(n, 90.0),
+        "oil_life": np.array([50, 19, 80, 5, 60, 10, 90, 15], dtype=float),
+        "odometer": np.full(n, 1000.0),
+        "error_code": np.array(["None", "None", "None", "None", "P0420", "None", "None", "None"], dtype=object),
+    }
+    result = forecasting.forecast(forecasting.DegradationModel(), fleet, max_listed=3)
+    # Due now: oil at/below the threshold (V-1, V-3, V-5, V-7) and the DTC (V-4)
+    assert result["due_within_horizon"] == 5
+    assert [v["vehicle_id"] for v in result["due_vehicles"]] == ["V-1", "V-3", "V-4"]
+
+def test_oil_change_intervals_are_reread_only_after_history_changes(fleet_db, monkeypatch):
+    conn = sqlite3.connect(fleet_db)
+    try:
+        first = forecasting.oil_change_intervals(fleet_db)
+        expected = dict(conn.execute(
+            "SELECT vehicle_id, julianday('now') - julianday(MAX(service_date)) FROM maintenance_history "
+            "WHERE service_type = 'Oil Change' GROUP BY vehicle_id").fetchall())
+        assert first[0].keys() == expected.keys()
+        assert all(first[0][v] == pytest.approx(age, abs=1e-3) for v, age in expected.items())
+
+        statements = []
+        connect = sqlite3.connect
+        def traced(*args, **kwargs):
+            c = connect(*args, **kwargs)
+            c.set_trace_callback(statements.append)
+            return c
+        monkeypatch.setattr(sqlite3, "connect", traced)
+
+        forecasting.oil_change_intervals(fleet_db)
+        assert not any("julianday" in s for s in statements)
+        with conn:
+            conn.execute("INSERT INTO maintenance_history (vehicle_id, service_date, service_type, description, cost) "
+                         "VALUES ('Vehicle-101', date('now'), 'Oil Change', 'Routine', 50)")
+        since_last, _ = forecasting.oil_change_intervals(fleet_db)
+        assert any("julianday" in s for s in statements)
+        assert since_last["Vehicle-101"] == pytest.approx(0, abs=1.0)
+    finally:
+        conn.close()
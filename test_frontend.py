@@ -0,0 +1,85 @@
+"""
+Dashboard against the real backend (in-process): chat messages carry an
+Idempotency-Key, and the alert and fleet-list fragments render what the
+backend returns.
+"""
+import os
+import uuid
+from collections import namedtuple
+
+import pytest
+
+st = pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest
+import requests
+from fastapi.testclient import TestClient
+
+import main
+
+FRONTEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "frontend.py")
+
+Call = namedtuple("Call", "method path params headers status")
+
+class RecordingBackend(TestClient):
+    """Stands in for requests.Session: every call goes to main.app and is recorded."""
+
+    def __init__(self):
+        super().__init__(main.app)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        res = super().request(method, url, **kwargs)
+        self.calls.append(Call(method, res.request.url.path, dict(kwargs.get("params") or {}),
+                               dict(kwargs.get("headers") or {}), res.status_code))
+        return res
+
+    def to(self, path):
+        return [c for c in self.calls if c.path == path]
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = RecordingBackend()
+    monkeypatch.setattr(requests, "Session", lambda: backend)
+    # Caches are process-wide: start every test from a cold frontend
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    return backend
+
+@pytest.fixture
+def app(backend):
+    at = AppTest.from_file(FRONTEND, default_timeout=30)
+    at.run()
+    assert not at.exception
+    return at
+
+def test_each_chat_message_gets_its_own_idempotency_key(app, backend):
+    for _ in range(2):
+        app.chat_input[0].set_value("Check Vehicle-123 please").run()
+    chats = backend.to("/chat")
+    keys = [c.headers["Idempotency-Key"] for c in chats]
+    assert len(chats) == 2 and all(c.status == 200 for c in chats)
+    assert len(set(keys)) == 2 and all(uuid.UUID(k) for k in keys)
+    # Two keys, so the repeated message ran twice rather than being replayed
+    assert main.chat_requests.stats()["ran"] == 2
+    assert [m["role"] for m in app.session_state["messages"]] == ["user", "assistant"] * 2
+
+def test_alert_fragment_joins_the_alert_thread_once(backend):
+    main.active_alerts.append({"vehicle_id": "Vehicle-108", "timestamp": "2024-01-01 10:00:00",
+                               "message": "CRITICAL OVERHEATING detected (Temp: 135°C).", "thread_id": "alert-thread"})
+    at = AppTest.from_file(FRONTEND, default_timeout=30)
+    at.run()
+    at.run()
+    alerts = [m for m in at.session_state["messages"] if "PROACTIVE ALERT" in m["content"]]
+    assert at.session_state["thread_id"] == "alert-thread"
+    assert len(alerts) == 1 and "Vehicle-108" in alerts[0]["content"]
+    # Only the newest alert is fetched
+    assert all(c.params == {"limit": 1} for c in backend.to("/alerts"))
+
+def test_fleet_list_revalidates_with_its_etag(app, backend):
+    st.cache_data.clear() # as if the TTL ran out
+    app.run()
+    pages = backend.to("/vehicles")
+    assert [c.status for c in pages] == [200, 304]
+    assert pages[1].headers["If-None-Match"]
+    # The 304 redraws the page from the validator cache
+    assert len(app.dataframe[0].value) == 10
@@ -0,0 +1,107 @@
+"""
+End-to-end runs of the compiled agent graph and the FastAPI endpoints that
+drive it, on the fake model and a per-test copy of the seeded database.
+"""
+import asyncio
+import json
+import sqlite3
+
+from fastapi.testclient import TestClient
+from langchain_core.messages import HumanMessage
+
+import agents
+import main
+
+def test_chat_fetches_vehicle_data(run_graph):
+    state, path = run_graph([HumanMessage(content="Regarding Vehicle-123: check my vehicle")])
+    assert path == ["UEBA_Check", "Supervisor", "DataAnalyst", "Supervisor"]
+    assert json.loads(state["messages"][-1].content)["engine_temp"] == 115
+
+def test_fleet_forecast_finishes_after_report(run_graph):
+    state, path = run_graph([HumanMessage(content="Give me the fleet forecast")])
+    assert path[-2:] == ["DataAnalyst", "Supervisor"]
+    assert "FLEET FORECAST REPORT" in state["messages"][-1].content
+
+def test_proactive_alert_runs_diagnosis_then_quality(run_graph):
+    data = agents.fetch_telematics_data.invoke({"vehicle_id": "Vehicle-123"})
+    messages = [HumanMessage(content="System Alert: Check vehicle Vehicle-123."), *main.seed_telemetry_messages("Vehicle-123", data)]
+    state, path = run_graph(messages, is_proactive=True)
+    assert [n for n in path if n not in ("UEBA_Check", "Supervisor")] == ["Diagnostician", "QualityEngineer", "Scheduler"]
+    assert "OPEN SLOTS" in state["messages"][-1].content
+
+def test_prebooked_alert_stops_after_quality(run_graph):
+    data = agents.fetch_telematics_data.invoke({"vehicle_id": "Vehicle-123"})
+    messages = [
+        HumanMessage(content="System Alert: Check vehicle Vehicle-123."),
+        *main.seed_telemetry_messages("Vehicle-123", data),
+        *main.seed_booking_messages("Vehicle-123", "10:00"),
+    ]
+    state, path = run_graph(messages, is_proactive=True)
+    assert [n for n in path if n not in ("UEBA_Check", "Supervisor")] == ["Diagnostician", "QualityEngineer"]
+    assert "QUALITY CHECK COMPLETE" in state["messages"][-1].content
+
+def test_booking_then_feedback_on_same_thread(run_graph, query):
+    thread_id = "booking-thread"
+    data = agents.fetch_telematics_data.invoke({"vehicle_id": "Vehicle-123"})
+    alert = [HumanMessage(content="System Alert: Check vehicle Vehicle-123."), *main.seed_telemetry_messages("Vehicle-123", data)]
+    run_graph(alert, thread_id=thread_id)
+
+    state, path = run_graph([HumanMessage(content="Regarding Vehicle-123: book 11:00 please")], thread_id=thread_id)
+    assert [n for n in path if n not in ("UEBA_Check", "Supervisor")] == ["Scheduler", "FeedbackAgent"]
+    assert "Feedback saved" in state["messages"][-1].content
+    row = query("SELECT slot_time FROM appointments WHERE booked_vehicle_id = ?", ("Vehicle-123",), one=True)
+    assert row["slot_time"] == "11:00"
+
+def test_health_check_batch_books_critical_vehicles(query):
+    asyncio.run(main.proactive_health_check())
+    alerted = {a["vehicle_id"]: a for a in main.active_alerts}
+    # Seeded fleet: Vehicle-123 (115°C) and Vehicle-108 (112°C) are over the 110°C threshold
+    assert set(alerted) == {"Vehicle-123", "Vehicle-108"}
+    booked = {r["booked_vehicle_id"]: r["slot_time"] for r in query("SELECT * FROM appointments WHERE is_booked = 1")}
+    assert booked == {vid: alert["booked_slot"] for vid, alert in alerted.items()}
+    assert all("QUALITY CHECK COMPLETE" in a["message"] for a in alerted.values())
+
+def test_chat_endpoint():
+    res = TestClient(main.app).post("/chat", json={"message": "check it", "thread_id": "api-chat", "vehicle_id": "Vehicle-105"})
+    assert res.status_code == 200
+    assert res.json()["vehicle_id"] == "Vehicle-105"
+    assert json.loads(res.json()["response"])["error_code"] == "P0420"
+
+def test_chat_batch_streams_one_line_per_item():
+    items = [{"vehicle_id": f"Vehicle-10{i}", "message": "status?"} for i in range(1, 6)]
+    res = TestClient(main.app).post("/chat/batch", json={"items": items, "concurrency": 3})
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    assert sorted(line["index"] for line in lines) == list(range(5))
+    assert all("response" in line for line in lines)
+
+def test_vehicles_pagination_and_etag():
+    client = TestClient(main.app)
+    first = client.get("/vehicles", params={"limit": 4})
+    body = first.json()
+    assert body["total"] == 10 and len(body["vehicles"]) == 4 and body["next_after"]
+    assert client.get("/vehicles", params={"limit": 4}, headers={"If-None-Match": first.headers["etag"]}).status_code == 304
+    critical = client.get("/vehicles", params={"min_temp": 111}).json()
+    assert [v["vehicle_id"] for v in critical["vehicles"]] == ["Vehicle-108", "Vehicle-123"]
+
+def test_filtered_vehicle_pages_use_the_filter_indexes(fleet_db):
+    conn = sqlite3.connect(fleet_db)
+    try:
+        for column, index in (("status", "idx_vehicles_status"), ("error_code", "idx_vehicles_error_code"), ("model", "idx_vehicles_model")):
+            sql = f"SELECT {main.VEHICLE_COLUMNS} FROM vehicles WHERE vehicle_id > ? AND {column} = ? ORDER BY vehicle_id LIMIT ?"
+            [(*_, plan)] = conn.execute(f"EXPLAIN QUERY PLAN {sql}", ("", "x", 51)).fetchall()
+            assert plan == f"SEARCH vehicles USING INDEX {index} ({column}=? AND vehicle_id>?)"
+        # engine_temp is rewritten every tick: no index on it to maintain
+        conn.execute("CREATE INDEX idx_vehicles_engine_temp ON vehicles (engine_temp)")
+        main.ensure_vehicle_indexes()
+        indexed = {c for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'vehicles'")
+                   for (*_, c) in conn.execute(f"PRAGMA index_info({name})")}
+        assert "engine_temp" not in indexed
+    finally:
+        conn.close()
+
+def test_health_reports_cache_hit_rates():
+    agents.fetch_telematics_data.invoke({"vehicle_id": "Vehicle-101"})
+    agents.fetch_telematics_data.invoke({"vehicle_id": "Vehicle-101"})
+    caches = TestClient(main.app).get("/health").json()["caches"]
+    assert set(caches) == {"telemetry", "maintenance_history", "capa_records", "rca_insights"}
+    assert caches["telemetry"]["hits"] >= 1 and 0 < caches["telemetry"]["hit_rate"] <= 1
@@ -0,0 +1,59 @@
+"""
+Traffic recording and replay: what FLEET_RECORD_TRAFFIC writes is what
+benchmarks/loadtest.py replays, malformed requests included.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import agents
+import main
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import loadtest
+
+# The recorder is installed at import time, so recording runs in its own process
+RECORD = """
+import asyncio, sys
+import httpx
+sys.path.insert(0, "benchmarks")
+import loadtest
+
+loadtest.prepare_backend(0, 0, sys.argv[1])
+
+async def traffic():
+    transport = httpx.ASGITransport(app=loadtest.backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        await client.post("/chat", json={"message": "check my vehicle", "thread_id": "rec-1", "vehicle_id": "Vehicle-101"})
+        await client.get("/alerts", params={"limit": 5})
+        await client.get("/health")
+        await client.post("/chat", content=b'{"message": ', headers={"content-type": "application/json"})
+
+asyncio.run(traffic())
+"""
+
+def test_recorded_traffic_replays(tmp_path, monkeypatch):
+    traffic = tmp_path / "traffic.jsonl"
+    env = {**os.environ, "FLEET_RECORD_TRAFFIC": str(traffic)}
+    subprocess.run([sys.executable, "-c", RECORD, str(tmp_path)], cwd=ROOT, env=env, check=True,
+                   capture_output=True, timeout=120)
+
+    recorded = [json.loads(line) for line in traffic.read_text().splitlines()]
+    assert [(r["method"], r["path"], r["status"]) for r in recorded] == [
+        ("POST", "/chat", 200), ("GET", "/alerts", 200), ("POST", "/chat", 422)]
+    assert recorded[1]["query"] == "limit=5"
+    assert recorded[2]["body"] is None and recorded[2]["body_text"] == '{"message": '
+
+    # loadtest points agents/main at its own scratch DB; put them back afterwards
+    monkeypatch.setattr(agents, "_make_llm", agents._make_llm)
+    monkeypatch.setattr(agents, "DB_NAME", agents.DB_NAME)
+    monkeypatch.setattr(main, "DB_NAME", main.DB_NAME)
+    report = tmp_path / "report.json"
+    loadtest.main(["--traffic", str(traffic), "--speed", "100", "--latency", "0", "--jitter", "0",
+                   "--json", str(report)])
+    summary = json.loads(report.read_text())
+    assert summary["overall"]["requests"] == 3
+    assert summary["error_kinds"] == {"HTTP 422": 1}
@@ -0,0 +1,59 @@
+"""
+Metrics registry: Prometheus text rendering, label escaping and trace spans.
+"""
+import metrics
+
+def test_prometheus_render():
+    registry = metrics.MetricsRegistry()
+    for seconds in (0.1, 0.2, 0.3, 0.4):
+        registry.observe("tool", "diagnose_issue", seconds)
+    registry.observe("tool", "diagnose_issue", 1.0, error=True)
+    registry.observe("node", "Supervisor", 0.05)
+    registry.inc("cache_hits", "telemetry")
+    registry.inc("cache_hits", "telemetry", 2)
+
+    lines = registry.render_prometheus().splitlines()
+    assert lines == [
+        "# HELP fleet_node_duration_seconds Latency of node executions.",
+        "# TYPE fleet_node_duration_seconds summary",
+        'fleet_node_duration_seconds{name="Supervisor",quantile="0.5"} 0.050000',
+        'fleet_node_duration_seconds{name="Supervisor",quantile="0.95"} 0.050000',
+        'fleet_node_duration_seconds{name="Supervisor",quantile="0.99"} 0.050000',
+        'fleet_node_duration_seconds_sum{name="Supervisor"} 0.050000',
+        'fleet_node_duration_seconds_count{name="Supervisor"} 1',
+        "# HELP fleet_node_errors_total Failed node executions.",
+        "# TYPE fleet_node_errors_total counter",
+        'fleet_node_errors_total{name="Supervisor"} 0',
+        "# HELP fleet_tool_duration_seconds Latency of tool executions.",
+        "# TYPE fleet_tool_duration_seconds summary",
+        'fleet_tool_duration_seconds{name="diagnose_issue",quantile="0.5"} 0.300000',
+        'fleet_tool_duration_seconds{name="diagnose_issue",quantile="0.95"} 1.000000',
+        'fleet_tool_duration_seconds{name="diagnose_issue",quantile="0.99"} 1.000000',
+        'fleet_tool_duration_seconds_sum{name="diagnose_issue"} 2.000000',
+        'fleet_tool_duration_seconds_count{name="diagnose_issue"} 5',
+        "# HELP fleet_tool_errors_total Failed tool executions.",
+        "# TYPE fleet_tool_errors_total counter",
+        'fleet_tool_errors_total{name="diagnose_issue"} 1',
+        "# TYPE fleet_cache_hits_total counter",
+        'fleet_cache_hits_total{name="telemetry"} 3',
+    ]
+
+def test_label_values_are_escaped():
+    registry = metrics.MetricsRegistry()
+    registry.inc("sql", 'SELECT "x"\nFROM a\\b')
+    assert 'fleet_sql_total{name="SELECT \\"x\\"\\nFROM a\\\\b"} 1' in registry.render_prometheus()
+
+def test_timer_records_errors_and_trace_spans():
+    registry = metrics.MetricsRegistry()
+    with metrics.trace("chat") as current:
+        with metrics.timer("sql", "ok", registry):
+            pass
+        try:
+            with metrics.timer("sql", "bad", registry):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+    series, _ = registry.snapshot()
+    assert series[("sql", "ok")]["errors"] == 0 and series[("sql", "bad")]["errors"] == 1
+    assert [(s["name"], s["error"]) for s in current.spans if s["kind"] == "sql"] == [("ok", False), ("bad", True)]
+    assert current.duration_ms is not None
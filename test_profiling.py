@@ -0,0 +1,24 @@
+"""
+Opt-in profiling: reports are written to FLEET_PROFILE_DIR and back-to-back
+profiles never overwrite each other.
+"""
+import os
+
+import profiling
+
+def test_back_to_back_profiles_get_their_own_files(tmp_path, monkeypatch):
+    monkeypatch.setenv(profiling.PROFILE_DIR_ENV, str(tmp_path))
+    reports = []
+    for _ in range(2):
+        with profiling.maybe_profile("chat", flag=True) as prof:
+            sum(range(10_000))
+        reports.append(prof.report)
+    paths = [r[key] for r in reports for key in ("pstats_path", "collapsed_path", "summary_path")]
+    assert len(set(paths)) == 6 and all(os.path.exists(p) for p in paths)
+    assert reports[0]["top_cumulative"]
+
+def test_off_unless_requested(monkeypatch):
+    monkeypatch.delenv(profiling.PROFILE_ENV, raising=False)
+    with profiling.maybe_profile("chat") as prof:
+        pass
+    assert prof is None
@@ -0,0 +1,92 @@
+"""
+Retention: expired rows move to the archive database in batches, recent
+rows (and the newest service records per vehicle) stay hot, reruns are no-ops
+and the moves go through the shared writer.
+"""
+import sqlite3
+import time
+
+import pytest
+
+import db_writer
+import retention
+
+DAY = 86400
+
+@pytest.fixture
+def history_db(fleet_db, tmp_path):
+    """The seeded DB with known history: 10 expired + 5 recent telemetry rows, 8 old service records."""
+    now = int(time.time())
+    conn = sqlite3.connect(fleet_db)
+    with conn:
+        conn.execute("DELETE FROM telemetry_history")
+        conn.execute("DELETE FROM maintenance_history")
+        conn.executemany(
+            "INSERT INTO telemetry_history (vehicle_id, recorded_at, odometer, oil_life, engine_temp) VALUES (?, ?, ?, ?, ?)",
+            [("Vehicle-101", now - (30 + i) * DAY, 1000 + i, 80, 90) for i in range(10)]
+            + [("Vehicle-101", now - i * 60, 2000 + i, 70, 90) for i in range(5)])
+        conn.executemany(
+            "INSERT INTO maintenance_history (vehicle_id, service_date, service_type, description, cost) VALUES (?, ?, ?, ?, ?)",
+            [("Vehicle-101", f"201{i}-01-01", "Oil Change", "Routine", 50) for i in range(8)])
+    conn.close()
+    return fleet_db, str(tmp_path / "archive.db")
+
+def rows(db_path, sql):
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+def test_expired_rows_move_to_the_archive(history_db):
+    db, archive = history_db
+    before = rows(db, "SELECT * FROM telemetry_history ORDER BY id")
+    result = retention.run_maintenance(db, archive)
+
+    assert result["archived_rows"] == {"telemetry_history": 10, "maintenance_history": 3}
+    # Same rows, same ids, now only in the archive
+    assert rows(archive, "SELECT * FROM telemetry_history ORDER BY id") == before[:10]
+    assert rows(db, "SELECT * FROM telemetry_history ORDER BY id") == before[10:]
+    # The newest 5 service records stay hot however old they are
+    assert rows(db, "SELECT service_date FROM maintenance_history ORDER BY service_date") == [(f"201{i}-01-01",) for i in range(3, 8)]
+    assert rows(archive, "SELECT service_date FROM maintenance_history ORDER BY service_date") == [(f"201{i}-01-01",) for i in range(3)]
+
+def test_dry_run_and_rerun_change_nothing(history_db):
+    db, archive = history_db
+    assert retention.run_maintenance(db, archive, dry_run=True)["archived_rows"]["telemetry_history"] == 10
+    assert rows(db, "SELECT COUNT(*) FROM telemetry_history") == [(15,)]
+
+    retention.run_maintenance(db, archive)
+    snapshot = (rows(db, "SELECT * FROM telemetry_history"), rows(archive, "SELECT * FROM telemetry_history"))
+    again = retention.run_maintenance(db, archive)
+    assert again["archived_rows"] == {"telemetry_history": 0, "maintenance_history": 0}
+    assert (rows(db, "SELECT * FROM telemetry_history"), rows(archive, "SELECT * FROM telemetry_history")) == snapshot
+
+def test_rows_already_copied_before_a_crash_are_not_duplicated(history_db):
+    db, archive = history_db
+    # A crash between the archive commit and the main commit leaves copies behind
+    conn = retention._connect(db)
+    conn.execute("ATTACH DATABASE ? AS archive", (archive,))
+    retention._ensure_archive_table(conn, "telemetry_history")
+    conn.execute("INSERT INTO archive.telemetry_history SELECT * FROM main.telemetry_history ORDER BY id LIMIT 4")
+    conn.close()
+
+    retention.run_maintenance(db, archive)
+    assert rows(archive, "SELECT COUNT(*), COUNT(DISTINCT id) FROM telemetry_history") == [(10, 10)]
+
+def test_rows_are_moved_in_batches_through_the_writer(history_db, monkeypatch):
+    db, archive = history_db
+    monkeypatch.setattr(retention, "BATCH_ROWS", 4)
+    writer = db_writer.get_writer(db)
+    submitted = []
+    submit_many = writer.submit_many
+    monkeypatch.setattr(writer, "submit_many", lambda statements: submitted.append(statements) or submit_many(statements))
+    writes = writer.stats()["writes"]
+
+    result = retention.run_maintenance(db, archive)
+    # 10 rows, 4 per job: 4 + 4 + 2, each job a copy and a delete committed by the writer
+    assert result["archived_rows"]["telemetry_history"] == 10
+    telemetry = [job for job in submitted if "telemetry_history" in job[0][0]]
+    assert [len(job[1][1]) for job in telemetry] == [4, 4, 2]
+    assert all(job[1][0].startswith("DELETE FROM main.telemetry_history") for job in telemetry)
+    assert writer.stats()["writes"] - writes == len(submitted)
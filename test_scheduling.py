@@ -0,0 +1,58 @@
+"""
+Batch scheduling: severity ranking, greedy slot assignment, and booking a
+sweep's flagged vehicles around existing bookings.
+"""
+import concurrent.futures
+import sqlite3
+
+import pytest
+
+import agents
+import db_writer
+import scheduling
+
+def vehicle(vid, temp=90, oil="80%", code="None"):
+    return {"vehicle_id": vid, "engine_temp": temp, "oil_life": oil, "error_code": code}
+
+def test_rank_orders_by_severity_then_id():
+    fleet = [
+        vehicle("V-ok"),
+        vehicle("V-cat", code="P0420"),               # 15
+        vehicle("V-hot", temp=120, code="P0118"),     # 20 + 5 + 30
+        vehicle("V-oil", oil="5%"),                   # 25
+        vehicle("V-b-unknown", code="P9999"),         # 10
+        vehicle("V-a-unknown", code="P9999"),         # 10, wins the tie by id
+    ]
+    assert [v["vehicle_id"] for v in scheduling.rank_vehicles(fleet)] == [
+        "V-hot", "V-oil", "V-cat", "V-a-unknown", "V-b-unknown", "V-ok"]
+
+def test_most_severe_get_the_earliest_slots_until_they_run_out():
+    fleet = [vehicle("V-1", code="P0420"), vehicle("V-2", temp=125), vehicle("V-3", oil="10%")]
+    slots = [(7, "14:00"), (3, "09:00")]
+    plan = scheduling.plan_bookings(fleet, slots)
+    assert [(v["vehicle_id"], slot) for v, slot in plan] == [("V-2", (3, "09:00")), ("V-3", (7, "14:00"))]
+    assert scheduling.plan_bookings(fleet, []) == []
+
+def test_batch_booking_keeps_existing_bookings(query):
+    db_writer.get_writer(agents.DB_NAME).execute(
+        "UPDATE appointments SET is_booked = 1, booked_vehicle_id = 'Vehicle-108' WHERE slot_time = '15:00'")
+    flagged = [vehicle("Vehicle-108", temp=135, code="P0118"), vehicle("Vehicle-123", temp=115, code="P0118"),
+               vehicle("Vehicle-101", code="P0420")]
+
+    booked = scheduling.book_flagged_vehicles(flagged)
+    assert booked == {"Vehicle-108": "15:00", "Vehicle-123": "09:00", "Vehicle-101": "10:00"}
+    rows = query("SELECT booked_vehicle_id, COUNT(*) AS n FROM appointments WHERE is_booked = 1 GROUP BY booked_vehicle_id")
+    assert {r["booked_vehicle_id"]: r["n"] for r in rows} == {"Vehicle-108": 1, "Vehicle-123": 1, "Vehicle-101": 1}
+    # Running the sweep again books nothing new
+    assert scheduling.book_flagged_vehicles(flagged) == booked
+
+def test_batch_booking_gives_up_on_a_stuck_writer(fleet_db, monkeypatch):
+    monkeypatch.setattr(scheduling, "BOOKING_TIMEOUT", 0.05)
+    blocker = sqlite3.connect(fleet_db, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(concurrent.futures.TimeoutError):
+            scheduling.book_flagged_vehicles([vehicle("Vehicle-123", temp=115, code="P0118")])
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()